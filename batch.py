@@ -0,0 +1,130 @@
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from compiler import DEFAULT_PHASES, PHASES, compile
+
+UNIT_SEPARATOR = re.compile(r'^[ \t]*-{3,}[ \t]*$', re.MULTILINE)
+
+class UnitResult:
+    __slots__ = ('label', 'token_count', 'statement_count', 'symbols', 'error', 'seconds')
+
+    def __init__(self, label, token_count=0, statement_count=0, symbols=(), error=None, seconds=0.0):
+        self.label = label
+        self.token_count = token_count
+        self.statement_count = statement_count
+        self.symbols = symbols
+        self.error = error
+        self.seconds = seconds
+
+    def __getstate__(self):
+        return (self.label, self.token_count, self.statement_count, self.symbols, self.error, self.seconds)
+
+    def __setstate__(self, state):
+        self.label, self.token_count, self.statement_count, self.symbols, self.error, self.seconds = state
+
+class BatchReport:
+    def __init__(self, results, seconds, workers):
+        self.results = results
+        self.seconds = seconds
+        self.workers = workers
+        self.token_count = sum(result.token_count for result in results)
+        self.errors = [result for result in results if result.error is not None]
+
+    def units_per_second(self):
+        return len(self.results) / self.seconds if self.seconds else 0.0
+
+    def tokens_per_second(self):
+        return self.token_count / self.seconds if self.seconds else 0.0
+
+def split_units(text, label='<unit>'):
+    units = []
+    for source in UNIT_SEPARATOR.split(text):
+        if source.strip():
+            units.append((f"{label}#{len(units) + 1}", source))
+    return units
+
+def load_units(paths):
+    units = []
+    for path in paths:
+        if path == '-':
+            units.extend(split_units(sys.stdin.read(), '<stdin>'))
+            continue
+        with open(path, 'r') as file:
+            units.extend(split_units(file.read(), path))
+    return units
+
+def symbol_rows(symbol_table):
+    return tuple((name, data_type, address, size, dimensions, line, tuple(references))
+                 for _, _, name, address, data_type, size, dimensions, line, references, _, _
+                 in symbol_table.records())
+
+def compile_unit(label, source, phases=DEFAULT_PHASES):
+    start = time.perf_counter()
+    try:
+        result = compile(source, phases)
+    except Exception as e:
+        return UnitResult(label, error=f"{type(e).__name__}: {e}", seconds=time.perf_counter() - start)
+    return UnitResult(label,
+                      len(result.tokens) if result.tokens is not None else 0,
+                      len(result.tree.children) if result.tree is not None else 0,
+                      symbol_rows(result.symbol_table) if result.symbol_table is not None else (),
+                      seconds=time.perf_counter() - start)
+
+def compile_chunk(units, phases=DEFAULT_PHASES):
+    return [compile_unit(label, source, phases) for label, source in units]
+
+def chunked(units, chunk_size):
+    return [units[i:i + chunk_size] for i in range(0, len(units), chunk_size)]
+
+def compile_batch(units, workers=None, chunk_size=None, phases=DEFAULT_PHASES):
+    unknown = set(phases) - set(PHASES)
+    if unknown:
+        raise ValueError(f"Unknown phases: {', '.join(sorted(unknown))}")
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(units) // (workers * 4)))
+    start = time.perf_counter()
+    if workers == 1:
+        results = compile_chunk(units, phases)
+    else:
+        results = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = chunked(units, chunk_size)
+            for chunk_results in executor.map(compile_chunk, chunks, [phases] * len(chunks)):
+                results.extend(chunk_results)
+    return BatchReport(results, time.perf_counter() - start, workers)
+
+def print_report(report, file=sys.stderr):
+    for result in report.errors:
+        print(f"{result.label}: {result.error}", file=file)
+    print(f"{len(report.results)} units ({len(report.errors)} failed), {report.token_count} tokens "
+          f"in {report.seconds:.3f} s on {report.workers} workers: "
+          f"{report.units_per_second():.1f} units/sec, {report.tokens_per_second():.0f} tokens/sec", file=file)
+
+#=================================================================
+
+def main(argv=None):
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Compile many units across a process pool.")
+    arg_parser.add_argument('files', nargs='*', help="files to compile, split on dashed separator lines; "
+                                                     "'-' or none reads stdin")
+    arg_parser.add_argument('--workers', type=int, help="worker processes (default: CPU count)")
+    arg_parser.add_argument('--chunk-size', type=int, help="units sent to a worker per task")
+    arg_parser.add_argument('--phases', default=','.join(DEFAULT_PHASES),
+                            help=f"comma separated phases out of {','.join(PHASES)} "
+                                 f"(default: {','.join(DEFAULT_PHASES)})")
+    arg_parser.add_argument('--repeat', type=int, default=1, help="compile the units this many times")
+    args = arg_parser.parse_args(argv)
+
+    phases = tuple(phase.strip() for phase in args.phases.split(',') if phase.strip())
+    units = load_units(args.files or ['-']) * args.repeat
+    report = compile_batch(units, args.workers, args.chunk_size, phases)
+    print_report(report)
+    return 1 if report.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
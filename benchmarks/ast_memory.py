@@ -0,0 +1,57 @@
+import argparse
+import gc
+import time
+import tracemalloc
+
+from benchmarks.parsers import make_program, program_body
+from compact_ast import CompactParser
+from parser import Parser
+from tokens_lexems import lex, read_source_code
+
+class DictParseNode:
+    def __init__(self, name, children=None):
+        self.name = name
+        self.children = children or []
+
+class DictNodeParser(Parser):
+    def make_node(self, name, children):
+        return DictParseNode(name, children)
+
+def measure(build, tokens):
+    gc.collect()
+    start = time.perf_counter()
+    tree = build(tokens)
+    elapsed = time.perf_counter() - start
+    del tree
+    gc.collect()
+    tracemalloc.start()
+    tree = build(tokens)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tree
+    return elapsed, current
+
+BUILDERS = [
+    ('dict nodes', lambda tokens: DictNodeParser(tokens).parse()),
+    ('ParseNode', lambda tokens: Parser(tokens).parse()),
+    ('CompactTree', lambda tokens: CompactParser(tokens).parse()),
+]
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Measure parse tree memory and build time.")
+    arg_parser.add_argument('--source', default='source_code.txt')
+    arg_parser.add_argument('--sizes', default='1000,10000')
+    args = arg_parser.parse_args(argv)
+
+    body = program_body(read_source_code(args.source))
+    print(f"{'copies':>8}{'tokens':>10}  {'representation':<14}{'build (s)':>12}{'memory (KiB)':>16}{'bytes/token':>14}")
+    for copies in (int(size) for size in args.sizes.split(',')):
+        source_code = make_program(body, copies)
+        tokens = lex(source_code)
+        for name, build in BUILDERS:
+            elapsed, memory = measure(build, tokens)
+            print(f"{copies:>8}{len(tokens):>10}  {name:<14}{elapsed:>12.4f}{memory / 1024:>16.1f}"
+                  f"{memory / len(tokens):>14.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import random
+import re
+
+from grammar import split_rules
+
+DATA_TYPES = ('int', 'float', 'string')
+OPERATORS = ('+', '-', '*', '/')
+RELATIONAL_OPERATORS = ('==', '!=', '<', '>', '<=', '>=')
+COMPOUND_OPERATORS = ('+=', '-=', '*=', '/=')
+STRING_CHARACTERS = 'abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+class ProgramGenerator:
+    def __init__(self, seed=0, statements=100, max_depth=3, identifiers=16,
+                 string_density=0.1, list_density=0.05, block_size=4):
+        self.random = random.Random(seed)
+        self.statements = statements
+        self.max_depth = max_depth
+        self.identifiers = [f"v{i}" for i in range(identifiers)]
+        self.string_density = string_density
+        self.list_density = list_density
+        self.block_size = block_size
+        self.lines = []
+
+    def generate(self):
+        self.lines = ["begin{"]
+        remaining = self.statements
+        while remaining > 0:
+            remaining -= self.statement(1)
+        self.lines.append("}end")
+        return "\n".join(self.lines) + "\n"
+
+    def emit(self, depth, text):
+        self.lines.append("    " * depth + text)
+
+    def statement_list(self, depth):
+        count = 0
+        for _ in range(self.random.randint(1, self.block_size)):
+            count += self.statement(depth)
+        return count
+
+    def statement(self, depth):
+        choice = self.random.random()
+        if depth < self.max_depth and choice < 0.24:
+            return [self.conditional, self.while_loop, self.for_loop][int(choice / 0.08)](depth)
+        if choice < 0.5:
+            return self.declaration(depth)
+        if choice < 0.8:
+            return self.assignment(depth)
+        if choice < 0.92:
+            return self.print_statement(depth)
+        if depth > 1 and choice < 0.96:
+            return self.loop_control(depth)
+        if choice < 0.98:
+            return self.pass_statement(depth)
+        return self.return_statement(depth)
+
+    def declaration(self, depth):
+        data_type = self.random.choice(DATA_TYPES)
+        if self.random.random() < 0.2:
+            self.emit(depth, f"{data_type} {self.identifier()};")
+        else:
+            self.emit(depth, f"{data_type} {self.identifier()} = {self.expression(2)};")
+        return 1
+
+    def assignment(self, depth):
+        operator = '=' if self.random.random() < 0.5 else self.random.choice(COMPOUND_OPERATORS)
+        self.emit(depth, f"{self.identifier()} {operator} {self.expression(2)};")
+        return 1
+
+    def conditional(self, depth):
+        self.emit(depth, f"if ({self.boolean_expression()}) {{")
+        count = 1 + self.statement_list(depth + 1)
+        while self.random.random() < 0.3:
+            self.emit(depth, f"}} elif ({self.boolean_expression()}) {{")
+            count += self.statement_list(depth + 1)
+        if self.random.random() < 0.5:
+            self.emit(depth, "} else {")
+            count += self.statement_list(depth + 1)
+        self.emit(depth, "}")
+        return count
+
+    def while_loop(self, depth):
+        self.emit(depth, f"while ({self.boolean_expression()}) {{")
+        count = 1 + self.statement_list(depth + 1)
+        self.emit(depth, "}")
+        return count
+
+    def for_loop(self, depth):
+        iterable = self.list_literal(1) if self.random.random() < 0.7 else self.identifier()
+        self.emit(depth, f"for {self.identifier()} in {iterable} {{")
+        count = 1 + self.statement_list(depth + 1)
+        self.emit(depth, "}")
+        return count
+
+    def print_statement(self, depth):
+        content = self.string() if self.random.random() < self.string_density * 4 else self.identifier()
+        self.emit(depth, f"print({content});")
+        return 1
+
+    def pass_statement(self, depth):
+        self.emit(depth, "pass;")
+        return 1
+
+    def return_statement(self, depth):
+        self.emit(depth, f"return {self.expression(2)};" if self.random.random() < 0.8 else "return;")
+        return 1
+
+    def loop_control(self, depth):
+        self.emit(depth, self.random.choice(("break;", "continue;")))
+        return 1
+
+    def boolean_expression(self):
+        expression = f"{self.expression(1)} {self.random.choice(RELATIONAL_OPERATORS)} {self.expression(1)}"
+        while self.random.random() < 0.2:
+            expression += f" {self.random.choice(('and', 'or'))} {self.expression(1)}"
+        return expression
+
+    def expression(self, depth):
+        expression = self.term(depth)
+        while self.random.random() < 0.35:
+            expression += f" {self.random.choice(OPERATORS)} {self.term(depth)}"
+        return expression
+
+    def term(self, depth):
+        choice = self.random.random()
+        if choice < self.string_density:
+            return self.string()
+        choice -= self.string_density
+        if choice < self.list_density and depth > 0:
+            return self.list_literal(depth - 1)
+        choice -= self.list_density
+        if choice < 0.1 and depth > 0:
+            return f"({self.expression(depth - 1)})"
+        if choice < 0.5:
+            return self.identifier()
+        if choice < 0.6:
+            return f"{self.random.randint(0, 999)}.{self.random.randint(0, 99)}"
+        return str(self.random.randint(0, 9999))
+
+    def list_literal(self, depth):
+        return "[" + ", ".join(self.expression(depth) for _ in range(self.random.randint(0, 5))) + "]"
+
+    def identifier(self):
+        return self.random.choice(self.identifiers)
+
+    def string(self):
+        length = self.random.randint(0, 24)
+        return '"' + "".join(self.random.choice(STRING_CHARACTERS) for _ in range(length)) + '"'
+
+def generate_program(seed=0, **knobs):
+    return ProgramGenerator(seed, **knobs).generate()
+
+def generate_loop_program(seed=0, loops=4, iterations=1000, statements=6, identifiers=8):
+    rng = random.Random(seed)
+    names = [f"v{i}" for i in range(identifiers)]
+    lines = ["begin{"] + [f"    int {name} = {rng.randint(0, 9)};" for name in names]
+
+    def body(counter, indent):
+        output = []
+        for _ in range(statements):
+            target, source = rng.choice(names), rng.choice(names)
+            choice = rng.random()
+            if choice < 0.3:
+                output.append(f"{target} = {source} + {counter} * {rng.randint(1, 9)};")
+            elif choice < 0.5:
+                output.append(f"{target} {rng.choice(('+=', '-='))} {rng.choice((source, str(rng.randint(1, 99))))};")
+            elif choice < 0.6:
+                output.append(f"{target} = {source} / {rng.randint(2, 9)};")
+            else:
+                output.append(f"if ({target} > 1000) {{ {target} = {target} - 1000; }} "
+                              f"elif ({target} < 0 - 1000) {{ {target} = {target} + 1000; }} "
+                              f"else {{ {target} += 1; }}")
+        return [indent + line for line in output]
+
+    for loop in range(loops):
+        counter = f"n{loop}"
+        if loop % 2 == 0:
+            lines.append(f"    int {counter} = 0;")
+            lines.append(f"    while ({counter} < {iterations}) {{")
+            lines.extend(body(counter, "        "))
+            lines.append(f"        {counter} += 1;")
+            lines.append("    }")
+        else:
+            outer = max(1, iterations // 100)
+            lines.append(f"    for {counter} in [{', '.join(str(i) for i in range(outer))}] {{")
+            lines.append(f"        int m{loop} = 0;")
+            lines.append(f"        while (m{loop} < 100) {{")
+            lines.extend(body(f"m{loop}", "            "))
+            lines.append(f"            m{loop} += 1;")
+            lines.append("        }")
+            lines.append("    }")
+    lines.extend(f"    print({name});" for name in names)
+    lines.append(f"    return {names[0]};")
+    lines.append("}end")
+    return "\n".join(lines) + "\n"
+
+def replicate_grammar(text, copies):
+    rules = split_rules(text)
+    start = rules[0][0]
+    names = '|'.join(re.escape(lhs) for lhs, _ in rules)
+    pattern = re.compile(r'"[^"]*"|\'[^\']*\'|\[[^\]"]*-[^\]"]*\]|\b(' + names + r')\b')
+    output = [f"{start} -> " + " | ".join(f"{start}_{copy}" for copy in range(copies))]
+    for copy in range(copies):
+        rename = lambda match: f"{match.group(1)}_{copy}" if match.group(1) else match.group(0)
+        output.extend(pattern.sub(rename, f"{lhs} ->{rhs}") for lhs, rhs in rules)
+    return "\n\n".join(output) + "\n"
+
+#=================================================================
+
+if __name__ == "__main__":
+    import sys
+
+    print(generate_program(int(sys.argv[1]) if len(sys.argv) > 1 else 0, statements=20))
@@ -0,0 +1,69 @@
+import argparse
+import signal
+import sys
+
+from benchmarks.generator import generate_program
+from interpreter import run_source
+from ir import DEFAULT_REGISTERS, PASSES, compile_source, run
+
+class TimeLimit(Exception):
+    pass
+
+def stop(signal_number, frame):
+    raise TimeLimit()
+
+def outcome(execute, time_limit):
+    # the repr of the return value or the exception type, with everything printed before it;
+    # None when the program is still running at the time limit
+    output = []
+    signal.setitimer(signal.ITIMER_REAL, time_limit)
+    try:
+        result = ('returned', repr(execute(output.append)))
+    except TimeLimit:
+        return None
+    except Exception as e:
+        result = ('raised', type(e).__name__)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    return result, output
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Run generated programs through the optimized IR and the AST "
+                                                     "interpreter and compare their output, results and exceptions.")
+    arg_parser.add_argument('--seeds', type=int, default=200)
+    arg_parser.add_argument('--first-seed', type=int, default=0)
+    arg_parser.add_argument('--statements', type=int, default=100)
+    arg_parser.add_argument('--registers', type=int, default=DEFAULT_REGISTERS)
+    arg_parser.add_argument('--no-optimize', action='store_true')
+    arg_parser.add_argument('--time-limit', type=float, default=2.0, help="seconds a program may run")
+    args = arg_parser.parse_args(argv)
+
+    signal.signal(signal.SIGALRM, stop)
+    agreed = rejected = timed_out = 0
+    mismatches = []
+    for seed in range(args.first_seed, args.first_seed + args.seeds):
+        source = generate_program(seed, statements=args.statements)
+        try:
+            program = compile_source(source, args.registers, () if args.no_optimize else PASSES)[0]
+        except SyntaxError:
+            # e.g. a 'continue' outside a loop, which the interpreter only reports once it is reached
+            rejected += 1
+            continue
+        expected = outcome(lambda output: run_source(source, output), args.time_limit)
+        actual = outcome(lambda output: run(program, output), args.time_limit)
+        if expected is None or actual is None:
+            timed_out += 1
+        elif actual == expected:
+            agreed += 1
+        else:
+            mismatches.append(seed)
+            (kind, value), output = actual
+            (expected_kind, expected_value), expected_output = expected
+            print(f"seed {seed}: IR {kind} {value} after {len(output)} prints, "
+                  f"interpreter {expected_kind} {expected_value} after {len(expected_output)} prints")
+    print(f"{agreed} programs agree, {len(mismatches)} differ, {rejected} rejected by the IR compiler, "
+          f"{timed_out} over the time limit")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+import argparse
+
+from benchmarks.generator import generate_loop_program
+from benchmarks.parsers import best_time, make_program, program_body
+from parser import LazyBody, LazyParser, Parser
+from tokens_lexems import lex_offsets
+
+def outline(tree):
+    return [(statement.name, statement.children[1][1] if statement.name == 'Declaration' else None)
+            for statement in tree.children]
+
+def first_body(tree):
+    for statement in tree.children:
+        for child in statement.children:
+            if isinstance(child, LazyBody):
+                return child
+    return None
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Compare full parsing with lazy block parsing for outline queries.")
+    arg_parser.add_argument('--sizes', default='10,100,1000', help="comma separated copies of the program body")
+    arg_parser.add_argument('--loops', type=int, default=4)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    body = program_body(generate_loop_program(args.seed, args.loops, 10, 6))
+    print(f"{'copies':>8}{'tokens':>10}{'full (s)':>12}{'outline (s)':>14}{'one body (s)':>14}{'full/outline':>14}")
+    for copies in (int(size) for size in args.sizes.split(',')):
+        tokens = lex_offsets(make_program(body, copies), positions=True)
+        tokens.matching_braces()
+        if outline(LazyParser(tokens).parse()) != outline(Parser(tokens).parse()):
+            raise AssertionError(f"lazy and full parsing disagree on the outline at {copies} copies")
+        full = best_time(lambda: outline(Parser(tokens).parse()), args.repeat)
+        lazy = best_time(lambda: outline(LazyParser(tokens).parse()), args.repeat)
+        touched = best_time(lambda: first_body(LazyParser(tokens).parse()).children, args.repeat)
+        print(f"{copies:>8}{len(tokens):>10}{full:>12.4f}{lazy:>14.4f}{touched:>14.4f}{full / lazy:>14.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import signal
+import sys
+
+from benchmarks.generator import generate_program
+from benchmarks.ir import outcome, stop
+from interpreter import TreeInterpreter
+from optimizer import optimize
+from parser import Parser
+from tokens_lexems import lex_offsets
+
+# programs the optimizer once changed the behaviour of
+REGRESSIONS = (
+    # inlining an always-true if moved the implicit declaration of z out of the if-scope
+    "begin{\nint n = 0;\nwhile (n < 2) { if (1 < 2) { print(z); } z = 5; n += 1; }\n}end\n",
+)
+
+def parse(source):
+    return Parser(lex_offsets(source, positions=True)).parse()
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Run programs through the AST interpreter with and without the "
+                                                     "AST optimizer and compare their output, results and exceptions.")
+    arg_parser.add_argument('--seeds', type=int, default=200)
+    arg_parser.add_argument('--first-seed', type=int, default=0)
+    arg_parser.add_argument('--statements', type=int, default=100)
+    arg_parser.add_argument('--time-limit', type=float, default=2.0, help="seconds a program may run")
+    args = arg_parser.parse_args(argv)
+
+    signal.signal(signal.SIGALRM, stop)
+    cases = [(f"regression {index}", source) for index, source in enumerate(REGRESSIONS)]
+    cases.extend((f"seed {seed}", generate_program(seed, statements=args.statements))
+                 for seed in range(args.first_seed, args.first_seed + args.seeds))
+    agreed = timed_out = 0
+    mismatches = []
+    for label, source in cases:
+        tree = optimize(parse(source))[0]
+        expected = outcome(lambda output: TreeInterpreter(output).run(parse(source)), args.time_limit)
+        actual = outcome(lambda output: TreeInterpreter(output).run(tree), args.time_limit)
+        if expected is None or actual is None:
+            timed_out += 1
+        elif actual == expected:
+            agreed += 1
+        else:
+            mismatches.append(label)
+            (kind, value), output = actual
+            (expected_kind, expected_value), expected_output = expected
+            print(f"{label}: optimized {kind} {value} after {len(output)} prints, "
+                  f"unoptimized {expected_kind} {expected_value} after {len(expected_output)} prints")
+    print(f"{agreed} programs agree, {len(mismatches)} differ, {timed_out} over the time limit")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import argparse
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.generator import generate_program
+from benchmarks.parsers import best_time, make_program, program_body
+from parallel_lex import lex_file_parallel
+from tokens_lexems import lex_offsets
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Measure parallel lexing of one large file against core count.")
+    arg_parser.add_argument('--megabytes', type=float, default=16.0, help="approximate size of the generated file")
+    arg_parser.add_argument('--workers', help="comma separated worker counts (default: 1, 2, 4, ... up to CPU count)")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    cpus = os.cpu_count() or 1
+    if args.workers:
+        counts = [int(count) for count in args.workers.split(',')]
+    else:
+        counts = [1 << power for power in range(cpus.bit_length()) if 1 << power <= cpus]
+        if counts[-1] != cpus:
+            counts.append(cpus)
+
+    body = program_body(generate_program(args.seed, statements=2000))
+    source = make_program(body, max(1, int(args.megabytes * 1024 * 1024 / len(body))))
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as file:
+        file.write(source)
+    try:
+        expected = lex_offsets(source)
+        sequential = best_time(lambda: lex_offsets(source), args.repeat)
+        print(f"{len(source) / 1024 / 1024:.1f} MiB, {len(expected)} tokens, {cpus} CPUs")
+        print(f"{'workers':>8}{'seconds':>12}{'speedup':>10}")
+        print(f"{'seq':>8}{sequential:>12.4f}{1.0:>10.2f}")
+        for count in counts:
+            with ProcessPoolExecutor(max_workers=count) as executor:
+                tokens = lex_file_parallel(file.name, count, executor=executor)
+                if tokens != expected:
+                    print(f"parallel lexing with {count} workers differs from sequential lexing", file=sys.stderr)
+                    return 1
+                seconds = best_time(lambda: lex_file_parallel(file.name, count, executor=executor), args.repeat)
+            print(f"{count:>8}{seconds:>12.4f}{sequential / seconds:>10.2f}")
+    finally:
+        os.unlink(file.name)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import argparse
+import time
+
+from ll1 import LL1Parser, load_table
+from parser import Parser
+from tokens_lexems import lex, read_source_code
+
+def make_program(body, copies):
+    return "begin{\n" + body * copies + "}end\n"
+
+def program_body(source_code):
+    start = source_code.index('{') + 1
+    end = source_code.rindex('}')
+    return source_code[start:end] + "\n"
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Compare the recursive-descent and LL(1) table-driven parsers.")
+    arg_parser.add_argument('--source', default='source_code.txt')
+    arg_parser.add_argument('--sizes', default='100,1000,10000', help="comma separated copies of the program body")
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    body = program_body(read_source_code(args.source))
+    ll1_parser = LL1Parser(load_table())
+    print(f"{'copies':>8}{'tokens':>10}{'recursive (s)':>16}{'ll1 (s)':>12}{'ll1/recursive':>16}")
+    for copies in (int(size) for size in args.sizes.split(',')):
+        tokens = lex(make_program(body, copies))
+        recursive = best_time(lambda: Parser(tokens).parse(), args.repeat)
+        table_driven = best_time(lambda: ll1_parser.parse(tokens), args.repeat)
+        print(f"{copies:>8}{len(tokens):>10}{recursive:>16.4f}{table_driven:>12.4f}{table_driven / recursive:>16.2f}")
+
+if __name__ == "__main__":
+    main()
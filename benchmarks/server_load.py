@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generator import generate_program
+from compile_server import STREAM_LIMIT
+from compiler import DEFAULT_PHASES
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def wait_for_socket(path, process, timeout=30.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"compile server exited with status {process.returncode}")
+        try:
+            reader, writer = await asyncio.open_unix_connection(path, limit=STREAM_LIMIT)
+        except (FileNotFoundError, ConnectionRefusedError):
+            await asyncio.sleep(0.05)
+            continue
+        writer.close()
+        return
+    raise TimeoutError(f"compile server did not listen on {path}")
+
+async def request(reader, writer, payload):
+    writer.write(json.dumps(payload).encode('utf-8') + b'\n')
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+async def run_client(path, client, sources, requests, phases, latencies, errors):
+    reader, writer = await asyncio.open_unix_connection(path, limit=STREAM_LIMIT)
+    try:
+        for index in range(requests):
+            source = sources[(client * requests + index) % len(sources)]
+            start = time.perf_counter()
+            response = await request(reader, writer, {'id': index, 'source': source, 'phases': phases})
+            latencies.append(time.perf_counter() - start)
+            if 'error' in response:
+                errors.append(response['error'])
+    finally:
+        writer.close()
+
+async def check_cancellation(path, source, phases):
+    reader, writer = await asyncio.open_unix_connection(path, limit=STREAM_LIMIT)
+    try:
+        writer.write(json.dumps({'id': 'slow', 'source': source, 'phases': phases}).encode('utf-8') + b'\n')
+        writer.write(json.dumps({'cancel': 'slow'}).encode('utf-8') + b'\n')
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        return response.get('cancelled', False)
+    finally:
+        writer.close()
+
+async def run_load(path, clients, requests, sources, phases):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(path, client, sources, requests, phases, latencies, errors)
+                           for client in range(clients)))
+    elapsed = time.perf_counter() - start
+    reader, writer = await asyncio.open_unix_connection(path, limit=STREAM_LIMIT)
+    stats = (await request(reader, writer, {'id': 'stats', 'stats': True}))['stats']
+    writer.close()
+    return latencies, errors, elapsed, stats
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Drive the compile server with concurrent clients.")
+    arg_parser.add_argument('--socket', help="connect to a running server instead of starting one")
+    arg_parser.add_argument('--workers', type=int, help="worker processes for a server started here")
+    arg_parser.add_argument('--clients', type=int, default=16)
+    arg_parser.add_argument('--requests', type=int, default=50, help="requests per client")
+    arg_parser.add_argument('--programs', type=int, default=64, help="distinct programs; repeats hit the server cache")
+    arg_parser.add_argument('--statements', type=int, default=200)
+    arg_parser.add_argument('--phases', default=','.join(DEFAULT_PHASES))
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args(argv)
+
+    phases = [phase.strip() for phase in args.phases.split(',') if phase.strip()]
+    sources = [generate_program(args.seed + index, statements=args.statements) for index in range(args.programs)]
+    process = None
+    path = args.socket
+    directory = None
+    if path is None:
+        directory = tempfile.TemporaryDirectory()
+        path = os.path.join(directory.name, 'compile.sock')
+        command = [sys.executable, '-m', 'compile_server', '--socket', path]
+        if args.workers is not None:
+            command += ['--workers', str(args.workers)]
+        process = subprocess.Popen(command)
+    try:
+        if process is not None:
+            asyncio.run(wait_for_socket(path, process))
+        latencies, errors, elapsed, stats = asyncio.run(run_load(path, args.clients, args.requests, sources, phases))
+        cancelled = asyncio.run(check_cancellation(path, generate_program(args.seed, statements=20000), phases))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+            directory.cleanup()
+
+    count = len(latencies)
+    print(f"{count} requests from {args.clients} clients in {elapsed:.3f} s: {count / elapsed:.1f} requests/sec")
+    print(f"latency p50 {percentile(latencies, 0.50) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms, "
+          f"max {max(latencies) * 1000:.2f} ms")
+    print(f"server cache hits {stats['cache_hits']}, errors {len(errors)}, "
+          f"cancellation {'acknowledged' if cancelled else 'lost to completion'}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
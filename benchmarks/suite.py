@@ -0,0 +1,161 @@
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+
+from benchmarks.generator import generate_program, replicate_grammar
+from first_follow import GrammarAnalysis
+from grammar import parse_grammar
+from parser import Parser
+from tokens_lexems import lex_offsets
+from unordered_symbol_table import build_symbol_table
+
+RESULTS_FORMAT = 1
+PHASES = ('lex', 'parse', 'symbols', 'first_follow')
+
+def measure(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def program_cases(sizes, seed, knobs):
+    for size in sizes:
+        source = generate_program(seed, statements=size, **knobs)
+        tokens = lex_offsets(source, positions=True)
+        tree = Parser(tokens).parse()
+        yield size, source, tokens, tree
+
+def run_suite(sizes, grammar_sizes, phases=PHASES, repeat=3, seed=0, grammar_path='grammer.txt', **knobs):
+    results = {
+        'format': RESULTS_FORMAT,
+        'python': platform.python_version(),
+        'seed': seed,
+        'knobs': knobs,
+        'phases': {phase: [] for phase in phases},
+    }
+    program_phases = [phase for phase in phases if phase != 'first_follow']
+    if program_phases:
+        for size, source, tokens, tree in program_cases(sizes, seed, knobs):
+            work = {
+                'lex': lambda: lex_offsets(source, positions=True),
+                'parse': lambda: Parser(tokens).parse(),
+                'symbols': lambda: build_symbol_table(tree),
+            }
+            for phase in program_phases:
+                seconds, peak = measure(work[phase], repeat)
+                results['phases'][phase].append(
+                    {'size': size, 'units': len(tokens), 'seconds': seconds, 'peak_bytes': peak})
+    if 'first_follow' in phases:
+        with open(grammar_path, 'r') as file:
+            text = file.read()
+        for size in grammar_sizes:
+            grammar = parse_grammar(replicate_grammar(text, size))
+            seconds, peak = measure(lambda: GrammarAnalysis(grammar), repeat)
+            results['phases']['first_follow'].append(
+                {'size': size, 'units': len(grammar.productions), 'seconds': seconds, 'peak_bytes': peak})
+    return results
+
+def compare(results, baseline, threshold=0.2, memory_threshold=0.2):
+    regressions = []
+    for phase, entries in results['phases'].items():
+        baseline_entries = {entry['size']: entry for entry in baseline.get('phases', {}).get(phase, [])}
+        for entry in entries:
+            old = baseline_entries.get(entry['size'])
+            if old is None:
+                continue
+            for key, limit in (('seconds', threshold), ('peak_bytes', memory_threshold)):
+                if old[key] and entry[key] > old[key] * (1 + limit):
+                    regressions.append(f"{phase} at size {entry['size']}: {key} {old[key]:.6g} -> {entry[key]:.6g} "
+                                       f"(+{(entry[key] / old[key] - 1) * 100:.1f}%, limit {limit * 100:.0f}%)")
+    return regressions
+
+def scaling(results, tolerance=0.25):
+    report = []
+    for phase, entries in results['phases'].items():
+        for smaller, larger in zip(entries, entries[1:]):
+            if smaller['units'] == larger['units'] or not smaller['seconds']:
+                continue
+            exponent = math.log(larger['seconds'] / smaller['seconds']) / math.log(larger['units'] / smaller['units'])
+            report.append((phase, smaller['units'], larger['units'], exponent, exponent > 1 + tolerance))
+    return report
+
+def print_results(results):
+    print(f"{'phase':<14}{'size':>8}{'units':>10}{'seconds':>12}{'units/sec':>14}{'peak KiB':>12}")
+    for phase, entries in results['phases'].items():
+        for entry in entries:
+            rate = entry['units'] / entry['seconds'] if entry['seconds'] else 0.0
+            print(f"{phase:<14}{entry['size']:>8}{entry['units']:>10}{entry['seconds']:>12.4f}"
+                  f"{rate:>14.0f}{entry['peak_bytes'] / 1024:>12.1f}")
+
+def print_scaling(report):
+    print("\nScaling (time exponent between consecutive sizes, 1.0 is linear):")
+    for phase, smaller, larger, exponent, flagged in report:
+        print(f"  {phase:<14}{smaller:>10} -> {larger:<10}{exponent:>6.2f}{'  SUPER-LINEAR' if flagged else ''}")
+
+def sizes_argument(text):
+    return [int(size) for size in text.split(',') if size.strip()]
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Per-phase time and memory benchmarks on generated programs.")
+    arg_parser.add_argument('--sizes', type=sizes_argument, default=[250, 1000, 4000],
+                            help="comma separated statement counts for generated programs")
+    arg_parser.add_argument('--grammar-sizes', type=sizes_argument, default=[10, 40, 160],
+                            help="comma separated copies of grammer.txt for the FIRST/FOLLOW phase")
+    arg_parser.add_argument('--phases', default=','.join(PHASES))
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--depth', type=int, default=3, help="maximum block nesting depth")
+    arg_parser.add_argument('--identifiers', type=int, default=16, help="distinct identifiers used")
+    arg_parser.add_argument('--string-density', type=float, default=0.1)
+    arg_parser.add_argument('--list-density', type=float, default=0.05)
+    arg_parser.add_argument('--output', help="write the results as JSON to this path")
+    arg_parser.add_argument('--baseline', help="JSON results to compare against")
+    arg_parser.add_argument('--threshold', type=float, default=0.2, help="allowed fractional slowdown per phase")
+    arg_parser.add_argument('--memory-threshold', type=float, default=0.2,
+                            help="allowed fractional growth of peak memory per phase")
+    arg_parser.add_argument('--scaling-tolerance', type=float, default=0.25,
+                            help="flag phases whose time exponent exceeds 1 + this value")
+    arg_parser.add_argument('--fail-on-scaling', action='store_true', help="exit non-zero on super-linear phases")
+    args = arg_parser.parse_args(argv)
+
+    phases = tuple(phase.strip() for phase in args.phases.split(',') if phase.strip())
+    unknown = set(phases) - set(PHASES)
+    if unknown:
+        arg_parser.error(f"unknown phases: {', '.join(sorted(unknown))}")
+    results = run_suite(args.sizes, args.grammar_sizes, phases, args.repeat, args.seed,
+                        max_depth=args.depth, identifiers=args.identifiers,
+                        string_density=args.string_density, list_density=args.list_density)
+    print_results(results)
+    report = scaling(results, args.scaling_tolerance)
+    print_scaling(report)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    status = 0
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold, args.memory_threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            status = 1
+    if args.fail_on_scaling and any(flagged for *_, flagged in report):
+        status = status or 2
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import argparse
+
+from benchmarks.generator import generate_loop_program
+from benchmarks.parsers import best_time
+from bytecode import compile_tree as compile_bytecode, run as run_bytecode
+from interpreter import TreeInterpreter
+from parser import Parser
+from tokens_lexems import lex
+from transpiler import CodeCache, compile_source, compile_tree, run
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Compare transpiled Python code objects with the bytecode VM and AST evaluation.")
+    arg_parser.add_argument('--iterations', default='1000,10000,50000', help="comma separated loop trip counts")
+    arg_parser.add_argument('--loops', type=int, default=4)
+    arg_parser.add_argument('--statements', type=int, default=6, help="statements per loop body")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    print(f"{'iterations':>10}{'transpile (s)':>15}{'cached (s)':>12}{'native (s)':>12}{'vm (s)':>10}{'ast (s)':>10}"
+          f"{'vm/native':>11}{'ast/native':>12}")
+    for iterations in (int(count) for count in args.iterations.split(',')):
+        source = generate_loop_program(args.seed, args.loops, iterations, args.statements)
+        tree = Parser(lex(source, positions=True)).parse()
+        transpiled = best_time(lambda: compile_tree(tree), args.repeat)
+        cache = CodeCache()
+        compile_source(source, cache)
+        cached = best_time(lambda: compile_source(source, cache), args.repeat)
+        code, program = compile_tree(tree), compile_bytecode(tree)
+        native_output, vm_output, ast_output = [], [], []
+        results = (run(code, native_output.append), run_bytecode(program, vm_output.append),
+                   TreeInterpreter(ast_output.append).run(tree))
+        if not results[0] == results[1] == results[2] or not native_output == vm_output == ast_output:
+            raise AssertionError(f"transpiled code, VM and AST evaluation disagree at {iterations} iterations")
+        native = best_time(lambda: run(code, lambda value: None), args.repeat)
+        vm = best_time(lambda: run_bytecode(program, lambda value: None), args.repeat)
+        ast = best_time(lambda: TreeInterpreter(lambda value: None).run(tree), args.repeat)
+        print(f"{iterations:>10}{transpiled:>15.4f}{cached:>12.6f}{native:>12.4f}{vm:>10.4f}{ast:>10.4f}"
+              f"{vm / native:>11.2f}{ast / native:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import argparse
+
+from benchmarks.generator import generate_loop_program
+from benchmarks.parsers import best_time
+from bytecode import compile_tree, run
+from interpreter import TreeInterpreter
+from parser import Parser
+from tokens_lexems import lex
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Compare the bytecode VM with direct AST evaluation.")
+    arg_parser.add_argument('--iterations', default='1000,10000,50000', help="comma separated loop trip counts")
+    arg_parser.add_argument('--loops', type=int, default=4)
+    arg_parser.add_argument('--statements', type=int, default=6, help="statements per loop body")
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    print(f"{'iterations':>10}{'compile (s)':>14}{'vm (s)':>10}{'ast (s)':>10}{'ast/vm':>10}")
+    for iterations in (int(count) for count in args.iterations.split(',')):
+        source = generate_loop_program(args.seed, args.loops, iterations, args.statements)
+        tree = Parser(lex(source, positions=True)).parse()
+        compiled = best_time(lambda: compile_tree(tree), args.repeat)
+        program = compile_tree(tree)
+        vm_output, ast_output = [], []
+        if run(program, vm_output.append) != TreeInterpreter(ast_output.append).run(tree) or vm_output != ast_output:
+            raise AssertionError(f"VM and AST evaluation disagree at {iterations} iterations")
+        vm = best_time(lambda: run(program, lambda value: None), args.repeat)
+        ast = best_time(lambda: TreeInterpreter(lambda value: None).run(tree), args.repeat)
+        print(f"{iterations:>10}{compiled:>14.4f}{vm:>10.4f}{ast:>10.4f}{ast / vm:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+from array import array
+
+from dataflow import allocate_addresses, build_flow_graph
+from interpreter import (BINARY_OPERATORS, COMPOUND_OPERATORS, DEFAULT_VALUES, binary_operator, number_value,
+                         string_value)
+from parser import Parser, run_nested
+from tokens_lexems import lex_offsets
+from unordered_symbol_table import SymbolTable, _declare, _declare_iterator, token_line
+
+OPCODES = (
+    'LOAD_SLOT', 'LOAD_CONST', 'STORE_SLOT', 'BINARY', 'JUMP_IF_FALSE', 'JUMP', 'FOR_ITER',
+    'BINARY_CONST', 'BUILD_LIST', 'GET_ITER', 'JUMP_IF_FALSE_OR_POP', 'JUMP_IF_TRUE_OR_POP',
+    'POP_TOP', 'PRINT', 'RETURN', 'HALT',
+)
+(LOAD_SLOT, LOAD_CONST, STORE_SLOT, BINARY, JUMP_IF_FALSE, JUMP, FOR_ITER,
+ BINARY_CONST, BUILD_LIST, GET_ITER, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP,
+ POP_TOP, PRINT, RETURN, HALT) = range(len(OPCODES))
+
+JUMP_OPCODES = {JUMP_IF_FALSE, JUMP, FOR_ITER, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP}
+
+OPERATOR_NAMES = tuple(BINARY_OPERATORS)
+OPERATOR_FUNCTIONS = tuple(BINARY_OPERATORS.values())
+OPERATOR_BITS = 4
+OPERATOR_MASK = (1 << OPERATOR_BITS) - 1
+
+class Bytecode:
+    def __init__(self, code, constants, slot_names, symbol_table):
+        self.code = code
+        self.constants = constants
+        self.slot_names = slot_names
+        self.frame_size = len(slot_names)
+        self.symbol_table = symbol_table
+
+    def __len__(self):
+        return len(self.code) // 2
+
+    def disassemble(self):
+        lines = []
+        code = self.code
+        for pc in range(0, len(code), 2):
+            op, arg = code[pc], code[pc + 1]
+            if op in (LOAD_SLOT, STORE_SLOT):
+                detail = self.slot_names[arg]
+            elif op == LOAD_CONST:
+                detail = repr(self.constants[arg])
+            elif op == BINARY:
+                detail = OPERATOR_NAMES[arg]
+            elif op == BINARY_CONST:
+                detail = f"{OPERATOR_NAMES[arg & OPERATOR_MASK]} {self.constants[arg >> OPERATOR_BITS]!r}"
+            elif op in JUMP_OPCODES:
+                detail = f"-> {arg}"
+            else:
+                detail = arg if op == BUILD_LIST else ''
+            lines.append(f"{pc:>6} {OPCODES[op]:<22}{detail}")
+        return "\n".join(lines)
+
+def slot_map(symbol_table):
+    addresses = symbol_table.addresses
+    entries = sorted(symbol_table.rows.items(), key=lambda item: (addresses[item[1]], item[1]))
+    return {key: slot for slot, (key, _) in enumerate(entries)}
+
+def shared_slot_map(tree):
+    # every variable takes one slot; variables that are never live at the same time share it
+    graph = build_flow_graph(tree)
+    return allocate_addresses(graph, [1] * graph.symbol_table.counter).keys()
+
+class BytecodeCompiler:
+    def __init__(self, reuse_slots=False):
+        self.reuse_slots = reuse_slots
+        self.code = array('i')
+        self.constants = []
+        self.constant_ids = {}
+        self.symbol_table = SymbolTable()
+        self.slot_refs = []
+        self.loops = []
+
+    def emit(self, op, arg=0):
+        self.code.append(op)
+        self.code.append(arg)
+        return len(self.code) - 2
+
+    def patch(self, position, target=None):
+        self.code[position + 1] = len(self.code) if target is None else target
+
+    def constant(self, value):
+        key = (type(value), value)
+        index = self.constant_ids.get(key)
+        if index is None:
+            index = self.constant_ids[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def emit_slot(self, op, key):
+        self.slot_refs.append((self.emit(op), key))
+
+    def reference(self, token):
+        self.symbol_table.reference(token[1], token_line(token))
+        return self.symbol_table.lookup(token[1])
+
+    def compile(self, tree):
+        run_nested(self.compile_statements(tree.children))
+        self.emit(HALT)
+        slots = shared_slot_map(tree) if self.reuse_slots else slot_map(self.symbol_table)
+        for position, key in self.slot_refs:
+            self.code[position + 1] = slots[key]
+        slot_names = [None] * (max(slots.values()) + 1 if slots else 0)
+        for key, slot in slots.items():
+            slot_names[slot] = key if slot_names[slot] is None else f"{slot_names[slot]}/{key}"
+        return Bytecode(self.code, self.constants, slot_names, self.symbol_table)
+
+    # statements and expressions compile as generators driven by run_nested, so nesting does not use
+    # the Python stack
+    def compile_statements(self, statements):
+        for statement in statements:
+            yield getattr(self, f"compile_{statement.name}")(statement)
+
+    def compile_scoped(self, statements):
+        self.symbol_table.enter_scope()
+        yield self.compile_statements(statements)
+        self.symbol_table.exit_scope()
+
+    def compile_Declaration(self, node):
+        keyword, identifier = node.children[0], node.children[1]
+        value = node.children[2] if len(node.children) > 2 else None
+        _declare(self.symbol_table, keyword[1], identifier, value)
+        if value is None:
+            self.emit(LOAD_CONST, self.constant(DEFAULT_VALUES.get(keyword[1])))
+        else:
+            yield self.compile_expression(value)
+        self.emit_slot(STORE_SLOT, self.symbol_table.lookup(identifier[1]))
+
+    def compile_Assignment(self, node):
+        identifier, operator_token, expression = node.children
+        key = self.reference(identifier)
+        if operator_token[1] in COMPOUND_OPERATORS:
+            self.emit_slot(LOAD_SLOT, key)
+            yield self.compile_binary_operand(expression, OPERATOR_NAMES.index(COMPOUND_OPERATORS[operator_token[1]]))
+        else:
+            yield self.compile_expression(expression)
+        self.emit_slot(STORE_SLOT, key)
+
+    def compile_Conditional(self, node):
+        yield self.compile_expression(node.children[0].children[0])
+        skip = self.emit(JUMP_IF_FALSE)
+        yield self.compile_scoped(node.children[1].children)
+        exits = []
+        for branch in node.children[2:]:
+            exits.append(self.emit(JUMP))
+            self.patch(skip)
+            if branch.name == 'ElifStatement':
+                yield self.compile_expression(branch.children[0])
+                skip = self.emit(JUMP_IF_FALSE)
+                yield self.compile_scoped(branch.children[1].children)
+            else:
+                skip = None
+                yield self.compile_scoped(branch.children)
+        if skip is not None:
+            self.patch(skip)
+        for position in exits:
+            self.patch(position)
+
+    def compile_loop_body(self, body, continue_target, is_for):
+        self.loops.append((continue_target, [], is_for))
+        yield self.compile_scoped(body.children)
+        return self.loops.pop()[1]
+
+    def compile_WhileLoop(self, node):
+        start = len(self.code)
+        yield self.compile_expression(node.children[0].children[0])
+        exit_jump = self.emit(JUMP_IF_FALSE)
+        breaks = yield self.compile_loop_body(node.children[1], start, False)
+        self.emit(JUMP, start)
+        self.patch(exit_jump)
+        for position in breaks:
+            self.patch(position)
+
+    def compile_ForLoop(self, node):
+        identifier, target, body = node.children
+        yield self.compile_expression(target)
+        self.emit(GET_ITER)
+        self.symbol_table.enter_scope()
+        _declare_iterator(self.symbol_table, identifier, target)
+        key = self.symbol_table.lookup(identifier[1])
+        start = self.emit(FOR_ITER)
+        self.emit_slot(STORE_SLOT, key)
+        breaks = yield self.compile_loop_body(body, start, True)
+        self.symbol_table.exit_scope()
+        self.emit(JUMP, start)
+        self.patch(start)
+        for position in breaks:
+            self.patch(position)
+
+    def compile_PrintStatement(self, node):
+        token = node.children[0]
+        if token[0] == 'IDENTIFIER':
+            self.emit_slot(LOAD_SLOT, self.reference(token))
+        else:
+            self.emit(LOAD_CONST, self.constant(string_value(token)))
+        self.emit(PRINT)
+
+    def compile_Pass(self, node):
+        pass
+
+    def compile_Return(self, node):
+        expression = node.children[0]
+        if expression is None:
+            self.emit(LOAD_CONST, self.constant(None))
+        else:
+            yield self.compile_expression(expression)
+        self.emit(RETURN)
+
+    def compile_LoopControl(self, node):
+        if not self.loops:
+            raise SyntaxError(f"'{node.children[0][1]}' outside of a loop")
+        continue_target, breaks, is_for = self.loops[-1]
+        if node.children[0][1] == 'continue':
+            self.emit(JUMP, continue_target)
+            return
+        if is_for:
+            self.emit(POP_TOP)
+        breaks.append(self.emit(JUMP))
+
+    def compile_binary_operand(self, right, operator_index):
+        if right.name == 'Number' or right.name == 'String':
+            value = number_value(right.children[0]) if right.name == 'Number' else string_value(right.children[0])
+            self.emit(BINARY_CONST, self.constant(value) << OPERATOR_BITS | operator_index)
+        else:
+            yield self.compile_expression(right)
+            self.emit(BINARY, operator_index)
+
+    def compile_expression(self, node):
+        operands = []
+        while node.name in ('BinaryExpression', 'BooleanExpression'):
+            left, operator_token, right = node.children
+            binary_operator(operator_token)
+            operands.append((OPERATOR_NAMES.index(operator_token[1]), right))
+            node = left
+        name = node.name
+        if name == 'Identifier':
+            self.emit_slot(LOAD_SLOT, self.reference(node.children[0]))
+        elif name == 'Number':
+            self.emit(LOAD_CONST, self.constant(number_value(node.children[0])))
+        elif name == 'String':
+            self.emit(LOAD_CONST, self.constant(string_value(node.children[0])))
+        elif name == 'List':
+            for element in node.children:
+                yield self.compile_expression(element)
+            self.emit(BUILD_LIST, len(node.children))
+        elif name == 'LogicalExpression':
+            left, operator_token, right = node.children
+            yield self.compile_expression(left)
+            jump = self.emit(JUMP_IF_FALSE_OR_POP if operator_token[1] == 'and' else JUMP_IF_TRUE_OR_POP)
+            yield self.compile_expression(right)
+            self.patch(jump)
+        else:
+            raise SyntaxError(f"Unexpected {name} in expression")
+        for operator_index, right in reversed(operands):
+            yield self.compile_binary_operand(right, operator_index)
+
+def compile_tree(tree, reuse_slots=False):
+    return BytecodeCompiler(reuse_slots).compile(tree)
+
+def run(program, output=print):
+    code = program.code.tolist()
+    constants = program.constants
+    functions = OPERATOR_FUNCTIONS
+    slots = [None] * program.frame_size
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    pc = 0
+    while True:
+        op = code[pc]
+        arg = code[pc + 1]
+        pc += 2
+        if op == LOAD_SLOT:
+            push(slots[arg])
+        elif op == BINARY_CONST:
+            stack[-1] = functions[arg & OPERATOR_MASK](stack[-1], constants[arg >> OPERATOR_BITS])
+        elif op == STORE_SLOT:
+            slots[arg] = pop()
+        elif op == JUMP_IF_FALSE:
+            if not pop():
+                pc = arg
+        elif op == JUMP:
+            pc = arg
+        elif op == LOAD_CONST:
+            push(constants[arg])
+        elif op == BINARY:
+            right = pop()
+            stack[-1] = functions[arg](stack[-1], right)
+        elif op == FOR_ITER:
+            value = next(stack[-1], stack)
+            if value is stack:
+                pop()
+                pc = arg
+            else:
+                push(value)
+        elif op == BUILD_LIST:
+            if arg:
+                values = stack[-arg:]
+                del stack[-arg:]
+            else:
+                values = []
+            push(values)
+        elif op == GET_ITER:
+            stack[-1] = iter(stack[-1])
+        elif op == JUMP_IF_FALSE_OR_POP:
+            if stack[-1]:
+                pop()
+            else:
+                pc = arg
+        elif op == JUMP_IF_TRUE_OR_POP:
+            if stack[-1]:
+                pc = arg
+            else:
+                pop()
+        elif op == POP_TOP:
+            pop()
+        elif op == PRINT:
+            output(pop())
+        elif op == RETURN:
+            return pop()
+        elif op == HALT:
+            return None
+
+def run_source(source_code, output=print):
+    return run(compile_tree(Parser(lex_offsets(source_code, positions=True)).parse()), output)
+
+#=================================================================
+
+if __name__ == "__main__":
+    import sys
+    from tokens_lexems import read_source_code
+
+    program = compile_tree(Parser(lex_offsets(read_source_code(sys.argv[1] if len(sys.argv) > 1 else 'source_code.txt'),
+                                              positions=True)).parse())
+    print(program.disassemble())
+    print(f"Returned: {run(program)}")
@@ -0,0 +1,157 @@
+from array import array
+from collections.abc import Sequence
+from enum import IntEnum
+
+from parser import ParseNode, Parser, token_text
+
+class NodeKind(IntEnum):
+    Program = 0
+    Declaration = 1
+    Assignment = 2
+    Conditional = 3
+    Condition = 4
+    IfBody = 5
+    ElifStatement = 6
+    ElseBody = 7
+    Body = 8
+    BooleanExpression = 9
+    LogicalExpression = 10
+    PrintStatement = 11
+    WhileLoop = 12
+    ForLoop = 13
+    Pass = 14
+    Return = 15
+    LoopControl = 16
+    BinaryExpression = 17
+    Identifier = 18
+    Number = 19
+    String = 20
+    List = 21
+
+NODE_KINDS = {kind.name: kind for kind in NodeKind}
+
+def is_leaf(ref):
+    return ref < 0
+
+def token_index(ref):
+    return ~ref
+
+class CompactTree:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.kinds = array('B')
+        self.child_start = array('I')
+        self.child_count = array('I')
+        self.child_refs = array('i')
+        self.root = -1
+
+    def add_node(self, kind, children):
+        node = len(self.kinds)
+        self.kinds.append(kind)
+        self.child_start.append(len(self.child_refs))
+        count = 0
+        for child in children:
+            if child is not None:
+                self.child_refs.append(child)
+                count += 1
+        self.child_count.append(count)
+        return node
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def kind(self, node):
+        return NodeKind(self.kinds[node])
+
+    def name(self, node):
+        return NodeKind(self.kinds[node]).name
+
+    def children(self, node):
+        start = self.child_start[node]
+        return self.child_refs[start:start + self.child_count[node]]
+
+    def token(self, ref):
+        return self.tokens[~ref]
+
+    def walk(self, root=None):
+        stack = [self.root if root is None else root]
+        while stack:
+            ref = stack.pop()
+            yield ref
+            if ref >= 0:
+                start = self.child_start[ref]
+                stack.extend(reversed(self.child_refs[start:start + self.child_count[ref]]))
+
+    def visit(self, visitor, root=None):
+        stack = [(self.root if root is None else root, False)]
+        while stack:
+            ref, leaving = stack.pop()
+            if ref < 0:
+                visitor.visit_token(self, ref)
+                continue
+            name = NodeKind(self.kinds[ref]).name
+            if leaving:
+                getattr(visitor, f"leave_{name}", visitor.leave_node)(self, ref)
+                continue
+            if getattr(visitor, f"enter_{name}", visitor.enter_node)(self, ref) is False:
+                continue
+            stack.append((ref, True))
+            start = self.child_start[ref]
+            for child in reversed(self.child_refs[start:start + self.child_count[ref]]):
+                stack.append((child, False))
+
+    def postorder(self, root=None):
+        stack = [(self.root if root is None else root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                yield node
+                continue
+            stack.append((node, True))
+            start = self.child_start[node]
+            for child in reversed(self.child_refs[start:start + self.child_count[node]]):
+                if child >= 0:
+                    stack.append((child, False))
+
+    def to_parse_node(self, root=None):
+        root = self.root if root is None else root
+        built = {}
+        for node in self.postorder(root):
+            children = [self.tokens[~child] if child < 0 else built.pop(child) for child in self.children(node)]
+            built[node] = ParseNode(self.name(node), children)
+        return built[root]
+
+class CompactVisitor:
+    def enter_node(self, tree, node):
+        return True
+
+    def leave_node(self, tree, node):
+        pass
+
+    def visit_token(self, tree, ref):
+        pass
+
+class CompactParser(Parser):
+    def __init__(self, tokens, lookahead=16):
+        if not isinstance(tokens, Sequence):
+            tokens = list(tokens)
+        super().__init__(tokens, lookahead)
+        self.tree = CompactTree(tokens)
+
+    def match(self, expected_type):
+        token = self.current_token()
+        if token and token[0] == expected_type:
+            index = self.index
+            self.advance()
+            return ~index
+        raise self.error(f"Expected {expected_type}, but got {token_text(token)}")
+
+    def make_node(self, name, children):
+        return self.tree.add_node(NODE_KINDS[name], children)
+
+    def parse(self):
+        self.tree.root = self.parse_program()
+        return self.tree
+
+def parse_compact(tokens):
+    return CompactParser(tokens).parse()
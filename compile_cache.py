@@ -0,0 +1,387 @@
+import gc
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from importlib.util import find_spec
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from compiler import DEFAULT_PHASES, CompilationResult, compile
+from parser import ParseNode
+from tokens_lexems import TokenStream, format_syntax_error
+from unordered_symbol_table import SymbolTable
+
+CACHE_DIRECTORY = '.compile_cache'
+CACHE_FORMAT = 4
+MAGIC = b'CCH' + bytes([CACHE_FORMAT])
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# the source of every module whose output an entry holds is part of the key, so changing any of them
+# invalidates the cache without a version bump
+PIPELINE_MODULES = ('compiler', 'tokens_lexems', 'parallel_lex', 'parser', 'optimizer', 'unordered_symbol_table',
+                    'compile_cache')
+
+HAS_TOKENS, HAS_LINES, HAS_TREE, HAS_SYMBOLS, HAS_OPTIMIZATION = 1, 2, 4, 8, 16
+
+NONE_CHILD = -1
+INLINE_TOKEN = -2
+
+ENTRY_HEADER = struct.Struct('<4sIBH')
+SECTION_HEADER = struct.Struct('<cI')
+SECTION_COUNTS = ((HAS_TOKENS, 3), (HAS_TREE, 1), (HAS_SYMBOLS, 1), (HAS_OPTIMIZATION, 1))
+
+class StringTable:
+    def __init__(self):
+        self.ids = {}
+
+    def id(self, string):
+        ids = self.ids
+        return ids.setdefault(string, len(ids))
+
+    def to_sections(self):
+        encoded = [string.encode('utf-8', 'surrogatepass') for string in self.ids]
+        return [array('I', map(len, encoded)), array('B', b''.join(encoded))]
+
+def narrowest(section):
+    if not section:
+        return section
+    for typecode in ('B', 'H', 'I', 'Q') if min(section) >= 0 else ('b', 'h', 'i', 'q'):
+        try:
+            return array(typecode, section)
+        except OverflowError:
+            continue
+    return section
+
+def _encode_tree(tree, strings):
+    ids = strings.ids
+    reversed_stream = []
+    emit = reversed_stream.extend
+    stack = [tree]
+    pop, push = stack.pop, stack.extend
+    while stack:
+        item = pop()
+        if item is None:
+            reversed_stream.append(NONE_CHILD)
+        elif type(item) is tuple:
+            emit((item[2] if len(item) > 2 else -1, ids.setdefault(item[1], len(ids)),
+                  ids.setdefault(item[0], len(ids)), INLINE_TOKEN))
+        else:
+            emit((len(item.children), ids.setdefault(item.name, len(ids))))
+            push(item.children)
+    reversed_stream.reverse()
+    return array('q', reversed_stream)
+
+def _encode_optimization(report, strings):
+    fields = array('q', [report.folded, report.propagated])
+    for name, line, reason in report.removed:
+        fields.extend((strings.id(name), line, strings.id(reason)))
+    return [fields]
+
+def serialize_result(result):
+    strings = StringTable()
+    flags = 0
+    sections = []
+    if result.tokens is not None:
+        # the source is part of the key, so the offset columns are all a token stream needs
+        tokens = result.tokens
+        flags |= HAS_TOKENS | (HAS_LINES if tokens.positions else 0)
+        sections += [tokens.kinds, tokens.starts, tokens.ends]
+    if result.tree is not None:
+        flags |= HAS_TREE
+        sections.append(_encode_tree(result.tree, strings))
+    if result.symbol_table is not None:
+        flags |= HAS_SYMBOLS
+        sections.append(array('B', result.symbol_table.to_bytes()))
+    if result.optimization is not None:
+        flags |= HAS_OPTIMIZATION
+        sections += _encode_optimization(result.optimization, strings)
+    sections = strings.to_sections() + sections
+    parts = []
+    for section in map(narrowest, sections):
+        data = section.tobytes()
+        parts.append(SECTION_HEADER.pack(section.typecode.encode('ascii'), len(data)))
+        parts.append(data)
+    payload = b''.join(parts)
+    return ENTRY_HEADER.pack(MAGIC, zlib.crc32(payload), flags, len(sections)) + payload
+
+def _read_sections(data):
+    # sections are decoded lazily, on first use outside get(), so every byte is verified here first
+    magic, checksum, flags, count = ENTRY_HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a compilation cache entry")
+    view = memoryview(data)
+    offset = ENTRY_HEADER.size
+    if zlib.crc32(view[offset:]) != checksum:
+        raise ValueError("Corrupt compilation cache entry")
+    if count != 2 + sum(sections for flag, sections in SECTION_COUNTS if flags & flag):
+        raise ValueError("Compilation cache entry does not match its flags")
+    sections = []
+    for _ in range(count):
+        typecode, length = SECTION_HEADER.unpack_from(data, offset)
+        offset += SECTION_HEADER.size
+        section = array(typecode.decode('ascii'))
+        section.frombytes(view[offset:offset + length])
+        offset += length
+        sections.append(section)
+    if offset != len(data):
+        raise ValueError("Truncated compilation cache entry")
+    return flags, sections
+
+def _decode_tree(stream, strings):
+    stack = []
+    push = stack.append
+    values = iter(stream.tolist())
+    for value in values:
+        if value >= 0:
+            count = next(values)
+            if count:
+                children = stack[-count:]
+                del stack[-count:]
+            else:
+                children = []
+            push(ParseNode(strings[value], children))
+        elif value == NONE_CHILD:
+            push(None)
+        elif value == INLINE_TOKEN:
+            kind, lexeme, line = next(values), next(values), next(values)
+            push((strings[kind], strings[lexeme]) + ((line,) if line >= 0 else ()))
+    return stack[0]
+
+def _decode_optimization(fields, strings):
+    from optimizer import OptimizationReport
+
+    report = OptimizationReport()
+    report.folded, report.propagated = fields[0], fields[1]
+    for position in range(2, len(fields), 3):
+        report.removed.append((strings[fields[position]], fields[position + 1], strings[fields[position + 2]]))
+    return report
+
+class CachedResult(CompilationResult):
+    def __init__(self, data, source):
+        self.source = source
+        self.timings = {}
+        self._flags, self._sections = _read_sections(data)
+        self._strings = None
+
+    def _string_table(self):
+        if self._strings is None:
+            lengths, blob = self._sections[0], self._sections[1].tobytes()
+            self._strings = strings = []
+            offset = 0
+            for length in lengths:
+                strings.append(blob[offset:offset + length].decode('utf-8', 'surrogatepass'))
+                offset += length
+        return self._strings
+
+    def _sections_for(self, flag):
+        position = 2
+        for earlier, count in SECTION_COUNTS:
+            if earlier == flag:
+                return self._sections[position:position + count]
+            if self._flags & earlier:
+                position += count
+
+    def __getattr__(self, name):
+        flag = {'tokens': HAS_TOKENS, 'tree': HAS_TREE, 'symbol_table': HAS_SYMBOLS,
+                'optimization': HAS_OPTIMIZATION}.get(name)
+        if flag is None or name.startswith('_'):
+            raise AttributeError(name)
+        value = None
+        if self._flags & flag:
+            strings = self._string_table()
+            collecting = gc.isenabled()
+            gc.disable()
+            try:
+                value = getattr(self, f"_decode_{name}")(strings, *self._sections_for(flag))
+            finally:
+                if collecting:
+                    gc.enable()
+        setattr(self, name, value)
+        return value
+
+    def _decode_tokens(self, strings, kinds, starts, ends):
+        offset_type = 'I' if len(self.source) < 1 << 32 else 'Q'
+        return TokenStream(self.source, array('B', kinds), array(offset_type, starts), array(offset_type, ends),
+                           bool(self._flags & HAS_LINES))
+
+    def _decode_tree(self, strings, stream):
+        return _decode_tree(stream, strings)
+
+    def _decode_symbol_table(self, strings, data):
+        return SymbolTable.from_bytes(data.tobytes())
+
+    def _decode_optimization(self, strings, fields):
+        return _decode_optimization(fields, strings)
+
+def deserialize_result(data, source):
+    return CachedResult(data, source)
+
+def pipeline_digest(modules=PIPELINE_MODULES):
+    digest = hashlib.sha256()
+    for name in modules:
+        spec = find_spec(name)
+        with open(spec.origin, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+def grammar_digest(file_path='grammer.txt'):
+    try:
+        with open(file_path, 'rb') as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except OSError:
+        return ''
+
+class CompilationCache:
+    def __init__(self, directory=CACHE_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES, grammar_path='grammer.txt'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.grammar = grammar_digest(grammar_path)
+        self.pipeline = pipeline_digest()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'errors': 0,
+                      'bytes_read': 0, 'bytes_written': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, source, phases=DEFAULT_PHASES):
+        digest = hashlib.sha256()
+        digest.update(f"{CACHE_FORMAT}\0{sys.byteorder}\0{self.pipeline}\0{self.grammar}\0{','.join(sorted(phases))}\0".encode('utf-8'))
+        digest.update(source.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def get(self, key, source):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            result = deserialize_result(data, source)
+        except FileNotFoundError:
+            self.stats['misses'] += 1
+            return None
+        except (OSError, ValueError, IndexError, StopIteration, struct.error):
+            self.stats['errors'] += 1
+            self.stats['misses'] += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats['hits'] += 1
+        self.stats['bytes_read'] += len(data)
+        return result
+
+    def put(self, key, result):
+        data = serialize_result(result)
+        path = self.path(key)
+        # a unique temporary file per writer, so threads writing the same key never share one
+        descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', prefix=f"{key}.", dir=self.directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            os.replace(temporary_path, path)
+        except BaseException:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            raise
+        self.stats['writes'] += 1
+        self.stats['bytes_written'] += len(data)
+        self.evict()
+
+    def entries(self):
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith('.bin'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def summary(self):
+        entries = self.entries()
+        return {'entries': len(entries), 'bytes': sum(size for _, size, _ in entries), **self.stats}
+
+def compile_cached(source, phases=DEFAULT_PHASES, cache=None, lex_workers=None):
+    cache = cache or CompilationCache()
+    start = time.perf_counter()
+    key = cache.key(source, phases)
+    result = cache.get(key, source)
+    if result is not None:
+        result.timings['cache'] = time.perf_counter() - start
+        return result
+    result = compile(source, phases, lex_workers)
+    start = time.perf_counter()
+    cache.put(key, result)
+    result.timings['cache store'] = time.perf_counter() - start
+    return result
+
+#=================================================================
+
+def main(argv=None):
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Inspect or exercise the on-disk compilation cache.")
+    arg_parser.add_argument('files', nargs='*', help="sources to compile through the cache")
+    arg_parser.add_argument('--directory', default=CACHE_DIRECTORY)
+    arg_parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES)
+    arg_parser.add_argument('--clear', action='store_true', help="remove every cached entry first")
+    args = arg_parser.parse_args(argv)
+
+    cache = CompilationCache(args.directory, args.max_bytes)
+    if args.clear:
+        cache.clear()
+    for path in args.files:
+        with open(path, 'r') as file:
+            source = file.read()
+        start = time.perf_counter()
+        try:
+            compile_cached(source, DEFAULT_PHASES, cache)
+        except SyntaxError as e:
+            print(format_syntax_error(e, path), file=sys.stderr)
+            continue
+        print(f"{path}: {(time.perf_counter() - start) * 1000:.3f} ms")
+    for name, value in cache.summary().items():
+        print(f"{name:<14}{value}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
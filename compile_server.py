@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import json
+import os
+import signal
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from batch import symbol_rows
+from compiler import DEFAULT_PHASES, PHASES, compile
+
+STREAM_LIMIT = 64 * 1024 * 1024
+
+def warm_worker():
+    compile("begin { int x = 1; } end", PHASES)
+
+def compile_request(source, phases):
+    start = time.perf_counter()
+    try:
+        result = compile(source, phases)
+    except Exception as e:
+        return json.dumps({'error': f"{type(e).__name__}: {e}"})
+    payload = {}
+    if 'tokens' in phases:
+        payload['tokens'] = list(result.tokens)
+    if 'parse' in phases:
+        payload['tree'] = str(result.tree)
+    if 'optimize' in phases:
+        payload['optimization'] = result.optimization.lines()
+    if 'symbols' in phases:
+        payload['symbols'] = symbol_rows(result.symbol_table)
+    payload['seconds'] = time.perf_counter() - start
+    return json.dumps(payload)
+
+def with_id(request_id, body):
+    return f'{{"id": {json.dumps(request_id)}, {body[1:]}'
+
+class CompileServer:
+    def __init__(self, workers=None, max_pending=64, cache_size=256):
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.pool = None
+        self.pending = None
+        self.stats = {'requests': 0, 'completed': 0, 'errors': 0, 'cancelled': 0, 'cache_hits': 0,
+                      'connections': 0, 'in_flight': 0}
+
+    async def start(self):
+        self.pending = asyncio.Semaphore(self.max_pending)
+        if self.workers > 0:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=warm_worker)
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(self.pool, warm_worker) for _ in range(self.workers)))
+        else:
+            warm_worker()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    async def compile(self, source, phases):
+        key = hashlib.sha256(f"{','.join(phases)}\0{source}".encode('utf-8', 'surrogatepass')).digest()
+        body = self.cache.get(key)
+        if body is not None:
+            self.cache.move_to_end(key)
+            self.stats['cache_hits'] += 1
+            return body
+        if self.pool is None:
+            body = compile_request(source, phases)
+        else:
+            body = await asyncio.get_running_loop().run_in_executor(self.pool, compile_request, source, phases)
+        if self.cache_size:
+            self.cache[key] = body
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return body
+
+    async def serve_request(self, request, send):
+        request_id = request.get('id')
+        self.stats['in_flight'] += 1
+        try:
+            phases = tuple(request.get('phases', DEFAULT_PHASES))
+            unknown = set(phases) - set(PHASES)
+            if unknown:
+                body = json.dumps({'error': f"Unknown phases: {', '.join(sorted(unknown))}"})
+            elif not isinstance(request.get('source'), str):
+                body = json.dumps({'error': "Request needs a 'source' string"})
+            else:
+                body = await self.compile(request['source'], phases)
+            if body.startswith('{"error"'):
+                self.stats['errors'] += 1
+            self.stats['completed'] += 1
+            await send(with_id(request_id, body))
+        finally:
+            self.stats['in_flight'] -= 1
+
+    async def handle_connection(self, reader, writer):
+        self.stats['connections'] += 1
+        tasks = {}
+        write_lock = asyncio.Lock()
+
+        async def send(line):
+            async with write_lock:
+                writer.write(line.encode('utf-8', 'surrogatepass') + b'\n')
+                await writer.drain()
+
+        def finished(request_id, task):
+            if tasks.get(request_id) is task:
+                del tasks[request_id]
+            self.pending.release()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("expected a JSON object")
+                except ValueError as e:
+                    await send(json.dumps({'id': None, 'error': f"Invalid request: {e}"}))
+                    continue
+                if 'cancel' in request:
+                    task = tasks.pop(request['cancel'], None)
+                    if task is not None and task.cancel():
+                        self.stats['cancelled'] += 1
+                        await send(json.dumps({'id': request['cancel'], 'cancelled': True}))
+                    continue
+                if request.get('stats'):
+                    await send(json.dumps({'id': request.get('id'), 'stats': dict(self.stats)}))
+                    continue
+                # stop reading while max_pending requests are in flight so the client blocks on a full socket
+                await self.pending.acquire()
+                self.stats['requests'] += 1
+                task = asyncio.ensure_future(self.serve_request(request, send))
+                tasks[request.get('id')] = task
+                task.add_done_callback(lambda task, request_id=request.get('id'): finished(request_id, task))
+        except BaseException as e:
+            # a dropped client or a server shutdown abandons the requests still in flight;
+            # a clean end of input lets them finish and answer first
+            for task in list(tasks.values()):
+                task.cancel()
+            if not isinstance(e, (ConnectionError, asyncio.IncompleteReadError)):
+                raise
+        finally:
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            writer.close()
+
+    async def serve_unix(self, path):
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self.handle_connection, path, limit=STREAM_LIMIT)
+        try:
+            async with server:
+                await wait_for_signal()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    async def serve_stdio(self):
+        reader, writer = await stdio_streams()
+        await self.handle_connection(reader, writer)
+
+class BlockingReader:
+    def __init__(self, file):
+        self.file = file
+
+    async def readline(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self.file.readline)
+
+class BlockingWriter:
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, data):
+        self.file.write(data)
+
+    async def drain(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.flush()
+
+async def stdio_streams():
+    # regular files (redirections) cannot be wrapped in pipe transports
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=STREAM_LIMIT)
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    except ValueError:
+        reader = BlockingReader(sys.stdin.buffer)
+    try:
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+    except ValueError:
+        return reader, BlockingWriter(sys.stdout.buffer)
+    return reader, asyncio.StreamWriter(transport, protocol, None, loop)
+
+async def wait_for_signal():
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stopped.set)
+    await stopped.wait()
+
+async def serve(socket_path=None, workers=None, max_pending=64, cache_size=256):
+    server = CompileServer(workers, max_pending, cache_size)
+    await server.start()
+    try:
+        if socket_path:
+            await server.serve_unix(socket_path)
+        else:
+            await server.serve_stdio()
+    finally:
+        server.close()
+
+#=================================================================
+
+def main(argv=None):
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Serve JSON-lines compile requests with warm worker processes.")
+    arg_parser.add_argument('--socket', help="listen on this Unix socket instead of stdin/stdout")
+    arg_parser.add_argument('--workers', type=int, help="worker processes (default: CPU count, 0 compiles inline)")
+    arg_parser.add_argument('--max-pending', type=int, default=64, help="requests in flight before reads pause")
+    arg_parser.add_argument('--cache-size', type=int, default=256, help="recent responses kept in memory")
+    args = arg_parser.parse_args(argv)
+
+    asyncio.run(serve(args.socket, args.workers, args.max_pending, args.cache_size))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+import sys
+import time
+
+__version__ = "0.1.0"
+
+PHASES = ('tokens', 'parse', 'optimize', 'symbols')
+DEFAULT_PHASES = ('tokens', 'parse', 'symbols')
+
+class CompilationResult:
+    def __init__(self, source):
+        self.source = source
+        self.tokens = None
+        self.tree = None
+        self.symbol_table = None
+        self.optimization = None
+        self.timings = {}
+
+def _timed(result, name, function, *args):
+    start = time.perf_counter()
+    value = function(*args)
+    result.timings[name] = result.timings.get(name, 0.0) + time.perf_counter() - start
+    return value
+
+def _import(result, module_name):
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    return _timed(result, f"import {module_name}", __import__, module_name)
+
+def compile(source, phases=DEFAULT_PHASES, lex_workers=None):
+    unknown = set(phases) - set(PHASES)
+    if unknown:
+        raise ValueError(f"Unknown phases: {', '.join(sorted(unknown))}")
+    result = CompilationResult(source)
+    needs_tree = 'parse' in phases or 'optimize' in phases or 'symbols' in phases
+    if 'tokens' in phases or needs_tree:
+        if lex_workers and lex_workers > 1:
+            parallel_lex = _import(result, 'parallel_lex')
+            result.tokens = _timed(result, 'tokens', parallel_lex.lex_parallel, source, lex_workers, 'symbols' in phases)
+        else:
+            tokens_lexems = _import(result, 'tokens_lexems')
+            result.tokens = _timed(result, 'tokens', tokens_lexems.lex_offsets, source, False, 'symbols' in phases)
+    if needs_tree:
+        parser = _import(result, 'parser')
+        result.tree = _timed(result, 'parse', parser.Parser(result.tokens).parse)
+    if 'optimize' in phases:
+        optimizer = _import(result, 'optimizer')
+        result.tree, result.optimization = _timed(result, 'optimize', optimizer.optimize, result.tree)
+    if 'symbols' in phases:
+        unordered_symbol_table = _import(result, 'unordered_symbol_table')
+        result.symbol_table = _timed(result, 'symbols', unordered_symbol_table.build_symbol_table, result.tree)
+    return result
+
+def print_result(result, phases):
+    # line numbers are only lexed for the symbol table; the printed tokens stay (kind, lexeme)
+    if 'tokens' in phases:
+        print("Tokens:", [token[:2] for token in result.tokens])
+    if 'parse' in phases:
+        print("Parse Tree:")
+        result.tree.write(sys.stdout, positions=False)
+        print()
+    if 'optimize' in phases:
+        print("\n".join(result.optimization.lines()))
+    if 'symbols' in phases:
+        from unordered_symbol_table import print_symbol_table
+        print_symbol_table(result.symbol_table)
+
+def print_timings(result, label):
+    total = sum(result.timings.values())
+    print(f"{label}: {total * 1000:.3f} ms", file=sys.stderr)
+    for name, seconds in result.timings.items():
+        print(f"  {name:<32}{seconds * 1000:.3f} ms", file=sys.stderr)
+
+#=================================================================
+
+def main(argv=None):
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Run the lex -> parse -> symbol table pipeline.")
+    arg_parser.add_argument('files', nargs='*', help="source files to compile; '-' or none reads stdin")
+    arg_parser.add_argument('--phases', default=','.join(DEFAULT_PHASES),
+                            help=f"comma separated phases out of {','.join(PHASES)} "
+                                 f"(default: {','.join(DEFAULT_PHASES)})")
+    arg_parser.add_argument('--timings', action='store_true', help="report per-phase and import times on stderr")
+    arg_parser.add_argument('--budget-ms', type=float,
+                            help="fail with exit code 3 when imports plus phases exceed this many milliseconds")
+    arg_parser.add_argument('--lex-workers', type=int, help="lex each file with this many processes")
+    arg_parser.add_argument('--cache-dir', help="reuse compilation results stored in this directory")
+    arg_parser.add_argument('--trace', help="record per-phase and per-production spans into this file")
+    arg_parser.add_argument('--trace-format', choices=('chrome', 'json'), default='chrome')
+    arg_parser.add_argument('--trace-memory', action='store_true', help="record tracemalloc peaks per phase")
+    args = arg_parser.parse_args(argv)
+
+    tracer = None
+    if args.trace:
+        from instrumentation import Tracer, install, uninstall
+        tracer = install(Tracer(args.trace_memory))
+    try:
+        return _compile_files(args)
+    finally:
+        if tracer:
+            uninstall()
+            tracer.stop()
+            tracer.write(args.trace, args.trace_format)
+            if args.timings:
+                print("\n".join(tracer.report_lines()), file=sys.stderr)
+
+def _compile_files(args):
+    phases = tuple(phase.strip() for phase in args.phases.split(',') if phase.strip())
+    cache = None
+    if args.cache_dir:
+        from compile_cache import CompilationCache, compile_cached
+        cache = CompilationCache(args.cache_dir)
+    status = 0
+    for path in args.files or ['-']:
+        if path == '-':
+            source = sys.stdin.read()
+            label = '<stdin>'
+        else:
+            with open(path, 'r') as file:
+                source = file.read()
+            label = path
+        try:
+            result = compile_cached(source, phases, cache, args.lex_workers) if cache else compile(source, phases, args.lex_workers)
+        except SyntaxError as e:
+            from tokens_lexems import format_syntax_error
+            print(format_syntax_error(e, label), file=sys.stderr)
+            status = 1
+            continue
+        print_result(result, phases)
+        if args.timings:
+            print_timings(result, label)
+        if args.budget_ms is not None and sum(result.timings.values()) * 1000 > args.budget_ms:
+            print(f"{label}: exceeded budget of {args.budget_ms} ms", file=sys.stderr)
+            status = 3
+    if cache and args.timings:
+        print(f"cache: {cache.stats['hits']} hits, {cache.stats['misses']} misses", file=sys.stderr)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
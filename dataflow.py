@@ -0,0 +1,292 @@
+from collections import deque
+
+from optimizer import first_line
+from parser import ParseNode, Parser, run_nested
+from tokens_lexems import lex_offsets
+from unordered_symbol_table import SymbolTable, _declare, _declare_iterator, token_line
+
+def bits(bitset):
+    while bitset:
+        low = bitset & -bitset
+        yield low.bit_length() - 1
+        bitset ^= low
+
+class FlowGraph:
+    # one node per statement or condition; uses and defs are bitsets over symbol table rows
+    def __init__(self, symbol_table):
+        self.symbol_table = symbol_table
+        self.names = []
+        self.lines = []
+        self.uses = []
+        self.defs = []
+        self.successors = []
+
+    def __len__(self):
+        return len(self.uses)
+
+    def add_node(self, name, line, uses, defs, predecessors):
+        index = len(self.uses)
+        self.names.append(name)
+        self.lines.append(line)
+        self.uses.append(uses)
+        self.defs.append(defs)
+        self.successors.append([])
+        for predecessor in predecessors:
+            self.successors[predecessor].append(index)
+        return index
+
+    def add_edge(self, source, target):
+        self.successors[source].append(target)
+
+    def predecessors(self):
+        predecessors = [[] for _ in self.successors]
+        for source, targets in enumerate(self.successors):
+            for target in targets:
+                predecessors[target].append(source)
+        return predecessors
+
+class FlowGraphBuilder:
+    def __init__(self):
+        self.graph = FlowGraph(SymbolTable())
+        self.loops = []
+        self.returns = []
+
+    def build(self, tree):
+        entry = self.graph.add_node('Entry', 0, 0, 0, [])
+        exits = run_nested(self.build_statements(tree.children, [entry]))
+        self.graph.add_node('Exit', 0, 0, 0, exits + self.returns)
+        return self.graph
+
+    def row(self, name):
+        symbol_table = self.graph.symbol_table
+        return symbol_table.rows[symbol_table.lookup(name)]
+
+    def reference(self, token):
+        self.graph.symbol_table.reference(token[1], token_line(token))
+        return 1 << self.row(token[1])
+
+    def expression_uses(self, node):
+        uses = 0
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            if item is None:
+                continue
+            if isinstance(item, ParseNode):
+                stack.extend(reversed(item.children))
+            elif item[0] == 'IDENTIFIER':
+                uses |= self.reference(item)
+        return uses
+
+    def add(self, node, uses, defs, predecessors):
+        return self.graph.add_node(node.name, first_line(node), uses, defs, predecessors)
+
+    # blocks are built by generators driven by run_nested, so nesting does not use the Python stack
+    def build_statements(self, statements, predecessors):
+        for statement in statements:
+            predecessors = yield getattr(self, f"build_{statement.name}")(statement, predecessors)
+        return predecessors
+
+    def build_scoped(self, statements, predecessors):
+        self.graph.symbol_table.enter_scope()
+        exits = yield self.build_statements(statements, predecessors)
+        self.graph.symbol_table.exit_scope()
+        return exits
+
+    def build_Declaration(self, node, predecessors):
+        keyword, identifier = node.children[0], node.children[1]
+        value = node.children[2] if len(node.children) > 2 else None
+        _declare(self.graph.symbol_table, keyword[1], identifier, value)
+        uses = self.expression_uses(value)
+        return [self.add(node, uses, 1 << self.row(identifier[1]), predecessors)]
+
+    def build_Assignment(self, node, predecessors):
+        identifier, operator_token, expression = node.children
+        defs = self.reference(identifier)
+        uses = self.expression_uses(expression) | (defs if operator_token[0] == 'COMPOUND_OPERATOR' else 0)
+        return [self.add(node, uses, defs, predecessors)]
+
+    def build_PrintStatement(self, node, predecessors):
+        token = node.children[0]
+        uses = self.reference(token) if token[0] == 'IDENTIFIER' else 0
+        return [self.add(node, uses, 0, predecessors)]
+
+    def build_Pass(self, node, predecessors):
+        return predecessors
+
+    def build_Return(self, node, predecessors):
+        self.returns.append(self.add(node, self.expression_uses(node.children[0]), 0, predecessors))
+        return []
+
+    def build_LoopControl(self, node, predecessors):
+        if not self.loops:
+            raise SyntaxError(f"'{node.children[0][1]}' outside of a loop")
+        header, breaks = self.loops[-1]
+        if node.children[0][1] == 'continue':
+            for predecessor in predecessors:
+                self.graph.add_edge(predecessor, header)
+        else:
+            breaks.extend(predecessors)
+        return []
+
+    def build_Conditional(self, node, predecessors):
+        condition = self.add(node, self.expression_uses(node.children[0].children[0]), 0, predecessors)
+        exits = yield self.build_scoped(node.children[1].children, [condition])
+        for branch in node.children[2:]:
+            if branch.name == 'ElifStatement':
+                condition = self.add(branch, self.expression_uses(branch.children[0]), 0, [condition])
+                exits += yield self.build_scoped(branch.children[1].children, [condition])
+            else:
+                exits += yield self.build_scoped(branch.children, [condition])
+                condition = None
+        if condition is not None:
+            exits.append(condition)
+        return exits
+
+    def build_loop(self, header, body):
+        self.loops.append((header, []))
+        for predecessor in (yield self.build_scoped(body.children, [header])):
+            self.graph.add_edge(predecessor, header)
+        return [header] + self.loops.pop()[1]
+
+    def build_WhileLoop(self, node, predecessors):
+        header = self.add(node, self.expression_uses(node.children[0].children[0]), 0, predecessors)
+        return (yield self.build_loop(header, node.children[1]))
+
+    def build_ForLoop(self, node, predecessors):
+        identifier, target, body = node.children
+        symbol_table = self.graph.symbol_table
+        start = self.add(node, self.expression_uses(target), 0, predecessors)
+        symbol_table.enter_scope()
+        _declare_iterator(symbol_table, identifier, target)
+        # the header stores the next element into the iterator on every trip
+        exits = yield self.build_loop(self.add(node, 0, 1 << self.row(identifier[1]), [start]), body)
+        symbol_table.exit_scope()
+        return exits
+
+def build_flow_graph(tree):
+    return FlowGraphBuilder().build(tree)
+
+def solve(graph, transfer, forward=True):
+    # union-meet worklist solver; returns the values before and after each node in flow order
+    count = len(graph)
+    sources, targets = graph.predecessors(), graph.successors
+    if not forward:
+        sources, targets = targets, sources
+    before, after = [0] * count, [0] * count
+    worklist = deque(range(count) if forward else reversed(range(count)))
+    queued = [True] * count
+    while worklist:
+        node = worklist.popleft()
+        queued[node] = False
+        value = 0
+        for source in sources[node]:
+            value |= after[source]
+        before[node] = value
+        value = transfer(node, value)
+        if value != after[node]:
+            after[node] = value
+            for target in targets[node]:
+                if not queued[target]:
+                    queued[target] = True
+                    worklist.append(target)
+    return before, after
+
+def liveness(graph):
+    uses, defs = graph.uses, graph.defs
+    live_out, live_in = solve(graph, lambda node, value: uses[node] | (value & ~defs[node]), forward=False)
+    return live_in, live_out
+
+def reaching_definitions(graph):
+    # definitions are numbered by the node that makes them
+    definitions = {}
+    for node, defs in enumerate(graph.defs):
+        if defs:
+            definitions[defs] = definitions.get(defs, 0) | 1 << node
+    kills = [definitions.get(defs, 0) for defs in graph.defs]
+    return solve(graph, lambda node, value: (value & ~kills[node]) | (1 << node if graph.defs[node] else 0))
+
+def interference(graph, live_in, live_out):
+    edges = [0] * graph.symbol_table.counter
+    for node, defs in enumerate(graph.defs):
+        if not defs:
+            continue
+        row = defs.bit_length() - 1
+        others = live_out[node] & ~defs
+        edges[row] |= others
+        for other in bits(others):
+            edges[other] |= defs
+    # variables read before any store all start out holding their initial value
+    entry = live_in[0] if live_in else 0
+    for row in bits(entry):
+        edges[row] |= entry & ~(1 << row)
+    return edges
+
+class AddressAllocation:
+    def __init__(self, symbol_table, addresses, sizes):
+        self.symbol_table = symbol_table
+        self.addresses = addresses
+        self.sizes = sizes
+        self.frame_size = max((address + size for address, size in zip(addresses, sizes)), default=0)
+        self.original_size = sum(sizes)
+
+    def savings(self):
+        return self.original_size - self.frame_size
+
+    def keys(self):
+        return {key: self.addresses[row] for key, row in self.symbol_table.rows.items()}
+
+    def apply(self):
+        table = self.symbol_table
+        for row, address in enumerate(self.addresses):
+            table.addresses[row] = address
+        table.current_address = self.frame_size
+        return table
+
+    def lines(self):
+        saved = self.savings()
+        percent = saved * 100 / self.original_size if self.original_size else 0.0
+        lines = [f"Frame size {self.original_size} -> {self.frame_size} (saved {saved}, {percent:.1f}%)"]
+        owners = {}
+        for key, row in self.symbol_table.rows.items():
+            if not self.sizes[row]:
+                continue
+            owner = owners.setdefault(self.addresses[row], key)
+            if owner != key:
+                lines.append(f"  {key} reuses address {self.addresses[row]} of {owner}")
+        return lines
+
+def allocate_addresses(graph, sizes=None):
+    symbol_table = graph.symbol_table
+    sizes = list(symbol_table.sizes) if sizes is None else sizes
+    edges = interference(graph, *liveness(graph))
+    addresses = [0] * symbol_table.counter
+    for row in range(symbol_table.counter):
+        size = sizes[row]
+        # first fit below the rows already placed that are live at the same time
+        address = 0
+        for start, end in sorted((addresses[other], addresses[other] + sizes[other])
+                                 for other in bits(edges[row] & ((1 << row) - 1)) if sizes[other]):
+            if start >= address + size:
+                break
+            address = max(address, end)
+        addresses[row] = address
+    return AddressAllocation(symbol_table, addresses, sizes)
+
+#=================================================================
+
+if __name__ == "__main__":
+    import sys
+    from tokens_lexems import read_source_code
+    from unordered_symbol_table import print_symbol_table
+
+    graph = build_flow_graph(Parser(lex_offsets(read_source_code(sys.argv[1] if len(sys.argv) > 1 else 'source_code.txt'),
+                                                positions=True)).parse())
+    live_in, live_out = liveness(graph)
+    names = {row: key for key, row in graph.symbol_table.rows.items()}
+    for node in range(len(graph)):
+        live = ', '.join(names[row] for row in bits(live_out[node]))
+        print(f"{node:>5} {graph.names[node]:<16}line {graph.lines[node]:<6}live out {{{live}}}")
+    allocation = allocate_addresses(graph)
+    print("\n".join(allocation.lines()))
+    print_symbol_table(allocation.apply())
@@ -1,51 +1,160 @@
+from functools import lru_cache
+
+from grammar import EPSILON, Grammar, load_grammar
+
+class GrammarAnalysis:
+    def __init__(self, grammar):
+        self.grammar = grammar
+        self.nullable = 0
+        self.first = [0] * len(grammar.symbols)
+        self.follow = [0] * len(grammar.symbols)
+        for symbol in range(grammar.num_nonterminals, len(grammar.symbols)):
+            self.first[symbol] = 1 << (symbol - grammar.num_nonterminals)
+        self.compute_nullable()
+        self.compute_first()
+        self.compute_follow()
+
+    def compute_nullable(self):
+        grammar = self.grammar
+        remaining = [len(rhs) for _, rhs in grammar.productions]
+        occurrences = [[] for _ in grammar.symbols]
+        worklist = []
+        for index, (lhs, rhs) in enumerate(grammar.productions):
+            for symbol in rhs:
+                occurrences[symbol].append(index)
+            if not rhs:
+                worklist.append(lhs)
+        while worklist:
+            symbol = worklist.pop()
+            if self.nullable >> symbol & 1:
+                continue
+            self.nullable |= 1 << symbol
+            for index in occurrences[symbol]:
+                remaining[index] -= 1
+                if remaining[index] == 0:
+                    worklist.append(grammar.productions[index][0])
+
+    def compute_first(self):
+        grammar = self.grammar
+        nullable = self.nullable
+        first = self.first
+        depends_on = [set() for _ in range(grammar.num_nonterminals)]
+        for lhs, rhs in grammar.productions:
+            for symbol in rhs:
+                if grammar.is_terminal(symbol):
+                    first[lhs] |= first[symbol]
+                else:
+                    depends_on[lhs].add(symbol)
+                if not nullable >> symbol & 1:
+                    break
+        self._propagate(first, depends_on, grammar.num_nonterminals)
+
+    def compute_follow(self):
+        grammar = self.grammar
+        follow = self.follow
+        depends_on = [set() for _ in range(grammar.num_nonterminals)]
+        follow[grammar.start] |= self.first[grammar.end]
+        for lhs, rhs in grammar.productions:
+            trailer = 0
+            trailer_nullable = True
+            for symbol in reversed(rhs):
+                if not grammar.is_terminal(symbol):
+                    follow[symbol] |= trailer
+                    if trailer_nullable:
+                        depends_on[symbol].add(lhs)
+                if self.nullable >> symbol & 1:
+                    trailer |= self.first[symbol]
+                else:
+                    trailer = self.first[symbol]
+                    trailer_nullable = False
+        self._propagate(follow, depends_on, grammar.num_nonterminals)
+
+    @staticmethod
+    def _propagate(sets, depends_on, count):
+        # DeRemer-Pennello digraph traversal: each strongly connected component
+        # of the dependency graph is solved once, in topological order.
+        finished = count + 1
+        depth = [0] * count
+        stack = []
+        for root in range(count):
+            if depth[root]:
+                continue
+            stack.append(root)
+            depth[root] = len(stack)
+            work = [(root, iter(depends_on[root]), len(stack))]
+            while work:
+                symbol, children, symbol_depth = work[-1]
+                for child in children:
+                    if depth[child] == 0:
+                        stack.append(child)
+                        depth[child] = len(stack)
+                        work.append((child, iter(depends_on[child]), len(stack)))
+                        break
+                    if depth[child] < depth[symbol]:
+                        depth[symbol] = depth[child]
+                    sets[symbol] |= sets[child]
+                else:
+                    work.pop()
+                    if depth[symbol] == symbol_depth:
+                        bits = sets[symbol]
+                        while True:
+                            member = stack.pop()
+                            depth[member] = finished
+                            sets[member] = bits
+                            if member == symbol:
+                                break
+                    if work:
+                        parent = work[-1][0]
+                        if depth[symbol] < depth[parent]:
+                            depth[parent] = depth[symbol]
+                        sets[parent] |= sets[symbol]
+
+    def is_nullable(self, symbol):
+        return bool(self.nullable >> symbol & 1)
+
+    def first_of_sequence(self, symbols):
+        bits = 0
+        for symbol in symbols:
+            bits |= self.first[symbol]
+            if not self.nullable >> symbol & 1:
+                return bits, False
+        return bits, True
+
+    def names(self, bits):
+        symbols = self.grammar.symbols
+        offset = self.grammar.num_nonterminals - 1
+        names = set()
+        while bits:
+            low = bits & -bits
+            names.add(symbols[low.bit_length() + offset])
+            bits ^= low
+        return names
+
+    def first_set(self, name):
+        symbol = self.grammar.symbol_ids[name]
+        names = self.names(self.first[symbol])
+        if self.is_nullable(symbol):
+            names.add(EPSILON)
+        return names
+
+    def follow_set(self, name):
+        return self.names(self.follow[self.grammar.symbol_ids[name]])
+
+@lru_cache(maxsize=32)
+def _analyze_pairs(pairs, start_symbol=None):
+    return GrammarAnalysis(Grammar.from_pairs(pairs, start_symbol))
+
 def first(grammar, symbol):
-    first_set = set()
-    symbol_set = {
-        prod[1] for prod in grammar if prod[0] == symbol
-    }
-    for element in symbol_set:
-        if element == 'epsilon':
-            first_set.add(element)
-        elif not element[0].isupper():
-            first_set.add(element[0])
-        else:
-            first_set |= Production_rule_3(grammar, element)
-    return first_set
-
-def Production_rule_3(grammar, element):
-    first_set = set()
-    i = 0
-    while i < len(element):
-        first_i = first(grammar, element[i])
-        first_set |= first_i.difference({'epsilon'})
-        if 'epsilon' not in first_i:
-            break
-        i += 1
-    return first_set
+    analysis = _analyze_pairs(tuple(grammar))
+    if symbol not in analysis.grammar.symbol_ids:
+        return set()
+    return analysis.first_set(symbol)
 
 def follow(grammar, start_symbol, symbol):
-    follow_set = set()
-    if symbol == start_symbol:
-        follow_set.add('$')
-    for production in grammar:
-        if symbol in production[1]:
-            prodc = production[1]
-            if symbol == prodc[-1]:
-                follow_set |= follow(grammar, start_symbol, production[0])
-                return follow_set
-    for element in (prod[1] for prod in grammar if symbol in prod[1]):
-        for symb in element[element.index(symbol)+1:]:
-            if not symb.isupper():
-                follow_set.add(symb)
-                break
-            else:
-                first_symb = first(grammar, symb)
-                if "epsilon" in first_symb:
-                    follow_set |= first_symb.difference({'epsilon'})
-                    follow_set |= follow(grammar, start_symbol, symb)
-                else:
-                    follow_set |= first_symb
-    return follow_set
+    analysis = _analyze_pairs(tuple(grammar), start_symbol)
+    if symbol not in analysis.grammar.symbol_ids:
+        return set()
+    return analysis.follow_set(symbol)
 
 grammar = [
     ('E', 'TA'),
@@ -58,29 +167,47 @@ grammar = [
     ('F', 'd'),
 ]
 
-non_terminals_set = set(left_side for left_side, _ in grammar)
-terminals_set = set()
-for nt in non_terminals_set:
-    terminals_set |= {c for c in nt if c.islower()}
-    terminals_set |= {c for c in nt if c.isnumeric()}
-    terminals_set |= {'+', '*', '(', ')','$'}
-non_terminals = sorted(list(non_terminals_set))
-terminals = sorted(list(terminals_set))
-
-first_sets = {}
-follow_sets = {}
-for nt in non_terminals:
-    first_sets[nt] = first(grammar, nt)
-    follow_sets[nt] = follow(grammar, "E", nt)
-
-print("Grammar Rules:")
-for rule in grammar:
-    print(f"{rule[0]} -> {rule[1]}")    
-
-print("\nFirst Sets:")
-for nt in non_terminals:
-    print(f"First({nt}) = {first_sets[nt]}")
-
-print("\nFollow Sets:")
-for nt in non_terminals:
-    print(f"Follow({nt}) = {follow_sets[nt]}")
\ No newline at end of file
+def main():
+    non_terminals_set = set(left_side for left_side, _ in grammar)
+    terminals_set = set()
+    for nt in non_terminals_set:
+        terminals_set |= {c for c in nt if c.islower()}
+        terminals_set |= {c for c in nt if c.isnumeric()}
+        terminals_set |= {'+', '*', '(', ')','$'}
+    non_terminals = sorted(list(non_terminals_set))
+    terminals = sorted(list(terminals_set))
+
+    first_sets = {}
+    follow_sets = {}
+    for nt in non_terminals:
+        first_sets[nt] = first(grammar, nt)
+        follow_sets[nt] = follow(grammar, "E", nt)
+
+    print("Grammar Rules:")
+    for rule in grammar:
+        print(f"{rule[0]} -> {rule[1]}")    
+
+    print("\nFirst Sets:")
+    for nt in non_terminals:
+        print(f"First({nt}) = {first_sets[nt]}")
+
+    print("\nFollow Sets:")
+    for nt in non_terminals:
+        print(f"Follow({nt}) = {follow_sets[nt]}")
+
+def print_analysis(file_path):
+    grammar = load_grammar(file_path)
+    analysis = GrammarAnalysis(grammar)
+    print(f"\nGrammar {file_path}: {len(grammar.productions)} productions")
+    for nt in grammar.nonterminals():
+        if nt in grammar.synthetic:
+            continue
+        print(f"Nullable({nt}) = {analysis.is_nullable(grammar.symbol_ids[nt])}")
+        print(f"First({nt}) = {sorted(analysis.first_set(nt))}")
+        print(f"Follow({nt}) = {sorted(analysis.follow_set(nt))}")
+
+if __name__ == "__main__":
+    import sys
+    main()
+    for file_path in sys.argv[1:]:
+        print_analysis(file_path)
@@ -0,0 +1,200 @@
+import re
+
+END_MARKER = '$'
+EPSILON = 'epsilon'
+
+EBNF_TOKEN_REGEX = re.compile(r'''
+    (?P<WHITESPACE>\s+)
+  | (?P<ARROW>->)
+  | (?P<QUOTED>"[^"]*"|'[^']*')
+  | (?P<CHARCLASS>\[[^\]"]*-[^\]"]*\])
+  | (?P<NAME>[A-Za-z_]\w*)
+  | (?P<OPERATOR>[|()\[\]*+?])
+  | (?P<BARE>\S)
+''', re.VERBOSE)
+
+RULE_START_REGEX = re.compile(r'^\s*[A-Za-z_]\w*\s*->')
+
+class Grammar:
+    def __init__(self, productions, start=None, terminals=(), synthetic=()):
+        lhs_names = []
+        seen = set()
+        for lhs, _ in productions:
+            if lhs not in seen and lhs not in terminals:
+                seen.add(lhs)
+                lhs_names.append(lhs)
+        self.symbols = list(lhs_names)
+        self.symbol_ids = {name: i for i, name in enumerate(self.symbols)}
+        self.num_nonterminals = len(self.symbols)
+        self.productions = []
+        self.synthetic = set(synthetic)
+        raw = [(lhs, rhs) for lhs, rhs in productions if lhs in self.symbol_ids]
+        for lhs, rhs in raw:
+            for name in rhs:
+                if name not in self.symbol_ids:
+                    self.symbol_ids[name] = len(self.symbols)
+                    self.symbols.append(name)
+        if END_MARKER not in self.symbol_ids:
+            self.symbol_ids[END_MARKER] = len(self.symbols)
+            self.symbols.append(END_MARKER)
+        for lhs, rhs in raw:
+            self.productions.append((self.symbol_ids[lhs], tuple(self.symbol_ids[name] for name in rhs)))
+        self.start = self.symbol_ids[start] if start is not None else 0
+        self.end = self.symbol_ids[END_MARKER]
+        self.productions_by_lhs = [[] for _ in range(self.num_nonterminals)]
+        for index, (lhs, _) in enumerate(self.productions):
+            self.productions_by_lhs[lhs].append(index)
+
+    def is_terminal(self, symbol):
+        return symbol >= self.num_nonterminals
+
+    def nonterminals(self):
+        return self.symbols[:self.num_nonterminals]
+
+    def terminals(self):
+        return self.symbols[self.num_nonterminals:]
+
+    def production_text(self, index):
+        lhs, rhs = self.productions[index]
+        return f"{self.symbols[lhs]} -> {' '.join(self.symbols[s] for s in rhs) or EPSILON}"
+
+    @classmethod
+    def from_pairs(cls, pairs, start=None):
+        productions = []
+        for lhs, rhs in pairs:
+            productions.append((lhs, [] if rhs == EPSILON else list(rhs)))
+        return cls(productions, start=start or (pairs[0][0] if pairs else None))
+
+def _tokenize_ebnf(text):
+    for match in EBNF_TOKEN_REGEX.finditer(text):
+        kind = match.lastgroup
+        if kind != 'WHITESPACE':
+            yield kind, match.group()
+
+class _RuleParser:
+    def __init__(self, lhs, text, builder):
+        self.lhs = lhs
+        self.tokens = list(_tokenize_ebnf(text))
+        self.index = 0
+        self.builder = builder
+        self.lexical = False
+
+    def current(self):
+        return self.tokens[self.index] if self.index < len(self.tokens) else (None, None)
+
+    def parse(self):
+        alternatives = self.parse_alternatives()
+        if self.index < len(self.tokens):
+            raise SyntaxError(f"Unexpected {self.current()[1]!r} in rule {self.lhs}")
+        return alternatives
+
+    def parse_alternatives(self):
+        alternatives = [self.parse_sequence()]
+        while self.current() == ('OPERATOR', '|'):
+            self.index += 1
+            alternatives.append(self.parse_sequence())
+        return alternatives
+
+    def parse_sequence(self):
+        sequence = []
+        while True:
+            kind, value = self.current()
+            if kind is None or (kind == 'OPERATOR' and value in '|)]'):
+                return sequence
+            sequence.extend(self.parse_item())
+
+    def parse_item(self):
+        kind, value = self.current()
+        self.index += 1
+        if kind == 'OPERATOR' and value in '([':
+            alternatives = self.parse_alternatives()
+            closing = ')' if value == '(' else ']'
+            if self.current() != ('OPERATOR', closing):
+                raise SyntaxError(f"Expected {closing!r} in rule {self.lhs}")
+            self.index += 1
+            optional = value == '['
+        elif kind == 'CHARCLASS':
+            self.lexical = True
+            alternatives = [[]]
+            optional = False
+        elif kind in ('NAME', 'QUOTED', 'BARE'):
+            alternatives = [[value if kind != 'BARE' else f'"{value}"']]
+            optional = False
+        else:
+            raise SyntaxError(f"Unexpected {value!r} in rule {self.lhs}")
+
+        repeat = None
+        while self.current()[0] == 'OPERATOR' and self.current()[1] in '*+?':
+            repeat = self.current()[1] if repeat is None else '*'
+            self.index += 1
+        if repeat in ('*', '+'):
+            rest = self.builder.new_symbol(self.lhs)
+            for alternative in alternatives:
+                self.builder.add(rest, alternative + [rest])
+            self.builder.add(rest, [])
+            if repeat == '*':
+                return [rest]
+            group = self.builder.new_symbol(self.lhs)
+            for alternative in alternatives:
+                self.builder.add(group, alternative + [rest])
+            return [group]
+        if optional or repeat == '?':
+            group = self.builder.new_symbol(self.lhs)
+            for alternative in alternatives:
+                self.builder.add(group, alternative)
+            self.builder.add(group, [])
+            return [group]
+        if len(alternatives) == 1:
+            return alternatives[0]
+        group = self.builder.new_symbol(self.lhs)
+        for alternative in alternatives:
+            self.builder.add(group, alternative)
+        return [group]
+
+class _GrammarBuilder:
+    def __init__(self):
+        self.productions = []
+        self.synthetic = set()
+        self.counters = {}
+
+    def new_symbol(self, lhs):
+        self.counters[lhs] = self.counters.get(lhs, 0) + 1
+        name = f"{lhs}'{self.counters[lhs]}"
+        self.synthetic.add(name)
+        return name
+
+    def add(self, lhs, rhs):
+        self.productions.append((lhs, rhs))
+
+def split_rules(text):
+    rules = []
+    for line in text.splitlines():
+        if RULE_START_REGEX.match(line):
+            lhs, rhs = line.split('->', 1)
+            rules.append([lhs.strip(), rhs])
+        elif line.strip() and rules:
+            rules[-1][1] += '\n' + line
+    return rules
+
+def parse_grammar(text):
+    builder = _GrammarBuilder()
+    lexical = set()
+    start = None
+    for lhs, rhs in split_rules(text):
+        start = start or lhs
+        rule_builder = _GrammarBuilder()
+        rule_builder.counters = builder.counters
+        rule = _RuleParser(lhs, rhs, rule_builder)
+        alternatives = rule.parse()
+        if rule.lexical:
+            lexical.add(lhs)
+            continue
+        for alternative in alternatives:
+            builder.add(lhs, alternative)
+        builder.productions.extend(rule_builder.productions)
+        builder.synthetic |= rule_builder.synthetic
+    return Grammar(builder.productions, start, terminals=lexical, synthetic=builder.synthetic)
+
+def load_grammar(file_path='grammer.txt'):
+    with open(file_path, 'r') as file:
+        return parse_grammar(file.read())
@@ -0,0 +1,509 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+from parser import ParseNode, Parser
+from tokens_lexems import SKIPPED_KINDS, TOKEN_REGEX, scan_tokens
+from unordered_symbol_table import LINE_BITS, LINE_MASK, SymbolTable, build_symbol_table
+
+class GapArray:
+    def __init__(self, values, end):
+        self.values = array('q', values)
+        self.gap = len(self.values)
+        self.end = end
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.values)
+        value = self.values[index]
+        return value + self.end if index >= self.gap else value
+
+    def __setitem__(self, index, value):
+        self.values[index] = value - self.end if index >= self.gap else value
+
+    def append(self, value):
+        self.values.append(value - self.end if self.gap < len(self.values) else value)
+        if self.gap == len(self.values) - 1:
+            self.gap += 1
+
+    def move_gap(self, index):
+        values, end = self.values, self.end
+        if index < self.gap:
+            for i in range(index, self.gap):
+                values[i] -= end
+        else:
+            for i in range(self.gap, index):
+                values[i] += end
+        self.gap = index
+
+    def bisect_left(self, value):
+        position = bisect_left(self.values, value, 0, self.gap)
+        if position < self.gap:
+            return position
+        return bisect_left(self.values, value - self.end, self.gap, len(self.values))
+
+    def bisect_right(self, value):
+        position = bisect_right(self.values, value, 0, self.gap)
+        if position < self.gap:
+            return position
+        return bisect_right(self.values, value - self.end, self.gap, len(self.values))
+
+    def splice(self, start, stop, new_values, delta):
+        self.move_gap(stop)
+        self.values[start:stop] = array('q', new_values)
+        self.gap = start + len(new_values)
+        self.end += delta
+
+    def shift(self, index, delta):
+        # adds delta to every value from index on
+        self.move_gap(index)
+        self.end += delta
+
+    def truncate(self, length):
+        if length < self.gap:
+            self.move_gap(length)
+        del self.values[length:]
+
+class DocumentSymbolTable(SymbolTable):
+    # declaration lines (by row) and references (by line, then row) sit in gap arrays, so
+    # shifting everything below an edit only moves the gaps
+    def __init__(self):
+        super().__init__()
+        self.keys_by_name = {}
+        self.lines = GapArray((), 0)
+        self.reference_lines = GapArray((), 0)
+        self.reference_counts = array('I')
+        self.reference_lists = None
+
+    def declare(self, name, data_type, size, line_number, value=None, dimensions=0):
+        key = super().declare(name, data_type, size, line_number, value, dimensions)
+        self.keys_by_name.setdefault(name, []).append(key)
+        self.reference_counts.append(0)
+        return key
+
+    def add_reference(self, name, line_number):
+        key = self.lookup(name)
+        if key is None:
+            return
+        row = self.rows[key]
+        if line_number == self.lines[row]:
+            return
+        reference = line_number << LINE_BITS | row
+        keys = self.reference_lines
+        if not len(keys) or reference > keys[-1]:
+            keys.append(reference)
+        else:
+            position = keys.bisect_left(reference)
+            if keys[position] == reference:
+                return
+            keys.splice(position, position, (reference,), 0)
+        self.reference_counts[row] += 1
+        self.reference_lists = None
+
+    def reference_range(self, first_line, last_line):
+        keys = self.reference_lines
+        return keys.bisect_left(first_line << LINE_BITS), keys.bisect_left((last_line + 1) << LINE_BITS)
+
+    def references(self, row):
+        if self.reference_lists is None:
+            lists = self.reference_lists = {}
+            keys = self.reference_lines
+            for position in range(len(keys)):
+                reference = keys[position]
+                lists.setdefault(reference & LINE_MASK, []).append(reference >> LINE_BITS)
+        return array('I', self.reference_lists.get(row, ()))
+
+    def remove_references(self, row, first_line, last_line):
+        low, high = self.reference_range(first_line, last_line)
+        keys = self.reference_lines
+        kept = [keys[position] for position in range(low, high) if keys[position] & LINE_MASK != row]
+        self.reference_counts[row] -= high - low - len(kept)
+        keys.splice(low, high, kept, 0)
+        self.reference_lists = None
+
+    def remove_lines(self, first_line, last_line):
+        low, high = self.reference_range(first_line, last_line)
+        keys, counts = self.reference_lines, self.reference_counts
+        for position in range(low, high):
+            counts[keys[position] & LINE_MASK] -= 1
+        keys.splice(low, high, (), 0)
+        self.reference_lists = None
+
+    def shift_lines(self, after_line, delta):
+        # rows are numbered in source order, so the rows declared below the edit are a suffix
+        self.lines.shift(self.lines.bisect_right(after_line), delta)
+        keys = self.reference_lines
+        keys.shift(keys.bisect_left((after_line + 1) << LINE_BITS), delta << LINE_BITS)
+        self.reference_lists = None
+
+    def detach(self, key):
+        # hides a row from lookups while its statement is rebuilt; it keeps its key and slot
+        name = self.strings[self.name_ids[self.rows[key]]]
+        self.keys_by_name[name].remove(key)
+        if not self.keys_by_name[name]:
+            del self.keys_by_name[name]
+        visible = self.visible.get(name)
+        if visible and key in visible:
+            visible.remove(key)
+            if not visible:
+                del self.visible[name]
+                self.scopes[0].discard(name)
+
+    def remove(self, key):
+        row = self.rows[key]
+        self.detach(key)
+        self.remove_references(row, 0, LINE_MASK)
+        del self.rows[key]
+
+    def signature(self, row):
+        # keys follow from the names, addresses from the sizes and what later statements see from the depth
+        return self.name_ids[row], self.sizes[row], self.scope_depths[row]
+
+    def reattach(self, detached, counter, first_line, last_line):
+        # moves the rows declared since counter back into the detached slots, so numbering,
+        # addresses and keys match a fresh build; fails when a declaration was added, removed or resized
+        new_rows = range(counter, self.counter)
+        if [self.signature(row) for row in new_rows] != [self.signature(self.rows[key]) for key in detached]:
+            return False
+        moved = {}
+        for new_row, key in zip(new_rows, detached):
+            row = moved[new_row] = self.rows[key]
+            name = self.strings[self.name_ids[row]]
+            keys = self.keys_by_name[name]
+            new_key = next(other for other in reversed(keys) if self.rows[other] == new_row)
+            del self.rows[new_key]
+            keys[keys.index(new_key)] = key
+            keys.sort(key=self.rows.__getitem__)
+            visible = self.visible.get(name)
+            if visible and new_key in visible:
+                visible[visible.index(new_key)] = key
+            for column in (self.type_ids, self.value_ids, self.dimensions, self.scope_depths, self.lines):
+                column[row] = column[new_row]
+            self.reference_counts[row] += self.reference_counts[new_row]
+        if moved:
+            low, high = self.reference_range(first_line, last_line)
+            keys = self.reference_lines
+            references = [keys[position] for position in range(low, high)]
+            keys.splice(low, high, sorted(reference & ~LINE_MASK | moved.get(reference & LINE_MASK, reference & LINE_MASK)
+                                          for reference in references), 0)
+            self.reference_lists = None
+        self.current_address -= sum(self.sizes[counter:])
+        for column in (self.name_ids, self.type_ids, self.value_ids, self.addresses, self.sizes, self.dimensions,
+                       self.scope_depths, self.last_references, self.reference_counts):
+            del column[counter:]
+        self.lines.truncate(counter)
+        self.counter = counter
+        return True
+
+def identifier_names(nodes):
+    names = set()
+    stack = list(nodes)
+    while stack:
+        item = stack.pop()
+        if isinstance(item, ParseNode):
+            stack.extend(child for child in item.children if child is not None)
+        elif item[0] == 'IDENTIFIER':
+            names.add(item[1])
+    return names
+
+def document_token(match):
+    # a character the lexer rejects stays in the token arrays, so the text around it still relexes incrementally
+    try:
+        return next(scan_tokens((match,)))
+    except SyntaxError:
+        return ('MISMATCH', match.group())
+
+class IncrementalDocument:
+    # while the source has a syntax error, the statements it damaged keep their last good parse and
+    # symbols; the next edit reparses them together with its own span
+    def __init__(self, source_code):
+        self.source = source_code
+        self.error = None
+        self.full_rebuilds = 0
+        self.tree = self.statements = self.symbol_table = None
+        self.damage = None
+        self.damage_lines = 0
+        self._rebuild()
+
+    def _rebuild(self):
+        self.full_rebuilds += 1
+        source = self.source
+        matches = [match for match in TOKEN_REGEX.finditer(source) if match.lastgroup not in SKIPPED_KINDS]
+        tokens = [document_token(match) for match in matches]
+        starts = [match.start() for match in matches]
+        lines = []
+        line, last = 1, 0
+        for start in starts:
+            line += source.count('\n', last, start)
+            last = start
+            lines.append(line)
+        self.tokens = tokens
+        self.lines = GapArray(lines, source.count('\n') + 1)
+
+        parser = Parser(tokens)
+        statement_starts = []
+        try:
+            mismatch = next((index for index, token in enumerate(tokens) if token[0] == 'MISMATCH'), None)
+            if mismatch is not None:
+                parser.index = mismatch
+                raise SyntaxError()
+            parser.match('KEYWORD')  # 'begin'
+            parser.match('CURLY_BRACKET')  # '{'
+            statements = []
+            while parser.current_token() and parser.current_token()[0] != 'CURLY_BRACKET':
+                statement_starts.append(parser.index)
+                statements.append(parser.parse_statement())
+            parser.match('CURLY_BRACKET')  # '}'
+            parser.match('KEYWORD')  # 'end'
+        except SyntaxError as e:
+            # the previous good tree and symbols stay, but the token arrays no longer match them
+            self.error = self.located(e, parser.index)
+            self.stale = True
+            return
+        self.starts = GapArray(starts, len(source))
+        self.statements = statements
+        self.statement_starts = GapArray(statement_starts, len(tokens))
+        self.tree = ParseNode("Program", statements)
+        self.close_index = parser.index - 2
+        line_map = {id(token): self.lines[i] for i, token in enumerate(tokens)}
+        self.symbol_table = build_symbol_table(self.tree, DocumentSymbolTable(), lambda token: line_map[id(token)])
+        self.error = None
+        self.stale = False
+        self.damage = None
+        self.damage_lines = 0
+
+    def located(self, error, index):
+        # the parser reads (kind, lexeme) tokens here, so the line comes from the line array
+        token = self.tokens[index] if index < len(self.tokens) else None
+        if token is not None and token[0] == 'MISMATCH':
+            error = SyntaxError(f'Unexpected character: {token[1][0]}')
+        if error.lineno is None and token is not None:
+            error.lineno = self.lines[index]
+        return error
+
+    def token_end(self, index):
+        return self.starts[index] + len(self.tokens[index][1])
+
+    def token_last_line(self, index):
+        return self.lines[index] + self.tokens[index][1].count('\n')
+
+    def apply_edit(self, start, end, new_text):
+        if not 0 <= start <= end <= len(self.source):
+            raise IndexError(f"Edit range {start}:{end} is outside the document")
+        old_source = self.source
+        self.source = old_source[:start] + new_text + old_source[end:]
+        if self.stale or not self._apply_incremental(old_source, start, end, new_text):
+            self._rebuild()
+        return self.error
+
+    def _apply_incremental(self, old_source, start, end, new_text):
+        source = self.source
+        tokens = self.tokens
+        delta = len(new_text) - (end - start)
+        delta_lines = new_text.count('\n') - old_source.count('\n', start, end)
+
+        first = self.starts.bisect_left(start)
+        if first > 0 and self.token_end(first - 1) >= start:
+            first -= 1
+        position = self.token_end(first - 1) if first > 0 else 0
+        line = self.token_last_line(first - 1) if first > 0 else 1
+        edit_end = start + len(new_text)
+
+        new_tokens, new_starts, new_lines = [], [], []
+        resync = len(tokens)
+        last = position
+        for match in TOKEN_REGEX.finditer(source, position):
+            if match.lastgroup in SKIPPED_KINDS:
+                continue
+            token_start = match.start()
+            token = document_token(match)
+            if token_start >= edit_end:
+                old_index = self.starts.bisect_left(token_start - delta)
+                if (old_index < len(tokens) and self.starts[old_index] == token_start - delta
+                        and tokens[old_index] == token):
+                    resync = old_index
+                    break
+            line += source.count('\n', last, token_start)
+            last = token_start
+            new_tokens.append(token)
+            new_starts.append(token_start)
+            new_lines.append(line)
+
+        if first == resync and not new_tokens and not delta_lines:
+            self.starts.splice(first, first, [], delta)
+            return True
+        if first < 2 or not self.statements:
+            return False
+
+        first_statement = self.statement_starts.bisect_right(first) - 1
+        # the reparse must also cover the statements an earlier edit left damaged
+        needed_end = resync
+        if self.damage is not None:
+            damaged_first, damaged_last, damaged_token, damaged_line = self.damage
+            first_statement = min(first_statement, damaged_first)
+            needed_end = max(needed_end, self.statement_starts[damaged_last] if damaged_last < len(self.statements)
+                             else len(tokens) if self.close_index is None else self.close_index)
+        while first_statement > 0 and self.lines[self.statement_starts[first_statement]] == \
+                self.token_last_line(self.statement_starts[first_statement] - 1):
+            first_statement -= 1
+        first_token = self.statement_starts[first_statement]
+        if self.damage is not None and first_token == damaged_token:
+            first_line = damaged_line
+        else:
+            first_line = self.lines[first_token]
+
+        token_delta = len(new_tokens) - (resync - first)
+        tokens[first:resync] = new_tokens
+        self.starts.splice(first, resync, new_starts, delta)
+        self.lines.splice(first, resync, new_lines, delta_lines)
+        if self.close_index is not None and resync <= self.close_index:
+            self.close_index += token_delta
+        else:
+            # the edit reached the closing '}end'; the document is closed again once it ends with it
+            close = len(tokens) - 2
+            closed = close >= first and tokens[close] == ('CURLY_BRACKET', '}') and tokens[close + 1] == ('KEYWORD', 'end')
+            self.close_index = close if closed else None
+        if self.close_index is None or self.close_index + 2 != len(tokens):
+            # without a closing '}end' at the very end the reparse has no boundary to stop at;
+            # a fresh build reports the error
+            return False
+        replaced_end = first + len(new_tokens)
+        needed_end = max(replaced_end, needed_end + token_delta if needed_end >= resync else replaced_end)
+        # lines below the damage are still in the symbol table's coordinates minus this much
+        delta_lines += self.damage_lines
+
+        parser = Parser(tokens)
+        parser.index = first_token
+        reparsed, reparsed_starts = [], []
+        old_statements = self.statement_starts
+        last_statement = first_statement
+        try:
+            while True:
+                current = parser.index
+                if needed_end <= current < len(tokens) and current > first_token and \
+                        self.lines[current] > self.token_last_line(current - 1):
+                    if current == self.close_index:
+                        last_statement = len(self.statements)
+                        break
+                    old_index = old_statements.bisect_left(current - token_delta)
+                    if old_index < len(self.statements) and old_statements[old_index] == current - token_delta:
+                        last_statement = old_index
+                        break
+                token = parser.current_token()
+                if token is not None and token[0] == 'CURLY_BRACKET':
+                    if current == self.close_index:
+                        last_statement = len(self.statements)
+                        break
+                    following = tokens[current + 1] if current + 1 < len(tokens) else None
+                    if following is not None and following[0] == 'KEYWORD':
+                        # a fresh parse would end the program here
+                        return False
+                    parser.index += 1
+                    parser.match('KEYWORD')  # fails as the fresh parse does after this '}'
+                reparsed_starts.append(current)
+                reparsed.append(parser.parse_statement())
+        except SyntaxError as e:
+            self._damage(first_statement, first_token, first_line, needed_end, token_delta, delta_lines)
+            self.error = self.located(e, parser.index)
+            return True
+
+        removed = self.statements[first_statement:last_statement]
+        self.statements[first_statement:last_statement] = reparsed
+        self.statement_starts.splice(first_statement, last_statement, reparsed_starts, token_delta)
+        self.damage = None
+        self.damage_lines = 0
+        self.error = None
+
+        reparsed_end = parser.index
+        old_last_line = self.lines[reparsed_end] - delta_lines
+        if reparsed_end != self.close_index:
+            old_last_line -= 1
+        line_map = {id(tokens[i]): self.lines[i] for i in range(first_token, reparsed_end)}
+        return self._patch_symbols(removed, reparsed, first_line, old_last_line, self.lines[first_token], delta_lines,
+                                   line_map)
+
+    def _damage(self, first_statement, first_token, first_line, needed_end, token_delta, delta_lines):
+        # the damaged statements run to the first old statement boundary past the reparsed span;
+        # they all start at first_token until a reparse succeeds
+        starts = self.statement_starts
+        last_statement = max(first_statement + 1, starts.bisect_left(needed_end - token_delta))
+        while last_statement < len(self.statements):
+            start = starts[last_statement] + token_delta
+            if self.lines[start] > self.token_last_line(start - 1):
+                break
+            last_statement += 1
+        starts.splice(first_statement, last_statement, [first_token] * (last_statement - first_statement), token_delta)
+        self.damage = (first_statement, last_statement, first_token, first_line)
+        self.damage_lines = delta_lines
+
+    def _patch_symbols(self, removed, reparsed, first_line, old_last_line, new_first_line, delta_lines, line_map):
+        symbol_table = self.symbol_table
+        symbol_table.remove_lines(first_line, old_last_line)
+        detached = []
+        for name in identifier_names(removed):
+            for key in list(symbol_table.keys_by_name.get(name, ())):
+                row = symbol_table.rows[key]
+                if first_line <= symbol_table.lines[row] <= old_last_line:
+                    symbol_table.detach(key)
+                    detached.append(key)
+        detached.sort(key=symbol_table.rows.__getitem__)
+        # as in a fresh build, the reparsed statements only see the globals declared above them
+        hidden = []
+        for name in identifier_names(reparsed):
+            keys = symbol_table.visible.get(name)
+            if keys and symbol_table.lines[symbol_table.rows[keys[0]]] > old_last_line:
+                hidden.append((name, keys[0]))
+                del symbol_table.visible[name]
+                symbol_table.scopes[0].discard(name)
+        if delta_lines:
+            symbol_table.shift_lines(old_last_line, delta_lines)
+        counter = symbol_table.counter
+        line_of = lambda token: line_map[id(token)]
+        for statement in reparsed:
+            build_symbol_table(statement, symbol_table, line_of)
+        for name, key in hidden:
+            symbol_table.visible.setdefault(name, []).insert(0, key)
+            symbol_table.scopes[0].add(name)
+        return symbol_table.reattach(detached, counter, new_first_line, old_last_line + delta_lines)
+
+#=================================================================
+
+if __name__ == "__main__":
+    import time
+    from unordered_symbol_table import print_symbol_table
+
+    body = "int total = 0;\nwhile (total < 5) {\n    total += 1;\n}\nprint(total);\n"
+    document = IncrementalDocument("begin{\n" + body * 20000 + "}end\n")
+    offset = document.source.index("total += 1", len(document.source) // 2) + len("total += ")
+    for label in ("first edit (moves the gaps)", "next edit"):
+        start = time.perf_counter()
+        document.apply_edit(offset, offset + 1, "2")
+        print(f"{label} in {document.source.count(chr(10))} lines: "
+              f"{(time.perf_counter() - start) * 1000:.3f} ms, full rebuilds: {document.full_rebuilds - 1}")
+    semicolon = document.source.index(";", offset)
+    for label, edit in (("edit leaving a syntax error", (semicolon, semicolon + 1, "")),
+                        ("edit while the error is present", (semicolon, semicolon, " ")),
+                        ("edit fixing the error", (semicolon, semicolon + 1, ";"))):
+        start = time.perf_counter()
+        error = document.apply_edit(*edit)
+        print(f"{label}: {(time.perf_counter() - start) * 1000:.3f} ms, error: {error}, "
+              f"full rebuilds: {document.full_rebuilds - 1}")
+    small = IncrementalDocument("begin{\n" + body + "}end\n")
+    small.apply_edit(small.source.index("print"), small.source.index("print"), "int extra = 3;\n")
+    print(small.tree)
+    print_symbol_table(small.symbol_table)
+
+    # every incremental patch must leave the same table a fresh build of the new source would
+    edits = (("print(total);", "\nprint(total);"), ("total < 5", "total < 5 + extra"),
+             ("int extra = 3;\n", "int extra = 3;\nwhile (extra > 0) {\n    extra -= 1;\n}\n"),
+             ("int extra = 3;\n", ""))
+    for old, new in edits:
+        start = small.source.index(old)
+        small.apply_edit(start, start + len(old), new)
+        fresh = IncrementalDocument(small.source)
+        table, expected = small.symbol_table, fresh.symbol_table
+        same = (list(table.records()) == list(expected.records()) and table.counter == expected.counter
+                and table.current_address == expected.current_address)
+        print(f"after replacing {old!r} with {new!r}: matches a fresh build: {same}")
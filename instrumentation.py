@@ -0,0 +1,225 @@
+import functools
+import importlib
+import inspect
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+TRACE_FORMAT = 1
+
+# (module, attribute path, category, phase): phase hooks also record tracemalloc peaks
+HOOKS = [
+    ('tokens_lexems', 'lex', 'lex', True),
+    ('tokens_lexems', 'lex_stream', 'lex', True),
+    ('tokens_lexems', 'lex_offsets', 'lex', True),
+    ('unordered_symbol_table', 'build_symbol_table', 'symbols', True),
+    ('first_follow', 'GrammarAnalysis.compute_nullable', 'first_follow', True),
+    ('first_follow', 'GrammarAnalysis.compute_first', 'first_follow', True),
+    ('first_follow', 'GrammarAnalysis.compute_follow', 'first_follow', True),
+]
+
+PARSER_PHASE = 'parse_program'
+
+def parser_hooks():
+    from parser import Parser
+
+    hooks = []
+    for name, function in vars(Parser).items():
+        if name.startswith('parse_') or (name.endswith('_rule') and inspect.isgeneratorfunction(function)):
+            hooks.append(('parser', f'Parser.{name}', 'parse', name == PARSER_PHASE))
+    return hooks
+
+def token_count(name, args, result):
+    if name in ('lex', 'lex_offsets'):
+        return len(result)
+    if name == PARSER_PHASE:
+        return args[0].index
+    return 0
+
+class Tracer:
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.events = []
+        self.stats = {}
+        self.peaks = []
+        self.nested = []
+        self.origin = time.perf_counter_ns()
+        self.started_tracemalloc = False
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+
+    def stop(self):
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    def begin(self, phase):
+        if phase and self.memory and tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            if self.peaks:
+                self.peaks[-1] = max(self.peaks[-1], peak)
+            self.peaks.append(0)
+            tracemalloc.reset_peak()
+        self.nested.append(0)
+        return time.perf_counter_ns()
+
+    def end(self, category, name, start, phase, tokens=0):
+        end = time.perf_counter_ns()
+        nested = self.nested.pop()
+        if self.nested:
+            self.nested[-1] += end - start
+        peak = None
+        if phase and self.memory and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], self.peaks.pop())
+            if self.peaks:
+                self.peaks[-1] = max(self.peaks[-1], peak)
+        self.events.append((category, name, start - self.origin, end - start, peak))
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = {'category': category, 'calls': 0, 'nanoseconds': 0, 'self_nanoseconds': 0,
+                                        'tokens': 0, 'peak_bytes': None}
+        stats['calls'] += 1
+        stats['nanoseconds'] += end - start
+        stats['self_nanoseconds'] += end - start - nested
+        stats['tokens'] += tokens
+        if peak is not None:
+            stats['peak_bytes'] = max(stats['peak_bytes'] or 0, peak)
+
+    @contextmanager
+    def span(self, name, category='user', phase=False):
+        start = self.begin(phase)
+        try:
+            yield
+        finally:
+            self.end(category, name, start, phase)
+
+    def wrap(self, function, category, name, phase):
+        tracer = self
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def traced(*args, **kwargs):
+                start = tracer.begin(phase)
+                try:
+                    return (yield from function(*args, **kwargs))
+                finally:
+                    tracer.end(category, name, start, phase)
+        else:
+            @functools.wraps(function)
+            def traced(*args, **kwargs):
+                start = tracer.begin(phase)
+                result = None
+                try:
+                    result = function(*args, **kwargs)
+                    return result
+                finally:
+                    tracer.end(category, name, start, phase, token_count(name, args, result))
+        traced.__traced__ = function
+        return traced
+
+    def summary(self):
+        summary = {}
+        for name, stats in sorted(self.stats.items(), key=lambda item: -item[1]['self_nanoseconds']):
+            seconds = stats['nanoseconds'] / 1e9
+            row = {'category': stats['category'], 'calls': stats['calls'], 'seconds': seconds,
+                   'self_seconds': stats['self_nanoseconds'] / 1e9}
+            if stats['tokens']:
+                row['tokens'] = stats['tokens']
+                row['tokens_per_second'] = stats['tokens'] / seconds if seconds else None
+            if stats['peak_bytes'] is not None:
+                row['peak_bytes'] = stats['peak_bytes']
+            summary[name] = row
+        return summary
+
+    def to_json(self):
+        return {
+            'format': TRACE_FORMAT,
+            'summary': self.summary(),
+            'events': [{'category': category, 'name': name, 'start_ns': start, 'duration_ns': duration,
+                        'peak_bytes': peak}
+                       for category, name, start, duration, peak in self.events],
+        }
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        events = []
+        for category, name, start, duration, peak in self.events:
+            event = {'name': name, 'cat': category, 'ph': 'X', 'ts': start / 1000, 'dur': duration / 1000,
+                     'pid': pid, 'tid': 0}
+            if peak is not None:
+                event['args'] = {'peak_bytes': peak}
+            events.append(event)
+        events.sort(key=lambda event: (event['ts'], -event['dur']))
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write(self, file_path, format='chrome'):
+        data = self.to_chrome_trace() if format == 'chrome' else self.to_json()
+        with open(file_path, 'w') as file:
+            json.dump(data, file)
+
+    def report_lines(self):
+        lines = [f"{'name':<28}{'category':<14}{'calls':>9}{'self ms':>12}{'total ms':>12}{'tokens/s':>14}"
+                 f"{'peak KiB':>12}"]
+        for name, row in self.summary().items():
+            rate = row.get('tokens_per_second')
+            peak = row.get('peak_bytes')
+            lines.append(f"{name:<28}{row['category']:<14}{row['calls']:>9}{row['self_seconds'] * 1000:>12.3f}"
+                         f"{row['seconds'] * 1000:>12.3f}"
+                         f"{f'{rate:,.0f}' if rate else '':>14}{f'{peak / 1024:.1f}' if peak is not None else '':>12}")
+        return lines
+
+_installed = []
+
+def _resolve(module_name, path):
+    owner = importlib.import_module(module_name)
+    *parents, attribute = path.split('.')
+    for parent in parents:
+        owner = getattr(owner, parent)
+    return owner, attribute
+
+def install(tracer):
+    if _installed:
+        raise RuntimeError("A tracer is already installed")
+    tracer.start()
+    for module_name, path, category, phase in HOOKS + parser_hooks():
+        owner, attribute = _resolve(module_name, path)
+        original = owner.__dict__[attribute]
+        function = original.__func__ if isinstance(original, staticmethod) else original
+        traced = tracer.wrap(function, category, attribute, phase)
+        setattr(owner, attribute, staticmethod(traced) if isinstance(original, staticmethod) else traced)
+        _installed.append((owner, attribute, original))
+    return tracer
+
+def uninstall():
+    while _installed:
+        owner, attribute, original = _installed.pop()
+        setattr(owner, attribute, original)
+
+@contextmanager
+def tracing(memory=False):
+    tracer = install(Tracer(memory))
+    try:
+        yield tracer
+    finally:
+        uninstall()
+        tracer.stop()
+
+#=================================================================
+
+if __name__ == "__main__":
+    import sys
+    from compiler import compile
+    from first_follow import GrammarAnalysis
+    from grammar import load_grammar
+    from tokens_lexems import read_source_code
+
+    with tracing(memory=True) as tracer:
+        compile(read_source_code(sys.argv[1] if len(sys.argv) > 1 else 'source_code.txt'))
+        GrammarAnalysis(load_grammar('grammer.txt'))
+    print("\n".join(tracer.report_lines()))
+    if len(sys.argv) > 2:
+        tracer.write(sys.argv[2])
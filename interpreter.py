@@ -0,0 +1,301 @@
+import operator
+
+from parser import ParseNode, Parser, run_nested
+from tokens_lexems import lex_offsets
+from unordered_symbol_table import SymbolTable, _declare, _declare_iterator, token_line
+
+def divide(left, right):
+    if isinstance(left, int) and isinstance(right, int):
+        quotient = abs(left) // abs(right)
+        return quotient if (left < 0) == (right < 0) else -quotient
+    return left / right
+
+BINARY_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': divide,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '>': operator.gt,
+    '<=': operator.le,
+    '>=': operator.ge,
+}
+
+COMPOUND_OPERATORS = {'+=': '+', '-=': '-', '*=': '*', '/=': '/'}
+
+DEFAULT_VALUES = {'int': 0, 'float': 0.0, 'string': ''}
+
+def binary_operator(token):
+    function = BINARY_OPERATORS.get(token[1])
+    if function is None:
+        raise SyntaxError(f"Operator {token[1]!r} cannot be used in an expression")
+    return function
+
+def number_value(token):
+    return float(token[1]) if token[0] == 'FLOAT' else int(token[1])
+
+def string_value(token):
+    value = token[1]
+    return value[1:-1] if len(value) > 1 and value[-1] in '"\'' else value[1:]
+
+# pending work in TreeInterpreter.evaluate
+LIST, LOGICAL = 'list', 'logical'
+
+class BreakLoop(Exception):
+    pass
+
+class ContinueLoop(Exception):
+    pass
+
+class ReturnValue(Exception):
+    def __init__(self, value):
+        self.value = value
+
+class NameResolver:
+    # binds every identifier token to the key of the declaration it names with the SymbolTable walk the
+    # bytecode, IR and transpiled backends compile with, so all of them scope names the same way
+    def __init__(self):
+        self.symbol_table = SymbolTable()
+        self.keys = {}
+
+    def resolve(self, tree):
+        run_nested(self.resolve_statements(tree.children))
+        return self.keys
+
+    def bind(self, token):
+        self.keys[id(token)] = self.symbol_table.lookup(token[1])
+
+    def reference(self, token):
+        self.symbol_table.reference(token[1], token_line(token))
+        self.bind(token)
+
+    # the statement walks are generators driven by run_nested, so block nesting does not use the Python stack
+    def resolve_statements(self, statements):
+        for statement in statements:
+            yield getattr(self, f"resolve_{statement.name}")(statement)
+
+    def resolve_scoped(self, statements):
+        self.symbol_table.enter_scope()
+        yield self.resolve_statements(statements)
+        self.symbol_table.exit_scope()
+
+    def resolve_expression(self, node):
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, ParseNode):
+                stack.extend(reversed(item.children))
+            elif item is not None and item[0] == 'IDENTIFIER':
+                self.reference(item)
+
+    def resolve_Declaration(self, node):
+        keyword, identifier = node.children[0], node.children[1]
+        value = node.children[2] if len(node.children) > 2 else None
+        _declare(self.symbol_table, keyword[1], identifier, value)
+        self.bind(identifier)
+        self.resolve_expression(value)
+
+    def resolve_Assignment(self, node):
+        self.reference(node.children[0])
+        self.resolve_expression(node.children[2])
+
+    def resolve_Conditional(self, node):
+        self.resolve_expression(node.children[0].children[0])
+        yield self.resolve_scoped(node.children[1].children)
+        for branch in node.children[2:]:
+            if branch.name == 'ElifStatement':
+                self.resolve_expression(branch.children[0])
+                yield self.resolve_scoped(branch.children[1].children)
+            else:
+                yield self.resolve_scoped(branch.children)
+
+    def resolve_WhileLoop(self, node):
+        self.resolve_expression(node.children[0].children[0])
+        yield self.resolve_scoped(node.children[1].children)
+
+    def resolve_ForLoop(self, node):
+        identifier, target, body = node.children
+        self.resolve_expression(target)
+        self.symbol_table.enter_scope()
+        _declare_iterator(self.symbol_table, identifier, target)
+        self.bind(identifier)
+        yield self.resolve_scoped(body.children)
+        self.symbol_table.exit_scope()
+
+    def resolve_PrintStatement(self, node):
+        self.resolve_expression(node.children[0])
+
+    def resolve_Pass(self, node):
+        pass
+
+    def resolve_Return(self, node):
+        self.resolve_expression(node.children[0])
+
+    def resolve_LoopControl(self, node):
+        pass
+
+class TreeInterpreter:
+    # values live per declaration key, not per executed scope, so a name keeps its value across loop iterations
+    def __init__(self, output=print):
+        self.output = output
+        self.keys = {}
+        self.memory = {}
+
+    def run(self, tree):
+        self.keys = NameResolver().resolve(tree)
+        self.memory = {}
+        try:
+            run_nested(self.execute_block(tree.children))
+        except ReturnValue as result:
+            return result.value
+        return None
+
+    def lookup(self, token):
+        return self.memory.get(self.keys[id(token)])
+
+    def assign(self, token, value):
+        self.memory[self.keys[id(token)]] = value
+
+    # if, while and for run as generators under run_nested; simple statements run directly
+    def execute_block(self, statements):
+        for statement in statements:
+            nested = getattr(self, f"execute_{statement.name}")(statement)
+            if nested is not None:
+                yield nested
+
+    def execute_Declaration(self, node):
+        keyword, identifier = node.children[0], node.children[1]
+        if len(node.children) > 2:
+            value = self.evaluate(node.children[2])
+        else:
+            value = DEFAULT_VALUES.get(keyword[1])
+        self.assign(identifier, value)
+
+    def execute_Assignment(self, node):
+        identifier, operator_token, expression = node.children
+        if operator_token[1] in COMPOUND_OPERATORS:
+            current = self.lookup(identifier)
+            value = BINARY_OPERATORS[COMPOUND_OPERATORS[operator_token[1]]](current, self.evaluate(expression))
+        else:
+            value = self.evaluate(expression)
+        self.assign(identifier, value)
+
+    def execute_Conditional(self, node):
+        # returns the taken branch's block for the caller to run
+        if self.evaluate(node.children[0].children[0]):
+            return self.execute_block(node.children[1].children)
+        for branch in node.children[2:]:
+            if branch.name == 'ElifStatement':
+                if self.evaluate(branch.children[0]):
+                    return self.execute_block(branch.children[1].children)
+            else:
+                return self.execute_block(branch.children)
+        return None
+
+    def execute_WhileLoop(self, node):
+        condition, body = node.children[0].children[0], node.children[1].children
+        while self.evaluate(condition):
+            try:
+                yield self.execute_block(body)
+            except BreakLoop:
+                break
+            except ContinueLoop:
+                continue
+
+    def execute_ForLoop(self, node):
+        identifier, target, body = node.children
+        for value in self.evaluate(target):
+            try:
+                self.assign(identifier, value)
+                yield self.execute_block(body.children)
+            except BreakLoop:
+                break
+            except ContinueLoop:
+                continue
+
+    def execute_PrintStatement(self, node):
+        token = node.children[0]
+        self.output(self.lookup(token) if token[0] == 'IDENTIFIER' else string_value(token))
+
+    def execute_Pass(self, node):
+        pass
+
+    def execute_Return(self, node):
+        expression = node.children[0]
+        raise ReturnValue(None if expression is None else self.evaluate(expression))
+
+    def execute_LoopControl(self, node):
+        raise BreakLoop() if node.children[0][1] == 'break' else ContinueLoop()
+
+    def evaluate(self, node):
+        # descends left operands in a loop; a pending operator, list or 'and'/'or' waits on the work stack
+        lookup = self.lookup
+        work = []
+        while True:
+            name = node.name
+            if name == 'Identifier':
+                value = lookup(node.children[0])
+            elif name == 'Number':
+                value = number_value(node.children[0])
+            elif name == 'String':
+                value = string_value(node.children[0])
+            elif name == 'List':
+                if node.children:
+                    work.append((LIST, node.children, []))
+                    node = node.children[0]
+                    continue
+                value = []
+            else:
+                left, operator_token, right = node.children
+                if name == 'LogicalExpression':
+                    work.append((LOGICAL, operator_token[1], right))
+                else:
+                    work.append((binary_operator(operator_token), None, right))
+                node = left
+                continue
+            while work:
+                kind, argument, pending = work[-1]
+                if kind is LIST:
+                    pending.append(value)
+                    if len(pending) < len(argument):
+                        node = argument[len(pending)]
+                        break
+                    work.pop()
+                    value = pending
+                elif kind is LOGICAL:
+                    work.pop()
+                    if (argument == 'and') == bool(value):
+                        node = pending
+                        break
+                elif argument is not None:
+                    work.pop()
+                    value = kind(argument[0], value)
+                else:
+                    # the left operand is done; a leaf right operand is read in place
+                    right_name = pending.name
+                    if right_name == 'Identifier':
+                        work.pop()
+                        value = kind(value, lookup(pending.children[0]))
+                    elif right_name == 'Number':
+                        work.pop()
+                        value = kind(value, number_value(pending.children[0]))
+                    else:
+                        work[-1] = (kind, (value,), None)
+                        node = pending
+                        break
+            else:
+                return value
+
+def run_source(source_code, output=print):
+    return TreeInterpreter(output).run(Parser(lex_offsets(source_code, positions=True)).parse())
+
+#=================================================================
+
+if __name__ == "__main__":
+    import sys
+    from tokens_lexems import read_source_code
+
+    result = run_source(read_source_code(sys.argv[1] if len(sys.argv) > 1 else 'source_code.txt'))
+    print(f"Returned: {result}")
@@ -0,0 +1,846 @@
+import bisect
+import heapq
+from array import array
+
+from dataflow import FlowGraph, bits, liveness
+from interpreter import BINARY_OPERATORS, COMPOUND_OPERATORS, DEFAULT_VALUES, binary_operator, number_value, string_value
+from parser import Parser, run_nested
+from tokens_lexems import lex_offsets
+from unordered_symbol_table import SymbolTable, _declare, _declare_iterator, token_line
+
+OPCODES = (
+    'NOP', 'LOAD', 'STORE', 'COPY', 'ADD', 'SUB', 'MUL', 'DIV', 'EQ', 'NE', 'LT', 'GT', 'LE', 'GE',
+    'NEW_LIST', 'APPEND', 'GET_ITER', 'NEXT', 'JUMP', 'JUMP_IF_FALSE', 'JUMP_IF_TRUE', 'PRINT', 'RETURN', 'HALT',
+)
+(NOP, LOAD, STORE, COPY, ADD, SUB, MUL, DIV, EQ, NE, LT, GT, LE, GE,
+ NEW_LIST, APPEND, GET_ITER, NEXT, JUMP, JUMP_IF_FALSE, JUMP_IF_TRUE, PRINT, RETURN, HALT) = range(len(OPCODES))
+
+BINARY_OPCODES = {operator: ADD + index for index, operator in enumerate(BINARY_OPERATORS)}
+OPERATOR_FUNCTIONS = tuple(BINARY_OPERATORS.values())
+
+# what the dest, left and right fields of each opcode hold; a USE operand is a temporary,
+# or a constant index stored as ~index
+DEF, USE, VAR, LABEL = 1, 2, 3, 4
+FORMATS = [(0, 0, 0)] * len(OPCODES)
+for _opcode in BINARY_OPCODES.values():
+    FORMATS[_opcode] = (DEF, USE, USE)
+FORMATS[LOAD], FORMATS[STORE], FORMATS[COPY] = (DEF, VAR, 0), (VAR, USE, 0), (DEF, USE, 0)
+FORMATS[NEW_LIST], FORMATS[APPEND], FORMATS[GET_ITER] = (DEF, 0, 0), (0, USE, USE), (DEF, USE, 0)
+FORMATS[NEXT], FORMATS[JUMP] = (DEF, USE, LABEL), (0, 0, LABEL)
+FORMATS[JUMP_IF_FALSE] = FORMATS[JUMP_IF_TRUE] = (0, USE, LABEL)
+FORMATS[PRINT] = FORMATS[RETURN] = (0, USE, 0)
+FORMATS = tuple(FORMATS)
+
+# instructions that never raise; arithmetic and comparisons join them only on operands proven to be numbers
+PURE_OPCODES = {LOAD, COPY, NEW_LIST}
+BRANCH_OPCODES = {NEXT, JUMP_IF_FALSE, JUMP_IF_TRUE}
+EXIT_OPCODES = {RETURN, HALT}
+ENDS_BLOCK = BRANCH_OPCODES | EXIT_OPCODES | {JUMP}
+
+DEFAULT_REGISTERS = 8
+MAX_ROUNDS = 8
+
+class IRProgram:
+    # quads in four parallel arrays; blocks are runs of instructions and jumps name blocks
+    def __init__(self, constants, variables, temp_count):
+        self.ops = array('B')
+        self.dests = array('i')
+        self.lefts = array('i')
+        self.rights = array('i')
+        self.starts = array('I')
+        self.constants = constants
+        self.variables = variables
+        self.temp_count = temp_count
+        self.registers = None
+
+    def __len__(self):
+        return len(self.ops)
+
+    def emit(self, op, dest=0, left=0, right=0):
+        self.ops.append(op)
+        self.dests.append(dest)
+        self.lefts.append(left)
+        self.rights.append(right)
+
+    def columns(self):
+        return tuple(column.tobytes() for column in (self.ops, self.dests, self.lefts, self.rights, self.starts))
+
+    def block_count(self):
+        return len(self.starts)
+
+    def block_end(self, block):
+        return self.starts[block + 1] if block + 1 < len(self.starts) else len(self.ops)
+
+    def last_instruction(self, block):
+        ops = self.ops
+        for index in range(self.block_end(block) - 1, self.starts[block] - 1, -1):
+            if ops[index] != NOP:
+                return index
+        return None
+
+    def successors(self):
+        successors = []
+        count = len(self.starts)
+        for block in range(count):
+            index = self.last_instruction(block)
+            op = self.ops[index] if index is not None else NOP
+            if op == JUMP:
+                successors.append([self.rights[index]])
+            elif op in EXIT_OPCODES:
+                successors.append([])
+            elif op in BRANCH_OPCODES:
+                successors.append([block + 1, self.rights[index]])
+            else:
+                successors.append([block + 1] if block + 1 < count else [])
+        return successors
+
+    def uses(self, index):
+        op = self.ops[index]
+        _, left_kind, right_kind = FORMATS[op]
+        uses = []
+        if left_kind == USE and self.lefts[index] >= 0:
+            uses.append(self.lefts[index])
+        if right_kind == USE and self.rights[index] >= 0:
+            uses.append(self.rights[index])
+        return uses
+
+    def flow_graph(self):
+        # bits number the variables, then the temporaries used outside the block that defines them;
+        # every other temporary is born and dies inside one block and needs no bit
+        ops, dests, lefts = self.ops, self.dests, self.lefts
+        owners, shared = {}, {}
+        for block in range(len(self.starts)):
+            for index in range(self.starts[block], self.block_end(block)):
+                temps = self.uses(index)
+                if FORMATS[ops[index]][0] == DEF:
+                    temps.append(dests[index])
+                for temp in temps:
+                    if owners.setdefault(temp, block) != block and temp not in shared:
+                        shared[temp] = len(self.variables) + len(shared)
+        graph = FlowGraph(None)
+        for block in range(len(self.starts)):
+            uses = defs = 0
+            for index in range(self.starts[block], self.block_end(block)):
+                op = ops[index]
+                for temp in self.uses(index):
+                    if temp in shared:
+                        uses |= (1 << shared[temp]) & ~defs
+                if op == LOAD:
+                    uses |= (1 << lefts[index]) & ~defs
+                elif op == STORE:
+                    defs |= 1 << dests[index]
+                elif FORMATS[op][0] == DEF and dests[index] in shared:
+                    defs |= 1 << shared[dests[index]]
+            graph.add_node(f"B{block}", self.starts[block], uses, defs, [])
+        graph.successors = self.successors()
+        return graph, shared
+
+    def operand_name(self, operand):
+        if operand < 0:
+            return repr(self.constants[~operand])
+        if self.registers is None:
+            return f"t{operand}"
+        return f"r{operand}" if operand < self.registers else f"s{operand - self.registers}"
+
+    def field_text(self, kind, value):
+        if kind == DEF or kind == USE:
+            return self.operand_name(value)
+        if kind == VAR:
+            return self.variables[value]
+        if kind == LABEL:
+            return f"B{value}"
+        return None
+
+    def disassemble(self):
+        lines = []
+        successors = self.successors()
+        for block in range(len(self.starts)):
+            targets = ', '.join(f"B{target}" for target in successors[block])
+            lines.append(f"B{block}:" + (f"  -> {targets}" if targets else ""))
+            for index in range(self.starts[block], self.block_end(block)):
+                op = self.ops[index]
+                fields = zip(FORMATS[op], (self.dests[index], self.lefts[index], self.rights[index]))
+                text = ', '.join(filter(None, (self.field_text(kind, value) for kind, value in fields)))
+                lines.append(f"{index:>6} {OPCODES[op]:<16}{text}")
+        return "\n".join(lines)
+
+class IRBuilder:
+    def __init__(self):
+        self.program = None
+        self.constants = []
+        self.constant_ids = {}
+        self.variables = {}
+        self.symbol_table = SymbolTable()
+        self.temp_count = 0
+        self.labels = []
+        self.loops = []
+
+    def build(self, tree):
+        self.program = IRProgram(self.constants, [], 0)
+        run_nested(self.compile_statements(tree.children))
+        self.program.emit(HALT)
+        self.program.variables = list(self.variables)
+        self.program.temp_count = self.temp_count
+        return self.split_blocks(self.program)
+
+    def split_blocks(self, program):
+        # leaders are the first instruction, every label and every instruction after a branch or exit
+        ops = program.ops
+        leaders = set(self.labels)
+        leaders.add(0)
+        leaders.update(index + 1 for index, op in enumerate(ops) if op in ENDS_BLOCK and index + 1 < len(ops))
+        program.starts = array('I', sorted(leaders))
+        blocks = {start: block for block, start in enumerate(program.starts)}
+        for index, op in enumerate(ops):
+            if FORMATS[op][2] == LABEL:
+                program.rights[index] = blocks[self.labels[program.rights[index]]]
+        return program
+
+    def temp(self):
+        self.temp_count += 1
+        return self.temp_count - 1
+
+    def label(self):
+        self.labels.append(None)
+        return len(self.labels) - 1
+
+    def place(self, label):
+        self.labels[label] = len(self.program.ops)
+
+    def emit(self, op, dest=0, left=0, right=0):
+        self.program.emit(op, dest, left, right)
+
+    def constant(self, value):
+        key = (type(value), value)
+        index = self.constant_ids.get(key)
+        if index is None:
+            index = self.constant_ids[key] = len(self.constants)
+            self.constants.append(value)
+        return ~index
+
+    def variable(self, key):
+        return self.variables.setdefault(key, len(self.variables))
+
+    def reference(self, token):
+        self.symbol_table.reference(token[1], token_line(token))
+        return self.variable(self.symbol_table.lookup(token[1]))
+
+    # statements and expressions lower as generators driven by run_nested, so nesting does not use the
+    # Python stack
+    def compile_statements(self, statements):
+        for statement in statements:
+            yield getattr(self, f"compile_{statement.name}")(statement)
+
+    def compile_scoped(self, statements):
+        self.symbol_table.enter_scope()
+        yield self.compile_statements(statements)
+        self.symbol_table.exit_scope()
+
+    def compile_Declaration(self, node):
+        keyword, identifier = node.children[0], node.children[1]
+        value = node.children[2] if len(node.children) > 2 else None
+        _declare(self.symbol_table, keyword[1], identifier, value)
+        operand = self.constant(DEFAULT_VALUES.get(keyword[1])) if value is None else (yield self.compile_expression(value))
+        self.emit(STORE, self.variable(self.symbol_table.lookup(identifier[1])), operand)
+
+    def compile_Assignment(self, node):
+        identifier, operator_token, expression = node.children
+        variable = self.reference(identifier)
+        if operator_token[1] in COMPOUND_OPERATORS:
+            current = self.temp()
+            self.emit(LOAD, current, variable)
+            operand = self.temp()
+            self.emit(BINARY_OPCODES[COMPOUND_OPERATORS[operator_token[1]]], operand, current,
+                      (yield self.compile_expression(expression)))
+        else:
+            operand = yield self.compile_expression(expression)
+        self.emit(STORE, variable, operand)
+
+    def compile_Conditional(self, node):
+        skip, end = self.label(), self.label()
+        self.emit(JUMP_IF_FALSE, 0, (yield self.compile_expression(node.children[0].children[0])), skip)
+        yield self.compile_scoped(node.children[1].children)
+        for branch in node.children[2:]:
+            self.emit(JUMP, 0, 0, end)
+            self.place(skip)
+            if branch.name == 'ElifStatement':
+                skip = self.label()
+                self.emit(JUMP_IF_FALSE, 0, (yield self.compile_expression(branch.children[0])), skip)
+                yield self.compile_scoped(branch.children[1].children)
+            else:
+                skip = None
+                yield self.compile_scoped(branch.children)
+        if skip is not None:
+            self.place(skip)
+        self.place(end)
+
+    def compile_loop_body(self, body, continue_label, break_label):
+        self.loops.append((continue_label, break_label))
+        yield self.compile_scoped(body.children)
+        self.loops.pop()
+
+    def compile_WhileLoop(self, node):
+        start, exit_label = self.label(), self.label()
+        self.place(start)
+        self.emit(JUMP_IF_FALSE, 0, (yield self.compile_expression(node.children[0].children[0])), exit_label)
+        yield self.compile_loop_body(node.children[1], start, exit_label)
+        self.emit(JUMP, 0, 0, start)
+        self.place(exit_label)
+
+    def compile_ForLoop(self, node):
+        identifier, target, body = node.children
+        iterator = self.temp()
+        self.emit(GET_ITER, iterator, (yield self.compile_expression(target)))
+        self.symbol_table.enter_scope()
+        _declare_iterator(self.symbol_table, identifier, target)
+        variable = self.variable(self.symbol_table.lookup(identifier[1]))
+        start, exit_label = self.label(), self.label()
+        self.place(start)
+        value = self.temp()
+        self.emit(NEXT, value, iterator, exit_label)
+        self.emit(STORE, variable, value)
+        yield self.compile_loop_body(body, start, exit_label)
+        self.symbol_table.exit_scope()
+        self.emit(JUMP, 0, 0, start)
+        self.place(exit_label)
+
+    def compile_PrintStatement(self, node):
+        token = node.children[0]
+        if token[0] == 'IDENTIFIER':
+            operand = self.temp()
+            self.emit(LOAD, operand, self.reference(token))
+        else:
+            operand = self.constant(string_value(token))
+        self.emit(PRINT, 0, operand)
+
+    def compile_Pass(self, node):
+        pass
+
+    def compile_Return(self, node):
+        expression = node.children[0]
+        self.emit(RETURN, 0, self.constant(None) if expression is None else (yield self.compile_expression(expression)))
+
+    def compile_LoopControl(self, node):
+        if not self.loops:
+            raise SyntaxError(f"'{node.children[0][1]}' outside of a loop")
+        continue_label, break_label = self.loops[-1]
+        self.emit(JUMP, 0, 0, continue_label if node.children[0][1] == 'continue' else break_label)
+
+    def compile_expression(self, node):
+        operands = []
+        while node.name in ('BinaryExpression', 'BooleanExpression'):
+            left, operator_token, right = node.children
+            binary_operator(operator_token)
+            operands.append((BINARY_OPCODES[operator_token[1]], right))
+            node = left
+        name = node.name
+        if name == 'Identifier':
+            operand = self.temp()
+            self.emit(LOAD, operand, self.reference(node.children[0]))
+        elif name == 'Number':
+            operand = self.constant(number_value(node.children[0]))
+        elif name == 'String':
+            operand = self.constant(string_value(node.children[0]))
+        elif name == 'List':
+            operand = self.temp()
+            self.emit(NEW_LIST, operand)
+            for element in node.children:
+                self.emit(APPEND, 0, operand, (yield self.compile_expression(element)))
+        elif name == 'LogicalExpression':
+            left, operator_token, right = node.children
+            operand, end = self.temp(), self.label()
+            self.emit(COPY, operand, (yield self.compile_expression(left)))
+            self.emit(JUMP_IF_FALSE if operator_token[1] == 'and' else JUMP_IF_TRUE, 0, operand, end)
+            self.emit(COPY, operand, (yield self.compile_expression(right)))
+            self.place(end)
+        else:
+            raise SyntaxError(f"Unexpected {name} in expression")
+        for op, right in reversed(operands):
+            right_operand = yield self.compile_expression(right)
+            result = self.temp()
+            self.emit(op, result, operand, right_operand)
+            operand = result
+        return operand
+
+def lower(tree):
+    return IRBuilder().build(tree)
+
+def compact(program):
+    # drops NOPs, unreachable blocks and blocks left empty, and merges a block into the one before it
+    # when that one falls through and nothing else reaches it
+    successors = program.successors()
+    count = program.block_count()
+    reachable = [False] * count
+    stack = [0]
+    while stack:
+        block = stack.pop()
+        if block < count and not reachable[block]:
+            reachable[block] = True
+            stack.extend(successors[block])
+    lasts = [program.last_instruction(block) if reachable[block] else None for block in range(count)]
+    # a jump to a dropped block goes to the next block kept after it
+    following = [None] * count
+    kept = None
+    for block in range(count - 1, -1, -1):
+        if lasts[block] is not None:
+            kept = block
+        following[block] = kept
+    predecessors = [0] * count
+    for block in range(count):
+        if lasts[block] is not None:
+            for target in successors[block]:
+                predecessors[following[target]] += 1
+    numbers = [None] * count
+    number, previous = -1, None
+    for block in range(count):
+        if lasts[block] is None:
+            continue
+        if previous is None or previous in ENDS_BLOCK or predecessors[block] != 1:
+            number += 1
+        numbers[block] = number
+        previous = program.ops[lasts[block]]
+    compacted = IRProgram(program.constants, program.variables, program.temp_count)
+    for block in range(count):
+        if lasts[block] is None:
+            continue
+        if numbers[block] == len(compacted.starts):
+            compacted.starts.append(len(compacted.ops))
+        for index in range(program.starts[block], lasts[block] + 1):
+            op = program.ops[index]
+            if op == NOP:
+                continue
+            right = program.rights[index]
+            compacted.emit(op, program.dests[index], program.lefts[index],
+                           numbers[following[right]] if FORMATS[op][2] == LABEL else right)
+    return compacted
+
+def substitute(program, index, replacements):
+    _, left_kind, right_kind = FORMATS[program.ops[index]]
+    if left_kind == USE and program.lefts[index] in replacements:
+        program.lefts[index] = replacements[program.lefts[index]]
+    if right_kind == USE and program.rights[index] in replacements:
+        program.rights[index] = replacements[program.rights[index]]
+
+def forward_loads(program):
+    # within a block a variable's value stays in the operand last loaded from or stored to it
+    ops, dests, lefts = program.ops, program.dests, program.lefts
+    replacements = {}
+    for block in range(program.block_count()):
+        known = {}
+        for index in range(program.starts[block], program.block_end(block)):
+            substitute(program, index, replacements)
+            op = ops[index]
+            if op == LOAD:
+                if lefts[index] in known:
+                    replacements[dests[index]] = known[lefts[index]]
+                    ops[index] = NOP
+                else:
+                    known[lefts[index]] = dests[index]
+            elif op == STORE:
+                if known.get(dests[index]) == lefts[index]:
+                    ops[index] = NOP
+                else:
+                    known[dests[index]] = lefts[index]
+            elif op == COPY:
+                # the temporary of a logical expression is assigned more than once
+                known = {variable: operand for variable, operand in known.items() if operand != dests[index]}
+    return program
+
+def operand_kind(program, kinds, operand):
+    if operand >= 0:
+        return kinds.get(operand)
+    value_type = type(program.constants[~operand])
+    return int if value_type in (int, bool) else float if value_type is float else None
+
+def can_drop(program, index, kinds):
+    # arithmetic raises on anything but numbers, on an int too large for a float mixed with a float
+    # and on a zero divisor; a comparison of two numbers never raises
+    op, left, right = program.ops[index], program.lefts[index], program.rights[index]
+    if op in PURE_OPCODES:
+        return True
+    if not ADD <= op <= GE:
+        return False
+    left_kind, right_kind = operand_kind(program, kinds, left), operand_kind(program, kinds, right)
+    if left_kind is None or right_kind is None:
+        return False
+    if op > DIV:
+        return True
+    if left_kind is not right_kind and (left if left_kind is int else right) >= 0:
+        return False
+    return op != DIV or right < 0 and program.constants[~right] != 0
+
+def number_kinds(program):
+    # int or float for every temporary all of whose definitions yield one; operands are defined
+    # before their uses in instruction order, and only the temporary of a logical expression twice
+    ops, dests, lefts, rights = program.ops, program.dests, program.lefts, program.rights
+    kinds = {}
+    for index in range(len(ops)):
+        op = ops[index]
+        if op == COPY:
+            result = operand_kind(program, kinds, lefts[index])
+        elif ADD <= op <= GE and can_drop(program, index, kinds):
+            both_int = operand_kind(program, kinds, lefts[index]) is operand_kind(program, kinds, rights[index]) is int
+            result = int if op > DIV or both_int else float
+        elif FORMATS[op][0] == DEF:
+            result = None
+        else:
+            continue
+        dest = dests[index]
+        kinds[dest] = result if kinds.get(dest, result) is result else None
+    return kinds
+
+def remove_dead_code(program):
+    # a store nobody loads again and an instruction that cannot raise whose result is never read are removed
+    ops, dests, lefts = program.ops, program.dests, program.lefts
+    kinds = number_kinds(program)
+    graph, shared = program.flow_graph()
+    _, live_out = liveness(graph)
+    for block in range(program.block_count()):
+        live, local = live_out[block], set()
+        for index in range(program.block_end(block) - 1, program.starts[block] - 1, -1):
+            op = ops[index]
+            if op == STORE:
+                bit = 1 << dests[index]
+                if not live & bit:
+                    ops[index] = NOP
+                    continue
+                live &= ~bit
+            elif FORMATS[op][0] == DEF:
+                temp = dests[index]
+                if temp in shared:
+                    bit = 1 << shared[temp]
+                    alive = live & bit
+                    live &= ~bit
+                else:
+                    alive = temp in local
+                    local.discard(temp)
+                if not alive and can_drop(program, index, kinds):
+                    ops[index] = NOP
+                    continue
+            if op == LOAD:
+                live |= 1 << lefts[index]
+            for temp in program.uses(index):
+                if temp in shared:
+                    live |= 1 << shared[temp]
+                else:
+                    local.add(temp)
+    return program
+
+def remove_redundant_loads_stores(program):
+    return compact(remove_dead_code(forward_loads(program)))
+
+IDENTITIES = {ADD: (0, 0), SUB: (None, 0), MUL: (1, 1), DIV: (None, 1)}
+
+def reduce_strength(program):
+    # x * 2 becomes x + x for every type; identities are only dropped where an int operand keeps
+    # its type, so floats (-0.0 + 0 is 0.0), strings and booleans are left alone
+    ops, dests, lefts, rights = program.ops, program.dests, program.lefts, program.rights
+    constants = program.constants
+
+    def equals(operand, value):
+        return operand < 0 and type(constants[~operand]) is int and constants[~operand] == value
+
+    def integer(operand):
+        return type(constants[~operand]) is int if operand < 0 else operand in ints
+
+    for block in range(program.block_count()):
+        ints = set()
+        for index in range(program.starts[block], program.block_end(block)):
+            op, left, right = ops[index], lefts[index], rights[index]
+            if op == MUL and (equals(left, 2) or equals(right, 2)):
+                operand = right if equals(left, 2) else left
+                ops[index], lefts[index], rights[index] = ADD, operand, operand
+            elif op == MUL and (equals(left, 0) and integer(right) or equals(right, 0) and integer(left)):
+                ops[index], lefts[index] = COPY, left if equals(left, 0) else right
+            elif op in IDENTITIES:
+                left_identity, right_identity = IDENTITIES[op]
+                if equals(right, right_identity) and integer(left):
+                    ops[index] = COPY
+                elif left_identity is not None and equals(left, left_identity) and integer(right):
+                    ops[index], lefts[index] = COPY, right
+            op = ops[index]
+            if FORMATS[op][0] != DEF:
+                continue
+            if op == COPY and integer(lefts[index]) or op in IDENTITIES and integer(lefts[index]) and integer(rights[index]):
+                ints.add(dests[index])
+            else:
+                ints.discard(dests[index])
+    return program
+
+def thread_jumps(program):
+    ops, lefts, rights = program.ops, program.lefts, program.rights
+    count = program.block_count()
+    constants = program.constants
+    predecessors = [0] * count
+    for targets in program.successors():
+        for target in targets:
+            predecessors[target] += 1
+
+    def only(block):
+        start = program.starts[block]
+        return start if program.block_end(block) - start == 1 else None
+
+    def final(block):
+        seen = set()
+        index = only(block)
+        while index is not None and ops[index] == JUMP and block not in seen:
+            seen.add(block)
+            block = rights[index]
+            index = only(block)
+        return block
+
+    for block in range(count):
+        index = program.last_instruction(block)
+        if index is None or FORMATS[ops[index]][2] != LABEL:
+            continue
+        op = ops[index]
+        if op in (JUMP_IF_FALSE, JUMP_IF_TRUE) and lefts[index] < 0:
+            # a branch on a constant always goes the same way
+            if bool(constants[~lefts[index]]) == (op == JUMP_IF_TRUE):
+                ops[index] = op = JUMP
+            else:
+                ops[index] = NOP
+                continue
+        target, seen = final(rights[index]), set()
+        while op in (JUMP_IF_FALSE, JUMP_IF_TRUE) and target not in seen:
+            # the branch already decided the condition the target block tests again
+            seen.add(target)
+            next_index = only(target)
+            if next_index is None or ops[next_index] not in (JUMP_IF_FALSE, JUMP_IF_TRUE) or \
+                    lefts[next_index] != lefts[index]:
+                break
+            target = final(rights[next_index] if ops[next_index] == op else target + 1)
+        rights[index] = target
+        if target == block + 1 and op != NEXT:
+            ops[index] = NOP
+            continue
+        following = only(block + 1) if op != JUMP and target == block + 2 else None
+        if following is not None and ops[following] == JUMP and predecessors[block + 1] == 1:
+            # branch over a lone jump: invert the branch and let the jump block fall away
+            ops[index] = JUMP_IF_TRUE if op == JUMP_IF_FALSE else JUMP_IF_FALSE
+            rights[index] = rights[following]
+            ops[following] = NOP
+    return compact(program)
+
+PASSES = (
+    ('loads/stores', remove_redundant_loads_stores),
+    ('strength', reduce_strength),
+    ('jumps', thread_jumps),
+)
+
+class PassReport:
+    def __init__(self, program):
+        self.lowered = (len(program), program.block_count())
+        self.passes = []
+
+    def record(self, name, before, program):
+        self.passes.append((name, before, (len(program), program.block_count())))
+
+    def lines(self):
+        instructions, blocks = self.lowered
+        lines = [f"{'lowered':<16}{instructions:>6} instructions {blocks:>5} blocks"]
+        for name, (before, before_blocks), (after, after_blocks) in self.passes:
+            lines.append(f"{name:<16}{before:>6} -> {after:<6} instructions {before_blocks:>5} -> {after_blocks:<5} blocks")
+        final, _ = self.passes[-1][2] if self.passes else self.lowered
+        saved = instructions - final
+        percent = saved * 100 / instructions if instructions else 0.0
+        lines.append(f"{'total':<16}{instructions:>6} -> {final:<6} instructions (removed {saved}, {percent:.1f}%)")
+        return lines
+
+def optimize(program, passes=PASSES):
+    report = PassReport(program)
+    for _ in range(MAX_ROUNDS):
+        changed = False
+        for name, run_pass in passes:
+            before = (len(program), program.block_count())
+            columns = program.columns()
+            program = run_pass(program)
+            report.record(name, before, program)
+            changed = changed or program.columns() != columns
+        if not changed:
+            break
+    return program, report
+
+def live_intervals(program):
+    # one conservative range per temporary; a use at instruction i is at 2i and a def at 2i + 1
+    graph, shared = program.flow_graph()
+    live_in, live_out = liveness(graph)
+    temps = [None] * len(program.variables) + list(shared)
+    starts, ends = {}, {}
+
+    def extend(temp, position):
+        if temp not in starts or position < starts[temp]:
+            starts[temp] = position
+        if temp not in ends or position > ends[temp]:
+            ends[temp] = position
+
+    first_shared = len(program.variables)
+    for block in range(program.block_count()):
+        first, end = program.starts[block], program.block_end(block)
+        for bit in bits(live_in[block] >> first_shared):
+            extend(temps[first_shared + bit], 2 * first)
+        for bit in bits(live_out[block] >> first_shared):
+            extend(temps[first_shared + bit], 2 * end - 1)
+        for index in range(first, end):
+            for temp in program.uses(index):
+                extend(temp, 2 * index)
+            if FORMATS[program.ops[index]][0] == DEF:
+                extend(program.dests[index], 2 * index + 1)
+    return sorted((start, ends[temp], temp) for temp, start in starts.items())
+
+def linear_scan(intervals, registers=None):
+    # registers=None grows the pool on demand, as the spill area does
+    starts = {temp: start for start, _, temp in intervals}
+    locations = {}
+    free = list(range(registers or 0))
+    size = registers or 0
+    active = []
+    spilled = []
+    for start, end, temp in intervals:
+        while active and active[0][0] < start:
+            heapq.heappush(free, locations[heapq.heappop(active)[1]])
+        if free:
+            locations[temp] = heapq.heappop(free)
+        elif registers is None:
+            locations[temp] = size
+            size += 1
+        else:
+            # spill whichever of the active intervals and this one ends last
+            victim_end, victim = max(active, default=(-1, None))
+            if victim_end <= end:
+                spilled.append((start, end, temp))
+                continue
+            active.remove((victim_end, victim))
+            heapq.heapify(active)
+            locations[temp] = locations.pop(victim)
+            bisect.insort(spilled, (starts[victim], victim_end, victim))
+        heapq.heappush(active, (end, temp))
+    return locations, spilled, size
+
+class RegisterAllocation:
+    def __init__(self, program, registers, locations, spill_slots, spilled):
+        self.program = program
+        self.registers = registers
+        self.locations = locations
+        self.spill_slots = spill_slots
+        self.spilled = spilled
+        self.spill_accesses = self.count_spill_accesses()
+
+    def used_registers(self):
+        return len({location for location in self.locations.values() if location < self.registers})
+
+    def count_spill_accesses(self):
+        program = self.program
+        spilled = {temp for _, _, temp in self.spilled}
+        accesses = 0
+        for index in range(len(program)):
+            accesses += sum(temp in spilled for temp in program.uses(index))
+            accesses += FORMATS[program.ops[index]][0] == DEF and program.dests[index] in spilled
+        return accesses
+
+    def lines(self):
+        return [f"{len(self.locations)} temporaries in {self.used_registers()} of {self.registers} registers, "
+                f"{len(self.spilled)} spilled to {self.spill_slots} slots ({self.spill_accesses} spill accesses)"]
+
+    def apply(self):
+        program = self.program
+        locations = self.locations
+        for index in range(len(program)):
+            dest_kind, left_kind, right_kind = FORMATS[program.ops[index]]
+            if dest_kind == DEF:
+                program.dests[index] = locations[program.dests[index]]
+            if left_kind == USE and program.lefts[index] >= 0:
+                program.lefts[index] = locations[program.lefts[index]]
+            if right_kind == USE and program.rights[index] >= 0:
+                program.rights[index] = locations[program.rights[index]]
+        program.temp_count = self.registers + self.spill_slots
+        program.registers = self.registers
+        return program
+
+def allocate_registers(program, registers=DEFAULT_REGISTERS):
+    locations, spilled, _ = linear_scan(live_intervals(program), registers)
+    slots, _, spill_slots = linear_scan(spilled)
+    for temp, slot in slots.items():
+        locations[temp] = registers + slot
+    return RegisterAllocation(program, registers, locations, spill_slots, spilled)
+
+def run(program, output=print):
+    ops, dests, lefts, rights = (column.tolist() for column in (program.ops, program.dests, program.lefts, program.rights))
+    starts = program.starts.tolist()
+    functions = OPERATOR_FUNCTIONS
+    # constants sit reversed after the temporaries so that operand ~k indexes constant k
+    values = [None] * program.temp_count + program.constants[::-1]
+    memory = [None] * len(program.variables)
+    pc = 0
+    while True:
+        op = ops[pc]
+        if op == LOAD:
+            values[dests[pc]] = memory[lefts[pc]]
+        elif op == STORE:
+            memory[dests[pc]] = values[lefts[pc]]
+        elif ADD <= op <= GE:
+            values[dests[pc]] = functions[op - ADD](values[lefts[pc]], values[rights[pc]])
+        elif op == JUMP_IF_FALSE:
+            if not values[lefts[pc]]:
+                pc = starts[rights[pc]]
+                continue
+        elif op == JUMP:
+            pc = starts[rights[pc]]
+            continue
+        elif op == NEXT:
+            value = next(values[lefts[pc]], values)
+            if value is values:
+                pc = starts[rights[pc]]
+                continue
+            values[dests[pc]] = value
+        elif op == COPY:
+            values[dests[pc]] = values[lefts[pc]]
+        elif op == JUMP_IF_TRUE:
+            if values[lefts[pc]]:
+                pc = starts[rights[pc]]
+                continue
+        elif op == NEW_LIST:
+            values[dests[pc]] = []
+        elif op == APPEND:
+            values[lefts[pc]].append(values[rights[pc]])
+        elif op == GET_ITER:
+            values[dests[pc]] = iter(values[lefts[pc]])
+        elif op == PRINT:
+            output(values[lefts[pc]])
+        elif op == RETURN:
+            return values[lefts[pc]]
+        elif op == HALT:
+            return None
+        pc += 1
+
+def compile_source(source_code, registers=DEFAULT_REGISTERS, passes=PASSES):
+    program, report = optimize(lower(Parser(lex_offsets(source_code, positions=True)).parse()), passes)
+    allocation = allocate_registers(program, registers)
+    return allocation.apply(), report, allocation
+
+#=================================================================
+
+def main(argv=None):
+    import argparse
+    import sys
+    from tokens_lexems import read_source_code
+
+    arg_parser = argparse.ArgumentParser(description="Lower a program to three-address code, optimize and allocate registers.")
+    arg_parser.add_argument('file', nargs='?', default='source_code.txt')
+    arg_parser.add_argument('--registers', type=int, default=DEFAULT_REGISTERS)
+    arg_parser.add_argument('--no-optimize', action='store_true', help="allocate registers for the lowered code as is")
+    arg_parser.add_argument('--run', action='store_true', help="execute the allocated code")
+    args = arg_parser.parse_args(argv)
+
+    program, report, allocation = compile_source(read_source_code(args.file), args.registers,
+                                                 () if args.no_optimize else PASSES)
+    print(program.disassemble())
+    print("\n".join(report.lines()))
+    print("\n".join(allocation.lines()))
+    if args.run:
+        print(f"Returned: {run(program)}")
+    return 0
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import tempfile
+from array import array
+
+from first_follow import GrammarAnalysis
+from grammar import Grammar, parse_grammar
+from parser import ParseNode, token_text
+
+CACHE_DIRECTORY = '.grammar_cache'
+CACHE_FORMAT = 1
+
+LEXICAL_TERMINALS = {
+    'IDENTIFIER': 'Identifier',
+    'NUMBER': 'NUMBER',
+    'FLOAT': 'FLOAT',
+    'STRING': 'STRING',
+}
+
+class LL1Table:
+    def __init__(self, grammar, table, conflicts, grammar_hash=None):
+        self.grammar = grammar
+        self.table = table
+        self.conflicts = conflicts
+        self.grammar_hash = grammar_hash
+        self.num_terminals = len(grammar.symbols) - grammar.num_nonterminals
+
+    def production_for(self, nonterminal, terminal):
+        return self.table[nonterminal * self.num_terminals + terminal - self.grammar.num_nonterminals]
+
+    def describe_conflicts(self):
+        symbols = self.grammar.symbols
+        lines = []
+        for nonterminal, terminal, chosen, rejected in self.conflicts:
+            lines.append(f"Conflict at ({symbols[nonterminal]}, {symbols[terminal]}): "
+                         f"kept {self.grammar.production_text(chosen)}, "
+                         f"dropped {self.grammar.production_text(rejected)}")
+        return lines
+
+    def to_json(self):
+        grammar = self.grammar
+        return {
+            'format': CACHE_FORMAT,
+            'grammar_hash': self.grammar_hash,
+            'symbols': grammar.symbols,
+            'num_nonterminals': grammar.num_nonterminals,
+            'start': grammar.start,
+            'productions': [[lhs, list(rhs)] for lhs, rhs in grammar.productions],
+            'synthetic': sorted(grammar.synthetic),
+            'table': self.table.tolist(),
+            'conflicts': self.conflicts,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        symbols = data['symbols']
+        productions = [(symbols[lhs], [symbols[s] for s in rhs]) for lhs, rhs in data['productions']]
+        grammar = Grammar(productions, start=symbols[data['start']], synthetic=data['synthetic'])
+        if grammar.symbols != symbols or grammar.num_nonterminals != data['num_nonterminals']:
+            raise ValueError("Cached grammar symbols do not match")
+        conflicts = [tuple(conflict) for conflict in data['conflicts']]
+        return cls(grammar, array('i', data['table']), conflicts, data['grammar_hash'])
+
+def build_table(grammar, grammar_hash=None):
+    analysis = GrammarAnalysis(grammar)
+    num_nonterminals = grammar.num_nonterminals
+    num_terminals = len(grammar.symbols) - num_nonterminals
+    table = array('i', [-1]) * (num_nonterminals * num_terminals)
+    conflicts = []
+    for index, (lhs, rhs) in enumerate(grammar.productions):
+        bits, nullable = analysis.first_of_sequence(rhs)
+        if nullable:
+            bits |= analysis.follow[lhs]
+        row = lhs * num_terminals
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            terminal = low.bit_length() - 1
+            existing = table[row + terminal]
+            if existing == -1:
+                table[row + terminal] = index
+            elif existing != index:
+                conflicts.append((lhs, terminal + num_nonterminals, existing, index))
+    return LL1Table(grammar, table, conflicts, grammar_hash)
+
+def load_table(file_path='grammer.txt', cache_directory=CACHE_DIRECTORY):
+    with open(file_path, 'r') as file:
+        text = file.read()
+    grammar_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    cache_path = None
+    if cache_directory is not None:
+        cache_path = os.path.join(cache_directory, f"ll1-{grammar_hash[:16]}.json")
+        try:
+            with open(cache_path, 'r') as file:
+                data = json.load(file)
+            if data.get('format') == CACHE_FORMAT and data.get('grammar_hash') == grammar_hash:
+                return LL1Table.from_json(data)
+        except (OSError, ValueError, KeyError, IndexError):
+            pass
+    ll1_table = build_table(parse_grammar(text), grammar_hash)
+    if cache_path is not None:
+        os.makedirs(cache_directory, exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', prefix=f"ll1-{grammar_hash[:16]}.",
+                                                      dir=cache_directory)
+        try:
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(ll1_table.to_json(), file)
+            os.replace(temporary_path, cache_path)
+        except BaseException:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            raise
+    return ll1_table
+
+class LL1Parser:
+    def __init__(self, ll1_table):
+        self.ll1_table = ll1_table
+        grammar = ll1_table.grammar
+        self.kind_terminals = {}
+        for kind, name in LEXICAL_TERMINALS.items():
+            if name in grammar.symbol_ids:
+                self.kind_terminals[kind] = grammar.symbol_ids[name]
+        self.lexeme_terminals = {}
+        for name, symbol in grammar.symbol_ids.items():
+            if grammar.is_terminal(symbol) and name[0] in '"\'':
+                self.lexeme_terminals[name[1:-1]] = symbol
+        # errors name the grammar nonterminal a factored or de-recursed symbol such as Expression'1 came from
+        self.names = [name.split("'")[0] if name in grammar.synthetic else name for name in grammar.symbols]
+
+    def terminal_of(self, token):
+        terminal = self.kind_terminals.get(token[0])
+        if terminal is None:
+            terminal = self.lexeme_terminals.get(token[1])
+        if terminal is None:
+            raise SyntaxError(f"Token {token} is not a terminal of the grammar")
+        return terminal
+
+    def parse(self, tokens):
+        ll1_table = self.ll1_table
+        grammar = ll1_table.grammar
+        symbols = grammar.symbols
+        names = self.names
+        productions = grammar.productions
+        synthetic = {grammar.symbol_ids[name] for name in grammar.synthetic}
+        num_nonterminals = grammar.num_nonterminals
+        num_terminals = ll1_table.num_terminals
+        table = ll1_table.table
+        terminal_of = self.terminal_of
+
+        root = ParseNode("Root")
+        stack = [(grammar.end, None), (grammar.start, root.children)]
+        tokens = iter(tokens)
+        token = next(tokens, None)
+        terminal = grammar.end if token is None else terminal_of(token)
+        while stack:
+            symbol, children = stack.pop()
+            if symbol >= num_nonterminals:
+                if symbol != terminal:
+                    raise SyntaxError(f"Expected {names[symbol]}, but got {token_text(token)}")
+                if symbol == grammar.end:
+                    break
+                children.append(token)
+                token = next(tokens, None)
+                terminal = grammar.end if token is None else terminal_of(token)
+                continue
+            production = table[symbol * num_terminals + terminal - num_nonterminals]
+            if production == -1:
+                raise SyntaxError(f"Unexpected token {token_text(token)} while parsing {names[symbol]}")
+            if symbol not in synthetic:
+                node = ParseNode(symbols[symbol])
+                children.append(node)
+                children = node.children
+            for child in reversed(productions[production][1]):
+                stack.append((child, children))
+        return root.children[0]
+
+#=================================================================
+
+if __name__ == "__main__":
+    import sys
+    from tokens_lexems import lex, read_source_code
+
+    ll1_table = load_table(sys.argv[1] if len(sys.argv) > 1 else 'grammer.txt')
+    grammar = ll1_table.grammar
+    print(f"{len(grammar.productions)} productions, {grammar.num_nonterminals} nonterminals, "
+          f"{ll1_table.num_terminals} terminals")
+    for line in ll1_table.describe_conflicts():
+        print(line)
+    try:
+        print(LL1Parser(ll1_table).parse(lex(read_source_code('source_code.txt'))))
+    except SyntaxError as e:
+        print(f"Syntax Error: {e}")
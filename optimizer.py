@@ -0,0 +1,322 @@
+import re
+
+from interpreter import BINARY_OPERATORS, COMPOUND_OPERATORS, DEFAULT_VALUES, number_value, string_value
+from parser import ParseNode, Parser, run_nested
+from tokens_lexems import lex
+
+UNKNOWN = object()
+
+# a folded string longer than this stays an expression rather than growing the tree and the symbol table
+MAX_FOLDED_LENGTH = 4096
+FLOAT_LEXEME = re.compile(r'[0-9]+\.[0-9]*')
+
+TERMINATORS = {'Return', 'LoopControl'}
+
+def first_line(node):
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, ParseNode):
+            stack.extend(reversed([child for child in item.children if child is not None]))
+        elif len(item) > 2:
+            return item[2]
+    return 0
+
+def is_literal(value):
+    # only values whose lexeme the lexer reads back; there are no signed, exponent, inf or nan literals
+    if type(value) is str:
+        return '"' not in value and "'" not in value and len(value) <= MAX_FOLDED_LENGTH
+    if type(value) is int:
+        return value >= 0
+    return type(value) is float and FLOAT_LEXEME.fullmatch(repr(value)) is not None
+
+def literal(value, line=0):
+    if type(value) is str:
+        token, name = ('STRING', f'"{value}"'), "String"
+    else:
+        token, name = ('FLOAT' if type(value) is float else 'NUMBER', repr(value)), "Number"
+    return ParseNode(name, [token + (line,) if line else token])
+
+def branch_statements(branch):
+    return branch.children[1].children if branch.name == 'ElifStatement' else branch.children
+
+def assigned_names(nodes):
+    names = set()
+    stack = list(nodes)
+    while stack:
+        item = stack.pop()
+        if not isinstance(item, ParseNode):
+            continue
+        if item.name in ('Assignment', 'Declaration'):
+            names.add(item.children[0 if item.name == 'Assignment' else 1][1])
+        elif item.name == 'ForLoop':
+            names.add(item.children[0][1])
+        stack.extend(child for child in item.children if child is not None)
+    return names
+
+class OptimizationReport:
+    def __init__(self):
+        self.folded = 0
+        self.propagated = 0
+        self.removed = []
+
+    def remove(self, node, reason):
+        self.removed.append((node.name, first_line(node), reason))
+
+    def lines(self):
+        lines = [f"Folded {self.folded} expressions, propagated {self.propagated} constants, "
+                 f"removed {len(self.removed)} nodes"]
+        for name, line, reason in self.removed:
+            lines.append(f"  line {line}: removed {name} ({reason})")
+        return lines
+
+class Optimizer:
+    def __init__(self):
+        self.scopes = [{}]
+        self.report = OptimizationReport()
+
+    def optimize(self, tree):
+        self.scopes = [{}]
+        tree.children = run_nested(self.optimize_block(tree.children))
+        return tree
+
+    def lookup(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return UNKNOWN
+
+    def assign(self, name, value):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                scope[name] = value
+                return
+        self.scopes[-1][name] = value
+
+    def invalidate(self, names):
+        for scope in self.scopes:
+            for name in names & scope.keys():
+                scope[name] = UNKNOWN
+
+    # blocks and expressions are walked by generators driven by run_nested, so nesting does not use the
+    # Python stack
+    def optimize_block(self, statements, scope=None):
+        if scope is not None:
+            self.scopes.append(scope)
+        optimized = []
+        for index, statement in enumerate(statements):
+            result = yield getattr(self, f"optimize_{statement.name}")(statement)
+            if isinstance(result, list):
+                optimized.extend(result)
+            elif result is not None:
+                optimized.append(result)
+            last = result[-1] if isinstance(result, list) and result else result
+            if isinstance(last, ParseNode) and last.name in TERMINATORS:
+                for unreachable in statements[index + 1:]:
+                    self.report.remove(unreachable, f"unreachable after {statement.name}")
+                break
+        if scope is not None:
+            self.scopes.pop()
+        return optimized
+
+    def optimize_Declaration(self, node):
+        keyword, identifier = node.children[0], node.children[1]
+        # the initializer reads the declared symbol, which shadows any outer one from here on
+        self.scopes[-1].setdefault(identifier[1], UNKNOWN)
+        if len(node.children) > 2:
+            node.children[2], value = yield self.fold(node.children[2])
+        else:
+            value = DEFAULT_VALUES.get(keyword[1], UNKNOWN)
+        self.scopes[-1][identifier[1]] = value
+        return node
+
+    def optimize_Assignment(self, node):
+        identifier, operator_token, expression = node.children
+        expression, value = yield self.fold(expression)
+        if operator_token[1] in COMPOUND_OPERATORS:
+            current = self.lookup(identifier[1])
+            result = UNKNOWN
+            if current is not UNKNOWN and value is not UNKNOWN:
+                result = self.apply(COMPOUND_OPERATORS[operator_token[1]], current, value)
+            if is_literal(result):
+                self.report.folded += 1
+                operator_token = ('OPERATOR', '=') + operator_token[2:]
+                expression = literal(result, first_line(node))
+            value = result
+        node.children = [identifier, operator_token, expression]
+        self.assign(identifier[1], value)
+        return node
+
+    def optimize_Conditional(self, node):
+        branches = [(node.children[0].children[0], node.children[1])]
+        for branch in node.children[2:]:
+            branches.append((branch.children[0], branch) if branch.name == 'ElifStatement' else (None, branch))
+        kept = []
+        for index, (condition, branch) in enumerate(branches):
+            value = True
+            if condition is not None:
+                condition, value = yield self.fold(condition)
+            if value is not UNKNOWN and not value:
+                self.report.remove(branch, "condition is always false")
+                continue
+            kept.append((condition, branch, value is not UNKNOWN))
+            if value is not UNKNOWN:
+                for _, unreachable in branches[index + 1:]:
+                    self.report.remove(unreachable, "an earlier branch is always taken")
+                break
+        if not kept:
+            return None
+        if kept[0][2]:
+            statements = branch_statements(kept[0][1])
+            if self.can_inline(statements):
+                return (yield self.optimize_block(statements))
+            body = yield self.optimize_block(statements, {})
+            return ParseNode("Conditional", [ParseNode("Condition", [literal(1, first_line(node))]),
+                                             ParseNode("IfBody", body)])
+        snapshot = [dict(scope) for scope in self.scopes]
+        children = []
+        for condition, branch, always in kept:
+            self.scopes = [dict(scope) for scope in snapshot]
+            body = yield self.optimize_block(branch_statements(branch), {})
+            if not children:
+                children.append(ParseNode("Condition", [condition]))
+                children.append(ParseNode("IfBody", body))
+            elif always:
+                children.append(ParseNode("ElseBody", body))
+            else:
+                children.append(ParseNode("ElifStatement", [condition, ParseNode("Body", body)]))
+        self.scopes = snapshot
+        self.invalidate(assigned_names(children))
+        return ParseNode("Conditional", children)
+
+    def can_inline(self, statements):
+        # any name the body does not already see would be declared in the enclosing scope instead
+        if any(statement.name == 'Declaration' for statement in statements):
+            return False
+        stack = list(statements)
+        while stack:
+            item = stack.pop()
+            if isinstance(item, ParseNode):
+                stack.extend(child for child in item.children if child is not None)
+            elif item[0] == 'IDENTIFIER' and not any(item[1] in scope for scope in self.scopes):
+                return False
+        return True
+
+    def optimize_WhileLoop(self, node):
+        condition, body = node.children
+        assigned = assigned_names(body.children)
+        self.invalidate(assigned)
+        condition.children[0], value = yield self.fold(condition.children[0])
+        if value is not UNKNOWN and not value:
+            self.report.remove(node, "loop condition is always false")
+            return None
+        body.children = yield self.optimize_block(body.children, {})
+        self.invalidate(assigned)
+        return node
+
+    def optimize_ForLoop(self, node):
+        identifier, target, body = node.children
+        target, _ = yield self.fold(target)
+        if target.name == 'List' and not target.children:
+            self.report.remove(node, "loop over an empty list")
+            return None
+        assigned = assigned_names(body.children)
+        self.invalidate(assigned)
+        self.scopes.append({identifier[1]: UNKNOWN})
+        body.children = yield self.optimize_block(body.children, {})
+        self.scopes.pop()
+        self.invalidate(assigned)
+        node.children = [identifier, target, body]
+        return node
+
+    def optimize_PrintStatement(self, node):
+        return node
+
+    def optimize_Pass(self, node):
+        return node
+
+    def optimize_Return(self, node):
+        if node.children[0] is not None:
+            node.children[0], _ = yield self.fold(node.children[0])
+        return node
+
+    def optimize_LoopControl(self, node):
+        return node
+
+    def apply(self, operator, left, right):
+        if operator == '*' and {type(left), type(right)} == {str, int}:
+            text, count = (left, right) if type(left) is str else (right, left)
+            if len(text) * count > MAX_FOLDED_LENGTH:
+                return UNKNOWN
+        elif operator == '+' and type(left) is type(right) is str and len(left) + len(right) > MAX_FOLDED_LENGTH:
+            return UNKNOWN
+        try:
+            return BINARY_OPERATORS[operator](left, right)
+        except Exception:
+            return UNKNOWN
+
+    def fold(self, node):
+        operands = []
+        while node.name in ('BinaryExpression', 'BooleanExpression'):
+            left, operator_token, right = node.children
+            operands.append((node.name, operator_token, right))
+            node = left
+        node, value = yield self.fold_term(node)
+        for name, operator_token, right in reversed(operands):
+            right, right_value = yield self.fold_term(right)
+            result = UNKNOWN
+            if value is not UNKNOWN and right_value is not UNKNOWN and operator_token[1] in BINARY_OPERATORS:
+                result = self.apply(operator_token[1], value, right_value)
+            if result is not UNKNOWN:
+                self.report.folded += 1
+            if is_literal(result):
+                node = literal(result, first_line(node))
+            else:
+                node = ParseNode(name, [node, operator_token, right])
+            value = result
+        return node, value
+
+    def fold_term(self, node):
+        name = node.name
+        if name == 'Identifier':
+            value = self.lookup(node.children[0][1])
+            if is_literal(value):
+                self.report.propagated += 1
+                return literal(value, first_line(node)), value
+            return node, value
+        if name == 'Number':
+            return node, number_value(node.children[0])
+        if name == 'String':
+            return node, string_value(node.children[0])
+        if name == 'List':
+            children = []
+            for child in node.children:
+                children.append((yield self.fold(child))[0])
+            node.children = children
+            return node, UNKNOWN
+        if name == 'LogicalExpression':
+            left, operator_token, right = node.children
+            left, value = yield self.fold(left)
+            if value is UNKNOWN:
+                node.children = [left, operator_token, (yield self.fold(right))[0]]
+                return node, UNKNOWN
+            self.report.folded += 1
+            if (operator_token[1] == 'and') == bool(value):
+                return (yield self.fold(right))
+            return left, value
+        return (yield self.fold(node))
+
+def optimize(tree):
+    optimizer = Optimizer()
+    return optimizer.optimize(tree), optimizer.report
+
+#=================================================================
+
+if __name__ == "__main__":
+    import sys
+    from tokens_lexems import read_source_code
+
+    tree, report = optimize(Parser(lex(read_source_code(sys.argv[1] if len(sys.argv) > 1 else 'source_code.txt'),
+                                       positions=True)).parse())
+    print(tree)
+    print("\n".join(report.lines()))
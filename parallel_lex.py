@@ -0,0 +1,172 @@
+import codecs
+import mmap
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+from tokens_lexems import LineIndex, TokenStream, format_syntax_error, lex_offsets, offset_columns, scan_offsets
+
+MINIMUM_CHUNK_BYTES = 256 * 1024
+LOOKAHEAD_BYTES = 64 * 1024
+CHUNKS_PER_WORKER = 4
+
+# a statement or block ends at the end of a line; the chunk lexers confirm it was not inside a string or comment
+RESYNC_POINT = re.compile(rb'[;{}][ \t\r]*\n')
+
+@contextmanager
+def open_buffer(descriptor):
+    kind, name, size = descriptor
+    if kind == 'file':
+        with open(name, 'rb') as file:
+            if size == 0:
+                yield b''
+                return
+            with mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ) as buffer:
+                yield buffer
+    else:
+        # shared memory is rounded up to whole pages
+        memory = shared_memory.SharedMemory(name)
+        view = memory.buf[:size]
+        try:
+            yield view
+        finally:
+            view.release()
+            memory.close()
+
+def find_resync_points(buffer, size, count, minimum=MINIMUM_CHUNK_BYTES):
+    points = [0]
+    step = max(minimum, -(-size // count))
+    target = step
+    while target < size:
+        match = RESYNC_POINT.search(buffer, target)
+        if match is None:
+            break
+        points.append(match.start() + 1)
+        target = points[-1] + step
+    points.append(size)
+    return points
+
+def lex_chunk(descriptor, start, end, char_base):
+    # lexes as if start were a token boundary; the caller checks that against the previous chunk
+    with open_buffer(descriptor) as buffer:
+        size = len(buffer)
+        text = bytes(buffer[start:end]).decode('utf-8')
+        lookahead_end = min(size, end + LOOKAHEAD_BYTES)
+        final = lookahead_end == size
+        lookahead = codecs.getincrementaldecoder('utf-8')().decode(bytes(buffer[end:lookahead_end]), final)
+    limit = len(text)
+    text += lookahead
+    kinds, starts, ends = offset_columns(size)
+    try:
+        resume = scan_offsets(text, kinds, starts, ends, limit=limit, base=char_base)
+    except SyntaxError as e:
+        return kinds, starts, ends, None, e.msg
+    if resume == len(text) and not final:
+        # the next token lies beyond the lookahead; the caller lexes the rest of the chunk itself
+        if ends and ends[-1] == char_base + len(text):
+            for column in (kinds, starts, ends):
+                column.pop()
+        resume = None
+    else:
+        resume += char_base
+    return kinds, starts, ends, resume, None
+
+def stitch(source, lines, chunks, results, kinds, starts, ends):
+    # next_start is where the sequential lexer's next token starts
+    next_start = None
+    for (first_char, last_char), (chunk_kinds, chunk_starts, chunk_ends, resume, error) in zip(chunks, results):
+        if chunk_starts:
+            first = chunk_starts[0]
+        elif error is None and resume is not None:
+            first = resume
+        else:
+            first = -1
+        if next_start is not None and first != next_start:
+            next_start = scan_offsets(source, kinds, starts, ends, next_start, last_char, lines=lines)
+            continue
+        if error is not None:
+            # lex the chunk again here so the error is located against the whole source
+            scan_offsets(source, kinds, starts, ends, first_char if next_start is None else next_start, last_char,
+                         lines=lines)
+            raise SyntaxError(error)
+        kinds.extend(chunk_kinds)
+        starts.extend(chunk_starts)
+        ends.extend(chunk_ends)
+        if resume is None:
+            resume = scan_offsets(source, kinds, starts, ends, ends[-1] if chunk_ends else first_char, last_char,
+                                  lines=lines)
+        next_start = resume
+    return kinds, starts, ends
+
+def lex_buffer(descriptor, buffer, source, lines, workers, executor=None):
+    points = find_resync_points(buffer, len(buffer), workers * CHUNKS_PER_WORKER)
+    if len(source) == len(buffer):
+        char_bases = points
+    else:
+        char_bases = [0]
+        for start, end in zip(points, points[1:]):
+            char_bases.append(char_bases[-1] + len(bytes(buffer[start:end]).decode('utf-8')))
+    chunks = list(zip(char_bases, char_bases[1:]))
+    arguments = ([descriptor] * len(chunks), points[:-1], points[1:], char_bases[:-1])
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lex_chunk, *arguments))
+    else:
+        results = list(executor.map(lex_chunk, *arguments))
+    return stitch(source, lines, chunks, results, *offset_columns(len(buffer)))
+
+def lex_parallel(source_code, workers=None, positions=False, executor=None):
+    workers = workers or os.cpu_count() or 1
+    data = source_code.encode('utf-8')
+    if workers == 1 or len(data) < 2 * MINIMUM_CHUNK_BYTES:
+        return lex_offsets(source_code, positions=positions)
+    lines = LineIndex(source_code)
+    memory = shared_memory.SharedMemory(create=True, size=len(data))
+    try:
+        memory.buf[:len(data)] = data
+        columns = lex_buffer(('shared_memory', memory.name, len(data)), data, source_code, lines, workers, executor)
+    finally:
+        memory.close()
+        memory.unlink()
+    return TokenStream(source_code, *columns, positions, lines)
+
+def lex_file_parallel(file_path, workers=None, positions=False, executor=None):
+    workers = workers or os.cpu_count() or 1
+    descriptor = ('file', file_path, os.path.getsize(file_path))
+    with open_buffer(descriptor) as buffer:
+        source_code = bytes(buffer).decode('utf-8')
+        if workers == 1 or len(buffer) < 2 * MINIMUM_CHUNK_BYTES:
+            return lex_offsets(source_code, positions=positions)
+        lines = LineIndex(source_code)
+        columns = lex_buffer(descriptor, buffer, source_code, lines, workers, executor)
+    return TokenStream(source_code, *columns, positions, lines)
+
+#=================================================================
+
+def main(argv=None):
+    import argparse
+    import time
+
+    arg_parser = argparse.ArgumentParser(description="Lex one large source file with a pool of processes.")
+    arg_parser.add_argument('file')
+    arg_parser.add_argument('--workers', type=int, help="lexing processes (default: CPU count)")
+    arg_parser.add_argument('--check', action='store_true', help="compare against sequential lexing")
+    args = arg_parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        tokens = lex_file_parallel(args.file, args.workers)
+    except SyntaxError as e:
+        print(format_syntax_error(e, args.file), file=sys.stderr)
+        return 1
+    print(f"{len(tokens)} tokens in {time.perf_counter() - start:.3f} s")
+    if args.check and tokens != lex_offsets(tokens.source):
+        print("parallel and sequential token streams differ", file=sys.stderr)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,98 @@
-from typing import List, Tuple
-from tokens_lexems import tokens
+import io
+from collections import deque
+from collections.abc import Iterable, Sequence
+from itertools import islice
+from types import GeneratorType
+
+from tokens_lexems import TokenStream, syntax_error
+
+STREAM_WINDOW = 256
+
+def token_text(token):
+    # the position of a token is reported by lineno and offset, not in the message
+    return "end of input" if token is None else f"{token[0]} {token[1]!r}"
+
+def run_nested(rule):
+    # drives a generator that yields the generators of its nested rules and receives their results, so
+    # nesting costs heap rather than Python stack; an exception is thrown into the waiting generator as a
+    # call would raise it there
+    if type(rule) is not GeneratorType:
+        return rule
+    stack = [rule]
+    push, pop = stack.append, stack.pop
+    value = error = None
+    while True:
+        try:
+            if error is None:
+                request = stack[-1].send(value)
+            else:
+                thrown, error = error, None
+                request = stack[-1].throw(thrown)
+        except StopIteration as result:
+            pop()
+            if not stack:
+                return result.value
+            value = result.value
+            continue
+        except BaseException as e:
+            pop()
+            if not stack:
+                raise
+            error = e
+            continue
+        if type(request) is GeneratorType:
+            push(request)
+            value = None
+        else:
+            value = request
 
 class Parser:
-    def __init__(self, tokens: List[Tuple[str, str]]):
-        self.tokens = tokens
+    def __init__(self, tokens: Iterable[tuple], lookahead: int = 16):
+        if isinstance(tokens, TokenStream):
+            # tokens are materialized once, as the parser reaches them
+            self.tokens = tokens
+            self.stream = None
+            self.token_count = len(tokens)
+            self.window_start = 0
+            self.window = []
+            self.current_token = self.stream_token
+            self.advance = self.stream_advance
+        elif isinstance(tokens, Sequence):
+            self.tokens = tokens
+            self.stream = None
+        else:
+            self.tokens = deque()
+            self.stream = iter(tokens)
+        self.lookahead = lookahead
         self.index = 0
 
     def current_token(self):
-        return self.tokens[self.index] if self.index < len(self.tokens) else None
+        if self.stream is None:
+            return self.tokens[self.index] if self.index < len(self.tokens) else None
+        if not self.tokens:
+            self.tokens.extend(islice(self.stream, self.lookahead))
+        return self.tokens[0] if self.tokens else None
+
+    def stream_token(self):
+        offset = self.index - self.window_start
+        if 0 <= offset < len(self.window):
+            return self.window[offset]
+        if self.index >= self.token_count:
+            return None
+        self.window_start = self.index
+        self.window = self.tokens.materialize(self.index, self.index + STREAM_WINDOW)
+        return self.window[0]
+
+    def stream_advance(self):
+        if self.index < self.token_count:
+            self.index += 1
 
     def advance(self):
-        if self.index < len(self.tokens):
+        if self.stream is None:
+            if self.index < len(self.tokens):
+                self.index += 1
+        elif self.current_token() is not None:
+            self.tokens.popleft()
             self.index += 1
 
     def match(self, expected_type):
@@ -18,33 +100,69 @@ class Parser:
         if token and token[0] == expected_type:
             self.advance()
             return token
-        raise SyntaxError(f"Expected {expected_type}, but got {token}")
+        raise self.error(f"Expected {expected_type}, but got {token_text(token)}")
+
+    def peek(self):
+        token = self.current_token()
+        if token is None:
+            raise self.error("Unexpected end of input")
+        return token
+
+    def error(self, message):
+        if isinstance(self.tokens, TokenStream):
+            return syntax_error(message, self.tokens.lines, self.tokens.offset(self.index))
+        error = SyntaxError(message)
+        token = self.current_token()
+        if token is not None and len(token) > 2:
+            error.lineno = token[2]
+        return error
+
+    def make_node(self, name, children):
+        return ParseNode(name, children)
 
     def parse(self):
         return self.parse_program()
 
+    def run(self, rule):
+        return run_nested(rule)
+
     def parse_program(self):
+        return self.run(self.program_rule())
+
+    def parse_statement_list(self):
+        return self.run(self.statement_list_rule())
+
+    def parse_statement(self):
+        return self.run(self.statement_rule())
+
+    def program_rule(self):
         self.match('KEYWORD')  # 'begin'
-        self.match('CURLY_BRACKET')  # '{'
-        node = ParseNode("Program")
-        node.children = self.parse_statement_list()
-        self.match('CURLY_BRACKET')  # '}'
+        statements = yield self.block_rule()
         self.match('KEYWORD')  # 'end'
-        return node
+        return self.make_node("Program", statements)
 
-    def parse_statement_list(self):
+    def statement_list_rule(self):
         statements = []
         while self.current_token() and self.current_token()[0] != 'CURLY_BRACKET':
-            statements.append(self.parse_statement())
+            statement = self.statement_rule()
+            if type(statement) is GeneratorType:
+                statement = yield statement
+            statements.append(statement)
         return statements
 
-    def parse_statement(self):
-        token = self.current_token()
+    def block_rule(self):
+        self.match('CURLY_BRACKET')  # '{'
+        body = yield self.statement_list_rule()
+        self.match('CURLY_BRACKET')  # '}'
+        return body
+
+    def statement_rule(self):
+        token = self.peek()
         if token[0] == 'KEYWORD':
             if token[1] in ['int', 'float', 'string']:
                 return self.parse_declaration()
             elif token[1] == 'if':
-                return self.parse_conditional()
+                return self.conditional_rule()
             elif token[1] == 'print':
                 return self.parse_print_statement()
             elif token[1] in ['pass', 'noop']:
@@ -54,185 +172,292 @@ class Parser:
             elif token[1] in ['break', 'continue']:
                 return self.parse_loop_control()
             elif token[1] == 'while':
-                return self.parse_while()
+                return self.while_rule()
             elif token[1] == 'for':
-                return self.parse_for()
+                return self.for_rule()
         elif token[0] == 'IDENTIFIER':
             return self.parse_assignment()
-        raise SyntaxError(f"Unexpected token {token} in statement")
+        raise self.error(f"Unexpected token {token_text(token)} in statement")
 
     def parse_declaration(self):
         keyword = self.match('KEYWORD')
         identifier = self.match('IDENTIFIER')
-        if self.current_token()[0] == 'OPERATOR' and self.current_token()[1] == '=':
+        if self.peek()[0] == 'OPERATOR' and self.peek()[1] == '=':
             self.match('OPERATOR')
             value = self.parse_expression()
             self.match('SEMICOLON')
-            return ParseNode("Declaration", [keyword, identifier, value])
+            return self.make_node("Declaration", [keyword, identifier, value])
         else:
             self.match('SEMICOLON')
-            return ParseNode("Declaration", [keyword, identifier])
+            return self.make_node("Declaration", [keyword, identifier])
 
     def parse_assignment(self):
         identifier = self.match('IDENTIFIER')
-        if self.current_token()[0] == 'COMPOUND_OPERATOR':
+        if self.peek()[0] == 'COMPOUND_OPERATOR':
             operator = self.match('COMPOUND_OPERATOR')
         else:
             operator = self.match('OPERATOR')  # '='
         expression = self.parse_expression()
         self.match('SEMICOLON')
-        return ParseNode("Assignment", [identifier, operator, expression])
+        return self.make_node("Assignment", [identifier, operator, expression])
 
-    def parse_conditional(self):
+    def conditional_rule(self):
         self.match('KEYWORD')  # 'if'
         self.match('PAREN')
         condition = self.parse_boolean_expression()
         self.match('PAREN')
-        self.match('CURLY_BRACKET')
-        if_body = self.parse_statement_list()
-        self.match('CURLY_BRACKET')
+        if_body = yield self.block_rule()
         elif_statements = []
         while self.current_token() and self.current_token()[1] == 'elif':
             self.match('KEYWORD')  # 'elif'
             self.match('PAREN')
             elif_condition = self.parse_boolean_expression()
             self.match('PAREN')
-            self.match('CURLY_BRACKET')
-            elif_body = self.parse_statement_list()
-            self.match('CURLY_BRACKET')
-            elif_statements.append(ParseNode("ElifStatement", [elif_condition, elif_body]))
+            elif_body = yield self.block_rule()
+            elif_statements.append(self.make_node("ElifStatement", [elif_condition, self.make_node("Body", elif_body)]))
         else_body = None
         if self.current_token() and self.current_token()[1] == 'else':
             self.match('KEYWORD')  # 'else'
-            self.match('CURLY_BRACKET')
-            else_body = self.parse_statement_list()
-            self.match('CURLY_BRACKET')
-        return ParseNode("Conditional", [ParseNode("Condition", [condition]), ParseNode("IfBody", if_body)] + elif_statements + ([ParseNode("ElseBody", else_body)] if else_body else []))
+            else_body = yield self.block_rule()
+        return self.make_node("Conditional", [self.make_node("Condition", [condition]), self.make_node("IfBody", if_body)] + elif_statements + ([self.make_node("ElseBody", else_body)] if else_body else []))
 
     def parse_boolean_expression(self):
-        expr = self.parse_expression()
-        if self.current_token()[0] == 'COMPARISON_OPERATOR':
-            operator = self.match('COMPARISON_OPERATOR')
-            right = self.parse_expression()
-            expr = ParseNode("BooleanExpression", [expr, operator, right])
-        while self.current_token() and self.current_token()[1] in ['and', 'or']:
-            logical_op = self.match('KEYWORD')
-            right = self.parse_boolean_expression()
-            expr = ParseNode("LogicalExpression", [expr, logical_op, right])
+        operands = []
+        while True:
+            expr = self.parse_expression()
+            if self.peek()[0] == 'COMPARISON_OPERATOR':
+                operator = self.match('COMPARISON_OPERATOR')
+                right = self.parse_expression()
+                expr = self.make_node("BooleanExpression", [expr, operator, right])
+            if not (self.current_token() and self.current_token()[1] in ['and', 'or']):
+                break
+            operands.append((expr, self.match('KEYWORD')))
+        for left, logical_op in reversed(operands):
+            expr = self.make_node("LogicalExpression", [left, logical_op, expr])
         return expr
 
     def parse_print_statement(self):
         self.match('KEYWORD')  # 'print'
         self.match('PAREN')
-        if self.current_token()[0] == 'IDENTIFIER':
+        if self.peek()[0] == 'IDENTIFIER':
             content = self.match('IDENTIFIER')
-        elif self.current_token()[0] == 'STRING':
+        elif self.peek()[0] == 'STRING':
             content = self.match('STRING')
         else:
-            raise SyntaxError("Expected IDENTIFIER or STRING in print statement")
+            raise self.error("Expected IDENTIFIER or STRING in print statement")
         self.match('PAREN')
         self.match('SEMICOLON')
-        return ParseNode("PrintStatement", [content])
+        return self.make_node("PrintStatement", [content])
 
-    def parse_while(self):
+    def while_rule(self):
         self.match('KEYWORD')  # 'while'
         self.match('PAREN')
         condition = self.parse_boolean_expression()
         self.match('PAREN')
-        self.match('CURLY_BRACKET')
-        body = self.parse_statement_list()
-        self.match('CURLY_BRACKET')
-        return ParseNode("WhileLoop", [ParseNode("Condition", [condition]), ParseNode("Body", body)])
+        body = yield self.block_rule()
+        return self.make_node("WhileLoop", [self.make_node("Condition", [condition]), self.make_node("Body", body)])
 
-    def parse_for(self):
+    def for_rule(self):
         self.match('KEYWORD')  # 'for'
         identifier = self.match('IDENTIFIER')
         self.match('KEYWORD')  # 'in'
         target_list = self.parse_expression()
-        self.match('CURLY_BRACKET')
-        body = self.parse_statement_list()
-        self.match('CURLY_BRACKET')
-        return ParseNode("ForLoop", [identifier, target_list, ParseNode("Body", body)])
+        body = yield self.block_rule()
+        return self.make_node("ForLoop", [identifier, target_list, self.make_node("Body", body)])
 
     def parse_pass(self):
         keyword = self.match('KEYWORD')  # 'pass' or 'noop'
         self.match('SEMICOLON')
-        return ParseNode("Pass", [keyword])
+        return self.make_node("Pass", [keyword])
 
     def parse_return(self):
         self.match('KEYWORD')  # 'return'
-        if self.current_token()[0] != 'SEMICOLON':
+        if self.peek()[0] != 'SEMICOLON':
             expr_list = self.parse_expression()
         else:
             expr_list = None
         self.match('SEMICOLON')
-        return ParseNode("Return", [expr_list])
+        return self.make_node("Return", [expr_list])
 
     def parse_loop_control(self):
         keyword = self.match('KEYWORD')  # 'break' or 'continue'
         self.match('SEMICOLON')
-        return ParseNode("LoopControl", [keyword])
+        return self.make_node("LoopControl", [keyword])
 
     def parse_expression(self):
-        term = self.parse_term()
-        while self.current_token() and self.current_token()[0] in ['OPERATOR', 'COMPARISON_OPERATOR']:
-            operator = self.match(self.current_token()[0])
-            right = self.parse_term()
-            term = ParseNode("BinaryExpression", [term, operator, right])
-        return term
-
-    def parse_term(self):
-        if self.current_token()[0] == 'IDENTIFIER':
-            return ParseNode("Identifier", [self.match('IDENTIFIER')])
-        elif self.current_token()[0] in ['NUMBER', 'FLOAT']:
-            return ParseNode("Number", [self.match(self.current_token()[0])])
-        elif self.current_token()[0] == 'STRING':
-            return ParseNode("String", [self.match('STRING')])
-        elif self.current_token()[0] == 'PAREN' and self.current_token()[1] == '(':
-            self.match('PAREN')
-            expr = self.parse_expression()
-            self.match('PAREN')
-            return expr
-        elif self.current_token()[0] == 'SQUARE_BRACKET' and self.current_token()[1] == '[':
-            return self.parse_list()
-        raise SyntaxError(f"Unexpected token {self.current_token()} in term")
-
-    def parse_list(self):
-        self.match('SQUARE_BRACKET')  # '['
-        elements = []
-        if self.current_token()[0] != 'SQUARE_BRACKET':
-            elements.append(self.parse_expression())
-            while self.current_token()[0] == 'COMMA':
-                self.match('COMMA')
-                elements.append(self.parse_expression())
-        self.match('SQUARE_BRACKET')  # ']'
-        return ParseNode("List", elements)
+        # frames alternate [left, operator] expression frames with their enclosing
+        # None (parenthesis) or element list (list literal) containers
+        current_token, peek, match, make_node = self.current_token, self.peek, self.match, self.make_node
+        frames = [[None, None]]
+        while True:
+            term = self.parse_simple_term()
+            if term is None:
+                token = peek()
+                if token[0] == 'PAREN' and token[1] == '(':
+                    match('PAREN')
+                    frames.append(None)
+                    frames.append([None, None])
+                    continue
+                elif token[0] == 'SQUARE_BRACKET' and token[1] == '[':
+                    match('SQUARE_BRACKET')  # '['
+                    if peek()[1] != ']':
+                        frames.append([])
+                        frames.append([None, None])
+                        continue
+                    match('SQUARE_BRACKET')  # ']'
+                    term = make_node("List", [])
+                else:
+                    raise self.error(f"Unexpected token {token_text(token)} in term")
+            while True:
+                frame = frames[-1]
+                frame[0] = term if frame[1] is None else make_node("BinaryExpression", [frame[0], frame[1], term])
+                token = current_token()
+                if token and token[0] in ['OPERATOR', 'COMPARISON_OPERATOR']:
+                    frame[1] = match(token[0])
+                    break
+                frames.pop()
+                term = frame[0]
+                if not frames:
+                    return term
+                container = frames[-1]
+                if container is None:
+                    match('PAREN')
+                    frames.pop()
+                    continue
+                container.append(term)
+                if peek()[0] == 'COMMA':
+                    match('COMMA')
+                    frames.append([None, None])
+                    break
+                match('SQUARE_BRACKET')  # ']'
+                frames.pop()
+                term = make_node("List", container)
+
+    def parse_simple_term(self):
+        kind = self.peek()[0]
+        if kind == 'IDENTIFIER':
+            return self.make_node("Identifier", [self.match('IDENTIFIER')])
+        elif kind in ['NUMBER', 'FLOAT']:
+            return self.make_node("Number", [self.match(kind)])
+        elif kind == 'STRING':
+            return self.make_node("String", [self.match('STRING')])
+        return None
 
 class ParseNode:
+    __slots__ = ('name', 'children')
+
     def __init__(self, name, children=None):
         self.name = name
         self.children = children or []
 
-    def pretty_print(self, prefix="", is_last=True):
-        result = prefix + ("└── " if is_last else "├── ") + self.name + "\n"
-        new_prefix = prefix + ("    " if is_last else "│   ")
-        for i, child in enumerate(self.children):
-            if isinstance(child, ParseNode):
-                result += child.pretty_print(new_prefix, is_last=(i == len(self.children) - 1))
-            else:
-                result += new_prefix + ("└── " if i == len(self.children) - 1 else "├── ") + str(child) + "\n"
-        return result
+    def pretty_print(self, prefix="", is_last=True, positions=True):
+        buffer = io.StringIO()
+        self.write(buffer, prefix, is_last, positions)
+        return buffer.getvalue()
+
+    def write(self, file, prefix="", is_last=True, positions=True):
+        write = file.write
+        stack = [(self, prefix, is_last)]
+        pop, push = stack.pop, stack.append
+        while stack:
+            item, prefix, is_last = pop()
+            if not isinstance(item, ParseNode):
+                write(f"{prefix}{'└── ' if is_last else '├── '}{item if positions or item is None else item[:2]}\n")
+                continue
+            write(f"{prefix}{'└── ' if is_last else '├── '}{item.name}\n")
+            children = item.children
+            if children:
+                child_prefix = prefix + ("    " if is_last else "│   ")
+                push((children[-1], child_prefix, True))
+                for child in reversed(children[:-1]):
+                    push((child, child_prefix, False))
 
     def __str__(self):
         return self.pretty_print()
-    
+
+def matching_braces(tokens):
+    if isinstance(tokens, TokenStream):
+        return tokens.matching_braces()
+    braces, opened = {}, []
+    for index, token in enumerate(tokens):
+        if token[0] == 'CURLY_BRACKET':
+            if token[1] == '{':
+                opened.append(index)
+            elif opened:
+                braces[opened.pop()] = index
+    return braces
+
+class LazyBody(ParseNode):
+    # a block body that is parsed when its statements are first asked for; syntax errors
+    # inside it surface then
+    __slots__ = ('parser', 'start', 'end', 'statements')
+
+    def __init__(self, name, parser, start, end):
+        self.name = name
+        self.parser = parser
+        self.start = start
+        self.end = end
+        self.statements = None
+
+    @property
+    def children(self):
+        if self.statements is None:
+            self.statements = self.parser.parse_body(self.start, self.end)
+        return self.statements
+
+    @children.setter
+    def children(self, statements):
+        self.statements = statements
+
+    def is_parsed(self):
+        return self.statements is not None
+
+class LazyParser(Parser):
+    # the program's own statements are parsed; if, while and for bodies are skipped by brace matching
+    def __init__(self, tokens, lookahead=16, braces=None):
+        if not isinstance(tokens, Sequence):
+            tokens = list(tokens)
+        super().__init__(tokens, lookahead)
+        self.braces = matching_braces(tokens) if braces is None else braces
+
+    def program_rule(self):
+        self.match('KEYWORD')  # 'begin'
+        statements = yield Parser.block_rule(self)
+        self.match('KEYWORD')  # 'end'
+        return self.make_node("Program", statements)
+
+    def block_rule(self):
+        start = self.index
+        end = self.braces.get(start)
+        if end is None or self.current_token()[1] != '{':
+            return Parser.block_rule(self)
+        self.index = end + 1
+        # an empty body stays a plain list so an empty else is still dropped
+        return LazyBody(None, self, start, end) if end > start + 1 else []
+
+    def make_node(self, name, children):
+        if type(children) is LazyBody:
+            children.name = name
+            return children
+        return ParseNode(name, children)
+
+    def parse_body(self, start, end):
+        parser = LazyParser(self.tokens, self.lookahead, self.braces)
+        parser.index = start
+        statements = parser.run(Parser.block_rule(parser))
+        if parser.index != end + 1:
+            raise parser.error(f"Unexpected token {token_text(parser.current_token())} in block")
+        return statements
+
 #=================================================================
 
 if __name__ == "__main__":
-    parser = Parser(tokens)
+    import sys
+    from tokens_lexems import lex, read_source_code
     try:
+        parser = Parser(lex(read_source_code('source_code.txt')))
         parse_tree = parser.parse()
         print("Parse Tree:")
-        print(parse_tree)
+        parse_tree.write(sys.stdout)
     except SyntaxError as e:
         print(f"Syntax Error: {e}")
\ No newline at end of file
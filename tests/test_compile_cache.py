@@ -0,0 +1,31 @@
+import os
+import threading
+
+from compile_cache import CompilationCache, compile_cached
+from compiler import DEFAULT_PHASES, compile
+from tokens_lexems import read_source_code
+
+def test_threads_writing_one_key_do_not_share_a_temporary_file(tmp_path):
+    cache = CompilationCache(str(tmp_path))
+    source = read_source_code('source_code.txt')
+    key = cache.key(source)
+    result = compile(source)
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def write():
+        barrier.wait()
+        try:
+            for _ in range(50):
+                cache.put(key, result)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert os.listdir(tmp_path) == [f"{key}.bin"]
+    assert compile_cached(source, DEFAULT_PHASES, cache).symbol_table.counter == result.symbol_table.counter
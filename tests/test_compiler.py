@@ -0,0 +1,17 @@
+from compiler import compile, print_result
+
+def test_printed_tree_shows_a_bare_return(capsys):
+    result = compile("begin{\nint x = 1;\nreturn;\n}end\n", ('parse',))
+    print_result(result, ('parse',))
+    assert capsys.readouterr().out == (
+        "Parse Tree:\n"
+        "└── Program\n"
+        "    ├── Declaration\n"
+        "    │   ├── ('KEYWORD', 'int')\n"
+        "    │   ├── ('IDENTIFIER', 'x')\n"
+        "    │   └── Number\n"
+        "    │       └── ('NUMBER', '1')\n"
+        "    └── Return\n"
+        "        └── None\n"
+        "\n"
+    )
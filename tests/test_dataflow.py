@@ -0,0 +1,16 @@
+from dataflow import build_flow_graph, liveness
+from parser import Parser
+from tokens_lexems import lex_offsets
+
+def parse(source_code):
+    return Parser(lex_offsets(source_code, positions=True)).parse()
+
+def test_builds_deeply_nested_loops():
+    depth = 1000
+    source_code = "begin{\nint n = 0;\n" + "while (n < 1) {\n" * depth + "n += 1;\n" + "}\n" * depth + "return n;\n}end\n"
+    graph = build_flow_graph(parse(source_code))
+    assert graph.names.count('WhileLoop') == depth
+    # n is live into every loop header
+    live_in, _ = liveness(graph)
+    row = graph.symbol_table.rows['n']
+    assert all(live_in[node] >> row & 1 for node, name in enumerate(graph.names) if name == 'WhileLoop')
@@ -0,0 +1,25 @@
+from incremental import IncrementalDocument
+from tokens_lexems import read_source_code
+
+def matches_fresh_build(document):
+    fresh = IncrementalDocument(document.source)
+    if str(document.error) != str(fresh.error) or document.tokens != fresh.tokens:
+        return False
+    # after an error the document keeps its last good symbols, which a fresh build never had
+    return fresh.error is not None or list(document.symbol_table.records()) == list(fresh.symbol_table.records())
+
+def test_edit_removing_the_closing_brace_after_trailing_tokens():
+    document = IncrementalDocument(read_source_code('source_code.txt'))
+    document.apply_edit(216, 216, ';')
+    error = document.apply_edit(208, 213, 'x')
+    assert str(error) == "Expected CURLY_BRACKET, but got end of input"
+    assert matches_fresh_build(document)
+
+def test_edits_match_a_fresh_build():
+    body = "int total = 0;\nwhile (total < 5) {\n    total += 1;\n}\nprint(total);\n"
+    document = IncrementalDocument("begin{\n" + body + "}end\n")
+    for old, new in (("print(total);", "int extra = 3;\nprint(total);"), ("total < 5", "total < 5 + extra"),
+                     ("}end", "}"), ("print(total);\n}", "print(total);\n}end ;"), ("end ;", "end")):
+        start = document.source.index(old)
+        document.apply_edit(start, start + len(old), new)
+        assert matches_fresh_build(document), (old, new)
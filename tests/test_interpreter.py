@@ -0,0 +1,55 @@
+import bytecode
+import interpreter
+import ir
+import transpiler
+from interpreter import NameResolver
+from parser import Parser
+from tokens_lexems import lex_offsets
+
+def parse(source_code):
+    return Parser(lex_offsets(source_code, positions=True)).parse()
+
+def outcome(run, source_code):
+    output = []
+    try:
+        return ('returned', run(source_code, output.append)), output
+    except Exception as e:
+        return ('raised', type(e).__name__), output
+
+BACKENDS = {
+    'ast': interpreter.run_source,
+    'bytecode': bytecode.run_source,
+    'ir': lambda source_code, output: ir.run(ir.compile_source(source_code)[0], output),
+    'transpiler': transpiler.run_source,
+}
+
+def test_initializer_resolves_to_the_declared_symbol():
+    tree = parse("begin{\nint x = 5;\nif (x > 1) {\nint x = x;\n}\n}end\n")
+    keys = NameResolver().resolve(tree)
+    inner = tree.children[1].children[1].children[0]
+    assert keys[id(inner.children[1])] == keys[id(inner.children[2].children[0])] == 'x#1'
+
+def test_backends_agree_on_self_referencing_initializers():
+    for source_code in ("begin{\nint x = 3;\nif (1 < 2) { int x = x; print(x); }\nprint(x);\n}end\n",
+                        "begin{\nint x = 1;\nint x = x + 1;\nprint(x);\n}end\n",
+                        "begin{\nint x = x + 1;\n}end\n"):
+        expected = outcome(BACKENDS['ast'], source_code)
+        for name, run in BACKENDS.items():
+            assert outcome(run, source_code) == expected, name
+
+def nested_loops(depth):
+    return "begin{\nint n = 0;\n" + "while (n < 1) {\n" * depth + "n += 1;\n" + "}\n" * depth + "return n;\n}end\n"
+
+def test_deeply_nested_blocks_run():
+    source_code = nested_loops(1000)
+    for name, run in BACKENDS.items():
+        if name in ('ast', 'bytecode', 'ir'):
+            assert outcome(run, source_code) == (('returned', 1), []), name
+
+def test_deep_expressions_evaluate():
+    for source_code, expected in (("begin{\nreturn 0" + " + 1" * 3000 + ";\n}end\n", 3000),
+                                  ("begin{\nreturn " + "1 + (" * 1000 + "1" + ")" * 1000 + ";\n}end\n", 1001),
+                                  ("begin{\nint n = 1;\nif (" + " and ".join(["n > 0"] * 1000) + ") { return 2; }\n}end\n", 2),
+                                  ("begin{\nint x = " + "[" * 1000 + "]" * 1000 + ";\nreturn 1;\n}end\n", 1)):
+        for name in ('ast', 'bytecode', 'ir'):
+            assert outcome(BACKENDS[name], source_code) == (('returned', expected), []), name
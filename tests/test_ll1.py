@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+from ll1 import LL1Parser, load_table
+from tokens_lexems import lex
+
+@pytest.fixture(scope='module')
+def ll1_parser():
+    return LL1Parser(load_table(cache_directory=None))
+
+def test_errors_name_grammar_nonterminals(ll1_parser):
+    with pytest.raises(SyntaxError) as error:
+        ll1_parser.parse(lex("begin{ int x = 1 }end"))
+    assert str(error.value) == "Unexpected token CURLY_BRACKET '}' while parsing Expression"
+
+def test_errors_never_show_synthetic_nonterminals(ll1_parser):
+    for source in ("begin{ int x = 1 + ; }end", "begin{ if (x > 1) { pass; } elif }end", "begin{ print(x) }end"):
+        with pytest.raises(SyntaxError) as error:
+            ll1_parser.parse(lex(source))
+        assert "'1" not in str(error.value) and "'2" not in str(error.value)
+
+def test_table_cache_round_trips(tmp_path):
+    built = load_table(cache_directory=str(tmp_path))
+    assert [name for name in os.listdir(tmp_path) if not name.endswith('.json')] == []
+    cached = load_table(cache_directory=str(tmp_path))
+    assert cached.table == built.table and cached.grammar.symbols == built.grammar.symbols
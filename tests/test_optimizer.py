@@ -0,0 +1,13 @@
+from compiler import compile
+from interpreter import TreeInterpreter
+
+def nested_loops(depth):
+    return "begin{\nint n = 0;\n" + "while (n < 1) {\n" * depth + "n += 1;\n" + "}\n" * depth + "return n;\n}end\n"
+
+def test_optimizes_deeply_nested_blocks_and_expressions():
+    for source_code in (nested_loops(1000),
+                        "begin{\nint n = 1;\nif (" + " and ".join(["n > 0"] * 1000) + ") { return 2; }\n}end\n",
+                        "begin{\nint x = 2;\nreturn " + "x + (" * 1000 + "1" + ")" * 1000 + ";\n}end\n"):
+        unoptimized = TreeInterpreter(print).run(compile(source_code, ('parse',)).tree)
+        result = compile(source_code, ('parse', 'optimize', 'symbols'))
+        assert TreeInterpreter(print).run(result.tree) == unoptimized
@@ -0,0 +1,25 @@
+import io
+
+import tokens_lexems
+from tokens_lexems import lex, lex_stream, read_source_code
+
+class CountingRegex:
+    def __init__(self, regex):
+        self.regex = regex
+        self.scanned = 0
+
+    def finditer(self, string, *args):
+        self.scanned += len(string)
+        return self.regex.finditer(string, *args)
+
+def test_stream_matches_lex_across_small_chunks():
+    source = read_source_code('source_code.txt')
+    for chunk_size in (1, 3, 7, 64):
+        assert list(lex_stream(io.StringIO(source), chunk_size, positions=True)) == lex(source, positions=True)
+
+def test_stream_scans_a_long_split_token_in_linear_time(monkeypatch):
+    source = 'begin{\nstring s = "' + 'a' * 100000 + '";\n# ' + 'b' * 100000 + '\n}end\n'
+    regex = CountingRegex(tokens_lexems.TOKEN_REGEX)
+    monkeypatch.setattr(tokens_lexems, 'TOKEN_REGEX', regex)
+    assert list(lex_stream(io.StringIO(source), 16)) == lex(source)
+    assert regex.scanned < 4 * len(source)
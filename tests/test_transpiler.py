@@ -0,0 +1,23 @@
+import pytest
+
+from transpiler import MAX_NESTED_LOOPS, CodeCache, run_source
+
+def nested_loops(depth):
+    return "begin{\nint n = 0;\n" + "while (n < 1) {\n" * depth + "n += 1;\n" + "}\n" * depth + "return n;\n}end\n"
+
+def test_loops_nested_up_to_the_limit_run():
+    assert run_source(nested_loops(MAX_NESTED_LOOPS), cache=CodeCache(0)) == 1
+
+def test_loops_nested_past_the_limit_are_a_syntax_error():
+    with pytest.raises(SyntaxError, match="Loops are nested") as error:
+        run_source(nested_loops(MAX_NESTED_LOOPS + 1), cache=CodeCache(0))
+    assert error.value.lineno == MAX_NESTED_LOOPS + 3
+
+def test_deep_expressions_are_a_syntax_error():
+    assert run_source("begin{\nreturn 0" + " + 1" * 100 + ";\n}end\n", cache=CodeCache(0)) == 100
+    for source_code in ("begin{\nreturn 0" + " + 1" * 1000 + ";\n}end\n",
+                        "begin{\nreturn " + "1 + (" * 1000 + "1" + ")" * 1000 + ";\n}end\n",
+                        "begin{\nint x = " + "[" * 1000 + "]" * 1000 + ";\n}end\n"):
+        with pytest.raises(SyntaxError, match="nested more than") as error:
+            run_source(source_code, cache=CodeCache(0))
+        assert error.value.lineno == 2
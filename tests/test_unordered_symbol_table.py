@@ -0,0 +1,12 @@
+from unordered_symbol_table import generate_symbol_table
+
+def symbols(source_code):
+    return [(name, data_type, list(references), scope)
+            for _, _, name, _, data_type, _, _, _, references, _, scope in generate_symbol_table(source_code).records()]
+
+def test_initializer_reads_the_declared_symbol():
+    assert symbols("begin{\nint x = x + 1;\n}end\n") == [('x', 'int', [], 0)]
+
+def test_initializer_reference_does_not_bind_an_outer_symbol():
+    source_code = "begin{\nint x = 5;\nif (x > 1) {\nint x =\nx + 1;\n}\n}end\n"
+    assert symbols(source_code) == [('x', 'int', [3], 0), ('x', 'int', [5], 1)]
@@ -1,3 +1,12 @@
+import bisect
+import codecs
+import mmap
+import os
+import re
+from array import array
+from collections.abc import Sequence
+from itertools import accumulate
+
 def is_digit(char):
     return '0' <= char <= '9'
 
@@ -38,112 +47,300 @@ def is_keyword(string):
 def is_curly_brace(char):
     return char in '{}'
 
-def lex(source_code):
-    tokens = []  
-    i = 0
-    
-    while i < len(source_code):
-        char = source_code[i]
-        print(f"Processing character '{char}' at index {i}")
-        
-        if is_whitespace(char):
-            i += 1
-            continue
-
-        if is_digit(char) or (char == '.' and i + 1 < len(source_code) and is_digit(source_code[i + 1])):
-            num = char
-            is_float = char == '.' 
-            while i + 1 < len(source_code) and (is_digit(source_code[i + 1]) or (source_code[i + 1] == '.' and not is_float)):
-                if source_code[i + 1] == '.':
-                    is_float = True
-                num += source_code[i + 1]
-                i += 1
-            tokens.append(('FLOAT' if is_float else 'NUMBER', num))
-            i += 1
-            continue
-
-        if is_square_bracket(char):
-            tokens.append(('SQUARE_BRACKET', char))
-            i += 1
-            continue
-
-        if is_curly_brace(char):
-            tokens.append(('CURLY_BRACKET', char))
-            i += 1
+TOKEN_SPECIFICATION = [
+    ('WHITESPACE', r'[ \t\n\r]+'),
+    ('FLOAT', r'[0-9]+\.[0-9]*|\.[0-9]+'),
+    ('NUMBER', r'[0-9]+'),
+    ('SQUARE_BRACKET', r'[\[\]]'),
+    ('CURLY_BRACKET', r'[{}]'),
+    ('COMPARISON_OPERATOR', r'[=!<>]=|[<>]'),
+    ('COMPOUND_OPERATOR', r'[-+*/]='),
+    ('OPERATOR', r'[-+*/=]'),
+    ('COMMA', r','),
+    ('SEMICOLON', r';'),
+    ('STRING', r'["\'][^"\']*["\']?'),
+    ('PAREN', r'[()]'),
+    ('COLON', r':'),
+    ('IDENTIFIER', r'[^\W\d_][^\W_]*'),
+    ('COMMENT', r'#[^\n]*'),
+    ('MISMATCH', r'.'),
+]
+
+TOKEN_REGEX = re.compile('|'.join(f'(?P<{kind}>{pattern})' for kind, pattern in TOKEN_SPECIFICATION), re.DOTALL)
+
+SKIPPED_KINDS = {'WHITESPACE', 'COMMENT'}
+
+def scan_tokens(matches, debug=False, offset=0, positions=False, line=1):
+    keywords = KEYWORDS
+    skipped = SKIPPED_KINDS
+    last = 0
+    for match in matches:
+        kind = match.lastgroup
+        if kind in skipped:
             continue
-
-        if i + 1 < len(source_code) and is_comparison_operator(source_code[i:i+2]):
-            tokens.append(('COMPARISON_OPERATOR', source_code[i:i+2]))
-            i += 2
+        value = match.group()
+        if kind == 'IDENTIFIER':
+            # \w also admits numeric characters such as '²' that str.isalpha() rejects
+            if not value[0].isalpha():
+                kind = 'MISMATCH'
+                value = value[0]
+            elif value in keywords:
+                kind = 'KEYWORD'
+        if kind == 'MISMATCH':
+            if debug:
+                print(f"Error at index {offset + match.start()}: '{value}'")
+            raise SyntaxError(f'Unexpected character: {value}')
+        if debug:
+            print(f"Token {kind} {value!r} at index {offset + match.start()}")
+        if positions:
+            start = match.start()
+            line += match.string.count('\n', last, start)
+            last = start
+            yield (kind, value, line)
+        else:
+            yield (kind, value)
+
+def lex(source_code, debug=False, positions=False):
+    return list(scan_tokens(TOKEN_REGEX.finditer(source_code), debug, positions=positions))
+
+# kind codes of the offset token stream: TOKEN_SPECIFICATION order, then KEYWORD
+KIND_NAMES = tuple(kind for kind, _ in TOKEN_SPECIFICATION) + ('KEYWORD',)
+KIND_CODES = {kind: code for code, kind in enumerate(KIND_NAMES)}
+NAME_CODES = {KIND_CODES['IDENTIFIER'], KIND_CODES['KEYWORD']}
+
+class LineIndex:
+    # offsets where each line starts, built on the first lookup
+    def __init__(self, source):
+        self.source = source
+        self._starts = None
+
+    @property
+    def starts(self):
+        if self._starts is None:
+            lines = self.source.split('\n')
+            lines.pop()
+            self._starts = array('I' if len(self.source) < 1 << 32 else 'Q', [0])
+            self._starts.extend(accumulate(map((1).__add__, map(len, lines))))
+        return self._starts
+
+    def __len__(self):
+        return len(self.starts)
+
+    def line(self, offset):
+        return bisect.bisect_right(self.starts, offset)
+
+    def position(self, offset):
+        line = bisect.bisect_right(self.starts, offset)
+        return line, offset - self.starts[line - 1] + 1
+
+    def line_span(self, line):
+        starts = self.starts
+        end = starts[line] - 1 if line < len(starts) else len(self.source)
+        return starts[line - 1], end
+
+    def line_text(self, line):
+        start, end = self.line_span(line)
+        return self.source[start:end]
+
+def syntax_error(message, lines=None, offset=0):
+    error = SyntaxError(message)
+    if lines is not None:
+        error.lineno, error.offset = lines.position(offset)
+        error.text = lines.line_text(error.lineno)
+    return error
+
+def format_syntax_error(error, label):
+    if not error.lineno:
+        return f"{label}: Syntax Error: {error.msg}"
+    location = f"{label}:{error.lineno}:{error.offset}" if error.offset else f"{label}:{error.lineno}"
+    message = f"{location}: Syntax Error: {error.msg}"
+    if error.text is None:
+        return message
+    # keep tabs so the caret lines up under the offending column
+    indent = ''.join(char if char == '\t' else ' ' for char in error.text[:error.offset - 1])
+    return f"{message}\n    {error.text}\n    {indent}^"
+
+class TokenStream(Sequence):
+    def __init__(self, source, kinds, starts, ends, positions=False, lines=None):
+        self.source = source
+        self.kinds = kinds
+        self.starts = starts
+        self.ends = ends
+        self.positions = positions
+        self.lines = lines or LineIndex(source)
+        self.names = {keyword: keyword for keyword in KEYWORDS}
+        self.braces = None
+        self.current_line, self.line_low, self.line_high = 0, 0, -1
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.token(position) for position in range(*index.indices(len(self.kinds)))]
+        if index < 0:
+            index += len(self.kinds)
+        return self.token(index)
+
+    def __iter__(self):
+        for start in range(0, len(self.kinds), 1024):
+            yield from self.materialize(start, start + 1024)
+
+    def __eq__(self, other):
+        if isinstance(other, TokenStream):
+            return (self.source == other.source and self.positions == other.positions and self.kinds == other.kinds
+                    and self.starts == other.starts and self.ends == other.ends)
+        return isinstance(other, Sequence) and list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def token(self, index):
+        return self.materialize(index, index + 1)[0]
+
+    def materialize(self, start, stop):
+        source, names, kind_names, name_codes = self.source, self.names, KIND_NAMES, NAME_CODES
+        spans = zip(self.kinds[start:stop], self.starts[start:stop], self.ends[start:stop])
+        if not self.positions:
+            return [(kind_names[code], names.setdefault(text, text) if code in name_codes else text)
+                    for code, text in ((code, source[begin:end]) for code, begin, end in spans)]
+        tokens = []
+        append = tokens.append
+        line_starts = self.lines.starts
+        # tokens are mostly read in order, so the previous token's line is usually still right
+        line, low, high = self.current_line, self.line_low, self.line_high
+        for code, begin, end in spans:
+            text = source[begin:end]
+            if code in name_codes:
+                text = names.setdefault(text, text)
+            if not low <= begin < high:
+                line = bisect.bisect_right(line_starts, begin)
+                low = line_starts[line - 1]
+                high = line_starts[line] if line < len(line_starts) else len(source) + 1
+            append((kind_names[code], text, line))
+        self.current_line, self.line_low, self.line_high = line, low, high
+        return tokens
+
+    def kind(self, index):
+        return KIND_NAMES[self.kinds[index]]
+
+    def lexeme(self, index):
+        text = self.source[self.starts[index]:self.ends[index]]
+        return self.names.setdefault(text, text) if self.kinds[index] in NAME_CODES else text
+
+    def offset(self, index):
+        return self.starts[index] if index < len(self.starts) else len(self.source)
+
+    def line(self, index):
+        return self.lines.line(self.offset(index))
+
+    def position(self, index):
+        return self.lines.position(self.offset(index))
+
+    def matching_braces(self):
+        # token index of the '}' closing each '{', found by searching the kind column
+        if self.braces is None:
+            kinds, source, starts = self.kinds.tobytes(), self.source, self.starts
+            code = bytes([KIND_CODES['CURLY_BRACKET']])
+            braces, opened = {}, []
+            index = kinds.find(code)
+            while index >= 0:
+                if source[starts[index]] == '{':
+                    opened.append(index)
+                elif opened:
+                    braces[opened.pop()] = index
+                index = kinds.find(code, index + 1)
+            self.braces = braces
+        return self.braces
+
+    def nbytes(self):
+        return sum(len(column) * column.itemsize for column in (self.kinds, self.starts, self.ends))
+
+def offset_columns(length):
+    offset_type = 'I' if length < 1 << 32 else 'Q'
+    return array('B'), array(offset_type), array(offset_type)
+
+def scan_offsets(source_code, kinds, starts, ends, position=0, limit=None, base=0, debug=False, lines=None):
+    # appends the tokens that start before limit and returns where the next token starts
+    limit = len(source_code) if limit is None else limit
+    add_kind, add_start, add_end = kinds.append, starts.append, ends.append
+    # group numbers follow TOKEN_SPECIFICATION, so lastindex - 1 is the kind code
+    whitespace, comment = KIND_CODES['WHITESPACE'], KIND_CODES['COMMENT']
+    identifier, keyword, mismatch = KIND_CODES['IDENTIFIER'], KIND_CODES['KEYWORD'], KIND_CODES['MISMATCH']
+    keywords = KEYWORDS
+    for match in TOKEN_REGEX.finditer(source_code, position):
+        code = match.lastindex - 1
+        if code == whitespace or code == comment:
             continue
-        elif is_comparison_operator(char):
-            tokens.append(('COMPARISON_OPERATOR', char))
-            i += 1
+        start, end = match.span()
+        if start >= limit:
+            return start
+        if code == identifier:
+            value = source_code[start:end]
+            if not value[0].isalpha():
+                code = mismatch
+                end = start + 1
+            elif value in keywords:
+                code = keyword
+        if code == mismatch:
+            if debug:
+                print(f"Error at index {base + start}: '{source_code[start:end]}'")
+            raise syntax_error(f'Unexpected character: {source_code[start:end]}', lines, base + start)
+        if debug:
+            print(f"Token {KIND_NAMES[code]} {source_code[start:end]!r} at index {base + start}")
+        add_kind(code)
+        add_start(base + start)
+        add_end(base + end)
+    return len(source_code)
+
+def lex_offsets(source_code, debug=False, positions=False):
+    kinds, starts, ends = offset_columns(len(source_code))
+    lines = LineIndex(source_code)
+    scan_offsets(source_code, kinds, starts, ends, debug=debug, lines=lines)
+    return TokenStream(source_code, kinds, starts, ends, positions, lines)
+
+def lex_stream(source, chunk_size=65536, debug=False, positions=False):
+    decoder = None
+    pieces = []
+    size = 0
+    pending = 0
+    offset = 0
+    line = 1
+    while True:
+        chunk = source.read(chunk_size)
+        final = not chunk
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk, final)
+        pieces.append(chunk)
+        size += len(chunk)
+        # the carried tail is one unfinished token; rescanning it only once the buffer has doubled
+        # keeps a token split across many chunks linear
+        if not final and size < 2 * pending:
             continue
-
-        if i + 1 < len(source_code) and source_code[i:i+2] in ['+=', '-=', '*=', '/=']:
-            tokens.append(('COMPOUND_OPERATOR', source_code[i:i+2]))
-            i += 2
-            continue
-
-        if is_operator(char):
-            tokens.append(('OPERATOR', char))
-            i += 1
-            continue
-
-        if is_comma(char):
-            tokens.append(('COMMA', char))
-            i += 1
-            continue
-
-        if char == ';':
-            tokens.append(('SEMICOLON', char)) 
-            i += 1
-            continue
-
-        if is_qoutes(char):
-            string_value = char 
-            i += 1
-            while i < len(source_code) and not is_qoutes(source_code[i]):
-                string_value += source_code[i]
-                i += 1
-            if i < len(source_code):
-                string_value += source_code[i]  
-            tokens.append(('STRING', string_value))
-            i += 1
-            continue
-
-        if is_paren(char):
-            tokens.append(('PAREN', char))
-            i += 1
-            continue
-
-        if char == ':':
-            tokens.append(('COLON', char))
-            i += 1
-            continue
-
-        if char.isalpha():  
-            identifier = char
-            while i + 1 < len(source_code) and source_code[i + 1].isalnum():
-                identifier += source_code[i + 1]
-                i += 1
-            if is_keyword(identifier):
-                tokens.append(('KEYWORD', identifier))
-            else:
-                tokens.append(('IDENTIFIER', identifier))
-            i += 1
-            continue
-
-        if char == '#':  
-            while i < len(source_code) and source_code[i] != '\n':
-                i += 1
-            continue
-
-        print(f"Error at index {i}: '{char}'")
-        raise SyntaxError(f'Unexpected character: {char}')
-
-    return tokens
+        buffer = ''.join(pieces)
+        matches = list(TOKEN_REGEX.finditer(buffer))
+        consumed = len(buffer)
+        # a match touching the end of the buffer may continue in the next chunk
+        if not final and matches and matches[-1].end() == len(buffer):
+            consumed = matches.pop().start()
+        yield from scan_tokens(matches, debug, offset, positions, line)
+        if final:
+            return
+        if positions:
+            line += buffer.count('\n', 0, consumed)
+        buffer = buffer[consumed:]
+        pieces = [buffer]
+        size = pending = len(buffer)
+        offset += consumed
+
+def lex_file(file_path, chunk_size=65536, debug=False, positions=False):
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from lex_stream(buffer, chunk_size, debug, positions)
 
 #========================================================
 
@@ -151,12 +348,11 @@ def read_source_code(file_path):
     with open(file_path, 'r') as file:
         return file.read()
 
-source_file_path = 'source_code.txt'  
-source_code = read_source_code(source_file_path)
-
-try:
-    print(f"Source Code:\n{source_code}")
-    tokens = lex(source_code)
-    print("Tokens:", tokens)
-except SyntaxError as e:
-    print(e)
+if __name__ == "__main__":
+    source_code = read_source_code('source_code.txt')
+    try:
+        print(f"Source Code:\n{source_code}")
+        tokens = lex(source_code)
+        print("Tokens:", tokens)
+    except SyntaxError as e:
+        print(e)
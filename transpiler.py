@@ -0,0 +1,280 @@
+import ast
+import hashlib
+import sys
+import types
+from collections import OrderedDict
+
+from interpreter import COMPOUND_OPERATORS, DEFAULT_VALUES, binary_operator, divide, number_value, string_value
+from optimizer import first_line
+from parser import ParseNode, Parser
+from tokens_lexems import lex_offsets
+from unordered_symbol_table import SymbolTable, _declare, _declare_iterator, token_line
+
+TRANSPILER_VERSION = 1
+FUNCTION_NAME = 'program'
+CODE_CACHE_SIZE = 256
+# CPython refuses to compile more statically nested loops than this
+MAX_NESTED_LOOPS = 20
+# translating and compiling deeper trees would exhaust the recursion limit
+MAX_NESTING_DEPTH = 200
+
+ARITHMETIC_OPERATORS = {'+': ast.Add, '-': ast.Sub, '*': ast.Mult}
+COMPARISON_OPERATORS = {'==': ast.Eq, '!=': ast.NotEq, '<': ast.Lt, '>': ast.Gt, '<=': ast.LtE, '>=': ast.GtE}
+
+# the generated function only takes its two parameters from outside; source identifiers never contain '_'
+FUNCTION_TEMPLATE = f"def {FUNCTION_NAME}(output, divide):\n    pass\n"
+
+def local_name(key):
+    name, _, counter = key.partition('#')
+    return f"{name}_{counter}"
+
+def located(statement, node):
+    statement.lineno = statement.end_lineno = first_line(node) or 1
+    statement.col_offset = statement.end_col_offset = 0
+    return statement
+
+def nesting_error(message, line):
+    error = SyntaxError(message)
+    error.lineno = line or None
+    return error
+
+def check_nesting(tree):
+    # measured before anything is emitted, so a program too deep for Python fails with a SyntaxError
+    # rather than a RecursionError; a node without tokens of its own reports the line of its parent
+    stack = [(tree, 0, 0, 0)]
+    while stack:
+        node, depth, loops, line = stack.pop()
+        line = next((item[2] for item in node.children if type(item) is tuple and len(item) > 2), line)
+        if depth > MAX_NESTING_DEPTH:
+            raise nesting_error(f"Program is nested more than {MAX_NESTING_DEPTH} levels deep to transpile", line)
+        if node.name in ('WhileLoop', 'ForLoop'):
+            loops += 1
+            if loops > MAX_NESTED_LOOPS:
+                raise nesting_error(f"Loops are nested more than {MAX_NESTED_LOOPS} deep to transpile",
+                                    first_line(node) or line)
+        stack.extend((child, depth + 1, loops, line) for child in reversed(node.children)
+                     if isinstance(child, ParseNode))
+
+def load(name):
+    return ast.Name(name, ast.Load())
+
+def store(name):
+    return ast.Name(name, ast.Store())
+
+class Transpiler:
+    def __init__(self):
+        self.symbol_table = SymbolTable()
+        self.names = {}
+        self.loops = 0
+
+    def name(self, key):
+        name = self.names.get(key)
+        if name is None:
+            name = self.names[key] = local_name(key)
+        return name
+
+    def reference(self, token):
+        self.symbol_table.reference(token[1], token_line(token))
+        return self.name(self.symbol_table.lookup(token[1]))
+
+    def transpile(self, tree):
+        check_nesting(tree)
+        module = ast.parse(FUNCTION_TEMPLATE)
+        function = module.body[0]
+        body = self.translate_statements(tree.children)
+        if self.names:
+            body.insert(0, ast.Assign([store(name) for name in self.names.values()], ast.Constant(None)))
+        function.body = body or function.body
+        function.end_lineno = max(getattr(node, 'end_lineno', None) or 1 for node in ast.walk(function))
+        return ast.fix_missing_locations(module)
+
+    def translate_statements(self, statements):
+        body = []
+        for statement in statements:
+            translated = getattr(self, f"translate_{statement.name}")(statement)
+            if translated is not None:
+                body.append(located(translated, statement))
+        return body
+
+    def translate_scoped(self, statements):
+        self.symbol_table.enter_scope()
+        body = self.translate_statements(statements)
+        self.symbol_table.exit_scope()
+        return body or [ast.Pass()]
+
+    def translate_Declaration(self, node):
+        keyword, identifier = node.children[0], node.children[1]
+        value = node.children[2] if len(node.children) > 2 else None
+        _declare(self.symbol_table, keyword[1], identifier, value)
+        expression = ast.Constant(DEFAULT_VALUES.get(keyword[1])) if value is None else self.expression(value)
+        return ast.Assign([store(self.name(self.symbol_table.lookup(identifier[1])))], expression)
+
+    def translate_Assignment(self, node):
+        identifier, operator_token, expression = node.children
+        name = self.reference(identifier)
+        if operator_token[1] in COMPOUND_OPERATORS:
+            value = self.binary(COMPOUND_OPERATORS[operator_token[1]], load(name), self.expression(expression))
+        else:
+            value = self.expression(expression)
+        return ast.Assign([store(name)], value)
+
+    def translate_Conditional(self, node):
+        statement = ast.If(self.expression(node.children[0].children[0]),
+                           self.translate_scoped(node.children[1].children), [])
+        branch_statement = statement
+        for branch in node.children[2:]:
+            if branch.name == 'ElifStatement':
+                elif_statement = ast.If(self.expression(branch.children[0]),
+                                        self.translate_scoped(branch.children[1].children), [])
+                branch_statement.orelse = [located(elif_statement, branch)]
+                branch_statement = elif_statement
+            else:
+                branch_statement.orelse = self.translate_scoped(branch.children)
+        return statement
+
+    def translate_loop_body(self, body):
+        self.loops += 1
+        statements = self.translate_scoped(body.children)
+        self.loops -= 1
+        return statements
+
+    def translate_WhileLoop(self, node):
+        return ast.While(self.expression(node.children[0].children[0]), self.translate_loop_body(node.children[1]), [])
+
+    def translate_ForLoop(self, node):
+        identifier, target, body = node.children
+        iterable = self.expression(target)
+        self.symbol_table.enter_scope()
+        _declare_iterator(self.symbol_table, identifier, target)
+        name = self.name(self.symbol_table.lookup(identifier[1]))
+        statement = ast.For(store(name), iterable, self.translate_loop_body(body), [])
+        self.symbol_table.exit_scope()
+        return statement
+
+    def translate_PrintStatement(self, node):
+        token = node.children[0]
+        value = load(self.reference(token)) if token[0] == 'IDENTIFIER' else ast.Constant(string_value(token))
+        return ast.Expr(ast.Call(load('output'), [value], []))
+
+    def translate_Pass(self, node):
+        return None
+
+    def translate_Return(self, node):
+        expression = node.children[0]
+        return ast.Return(ast.Constant(None) if expression is None else self.expression(expression))
+
+    def translate_LoopControl(self, node):
+        if not self.loops:
+            raise SyntaxError(f"'{node.children[0][1]}' outside of a loop")
+        return ast.Continue() if node.children[0][1] == 'continue' else ast.Break()
+
+    def binary(self, operator, left, right):
+        if operator in ARITHMETIC_OPERATORS:
+            return ast.BinOp(left, ARITHMETIC_OPERATORS[operator](), right)
+        if operator == '/':
+            return ast.Call(load('divide'), [left, right], [])
+        return ast.Compare(left, [COMPARISON_OPERATORS[operator]()], [right])
+
+    def expression(self, node):
+        operands = []
+        while node.name in ('BinaryExpression', 'BooleanExpression'):
+            left, operator_token, right = node.children
+            binary_operator(operator_token)
+            operands.append((operator_token[1], right))
+            node = left
+        name = node.name
+        if name == 'Identifier':
+            value = load(self.reference(node.children[0]))
+        elif name == 'Number':
+            value = ast.Constant(number_value(node.children[0]))
+        elif name == 'String':
+            value = ast.Constant(string_value(node.children[0]))
+        elif name == 'List':
+            value = ast.List([self.expression(element) for element in node.children], ast.Load())
+        elif name == 'LogicalExpression':
+            left, operator_token, right = node.children
+            value = ast.BoolOp(ast.And() if operator_token[1] == 'and' else ast.Or(),
+                               [self.expression(left), self.expression(right)])
+        else:
+            raise SyntaxError(f"Unexpected {name} in expression")
+        for operator, right in reversed(operands):
+            value = self.binary(operator, value, self.expression(right))
+        return value
+
+def transpile(tree):
+    return Transpiler().transpile(tree)
+
+def compile_tree(tree, filename='<program>'):
+    namespace = {}
+    exec(compile(transpile(tree), filename, 'exec'), namespace)
+    return namespace[FUNCTION_NAME].__code__
+
+class CodeCache:
+    def __init__(self, size=CODE_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def key(self, source):
+        return hashlib.sha256(f"{TRANSPILER_VERSION}\0{source}".encode('utf-8', 'surrogatepass')).digest()
+
+    def get(self, key):
+        code = self.entries.get(key)
+        if code is None:
+            self.stats['misses'] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return code
+
+    def put(self, key, code):
+        if not self.size:
+            return
+        self.entries[key] = code
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+CODE_CACHE = CodeCache()
+
+def compile_source(source_code, cache=CODE_CACHE):
+    key = cache.key(source_code)
+    code = cache.get(key)
+    if code is None:
+        code = compile_tree(Parser(lex_offsets(source_code, positions=True)).parse())
+        cache.put(key, code)
+    return code
+
+def run(code, output=print):
+    # a fresh function per run keeps the cached code object free of any state
+    return types.FunctionType(code, {})(output, divide)
+
+def run_source(source_code, output=print, cache=CODE_CACHE):
+    return run(compile_source(source_code, cache), output)
+
+#=================================================================
+
+def main(argv=None):
+    import argparse
+    from tokens_lexems import format_syntax_error, read_source_code
+
+    arg_parser = argparse.ArgumentParser(description="Translate a program to Python and run it as native code.")
+    arg_parser.add_argument('file', nargs='?', default='source_code.txt')
+    arg_parser.add_argument('--show', action='store_true', help="print the generated Python source instead of running it")
+    args = arg_parser.parse_args(argv)
+
+    source_code = read_source_code(args.file)
+    try:
+        tree = Parser(lex_offsets(source_code, positions=True)).parse()
+        if args.show:
+            print(ast.unparse(transpile(tree)))
+            return 0
+        code = compile_tree(tree, args.file)
+    except SyntaxError as e:
+        print(format_syntax_error(e, args.file), file=sys.stderr)
+        return 1
+    print(f"Returned: {run(code)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,129 +1,471 @@
-import re
+import bisect
+import csv
+import io
+import json
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from functools import partial
+
+from parser import ParseNode, Parser
+from tokens_lexems import lex_offsets
+
+DATA_TYPE_SIZES = {'int': 2, 'float': 4, 'char': 1, 'unknown': 0}
+
+SCOPE_NODES = {'Body', 'IfBody', 'ElseBody'}
+
+OPERATOR_PRECEDENCE = {'or': -2, 'and': -1, '+': 1, '-': 1, '*': 2, '/': 2}
+
+FIELDS = ("Counter", "Variable Name", "Address", "Data Type", "Size (bytes)", "No. of Dimensions",
+          "Line Declaration", "References", "Value", "Scope")
+
+# references are kept as one flat array of row << LINE_BITS | line keys
+LINE_BITS = 32
+LINE_MASK = (1 << LINE_BITS) - 1
+
+BINARY_MAGIC = b'SYT1'
+BINARY_HEADER = struct.Struct('<4sqqH')
+SECTION_HEADER = struct.Struct('<cI')
+
+class SymbolEntry(Mapping):
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, field):
+        return self.table.field(self.row, field)
+
+    def __setitem__(self, field, value):
+        self.table.set_field(self.row, field, value)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+class SymbolsView(Mapping):
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, key):
+        return SymbolEntry(self.table, self.table.rows[key])
+
+    def __contains__(self, key):
+        return key in self.table.rows
+
+    def __iter__(self):
+        return iter(self.table.rows)
+
+    def __len__(self):
+        return len(self.table.rows)
+
+    def __delitem__(self, key):
+        self.table.remove(key)
+
+    def pop(self, key):
+        entry = dict(self[key])
+        self.table.remove(key)
+        return entry
 
 class SymbolTable:
     def __init__(self):
-        self.symbols = {}
+        self.rows = {}
+        self.strings = []
+        self.string_ids = {}
+        self.name_ids = array('I')
+        self.type_ids = array('I')
+        self.value_ids = array('i')
+        self.addresses = array('q')
+        self.sizes = array('q')
+        self.dimensions = array('I')
+        self.lines = array('I')
+        self.scope_depths = array('I')
+        self.last_references = array('I')
+        self.reference_keys = array('Q')
+        self.sorted_references = 0
+        self.symbols = SymbolsView(self)
         self.current_address = 0
         self.counter = 0
+        self.visible = {}
+        self.scopes = [set()]
+
+    def intern(self, string):
+        index = self.string_ids.get(string)
+        if index is None:
+            index = self.string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+    def enter_scope(self):
+        self.scopes.append(set())
+
+    def exit_scope(self):
+        for name in self.scopes.pop():
+            keys = self.visible[name]
+            keys.pop()
+            if not keys:
+                del self.visible[name]
+
+    def lookup(self, name):
+        keys = self.visible.get(name)
+        return keys[-1] if keys else None
+
+    def declare(self, name, data_type, size, line_number, value=None, dimensions=0):
+        key = name if name not in self.rows else f"{name}#{self.counter}"
+        self.rows[key] = self.counter
+        self.name_ids.append(self.intern(name))
+        self.type_ids.append(self.intern(data_type))
+        self.value_ids.append(-1 if value is None else self.intern(value))
+        self.addresses.append(self.current_address)
+        self.sizes.append(size)
+        self.dimensions.append(dimensions)
+        self.lines.append(line_number)
+        self.scope_depths.append(len(self.scopes) - 1)
+        self.last_references.append(0)
+        self.visible.setdefault(name, []).append(key)
+        self.scopes[-1].add(name)
+        self.counter += 1
+        self.current_address += size
+        return key
 
     def add_symbol(self, name, data_type, size, line_number, value=None, dimensions=0):
-        if name not in self.symbols:
-            symbol_entry = {
-                "Counter": self.counter,
-                "Variable Name": name,
-                "Address": self.current_address,
-                "Data Type": data_type,
-                "Size (bytes)": size,
-                "No. of Dimensions": dimensions,
-                "Line Declaration": line_number,
-                "References": set(),
-                "Value": value
-            }
-            self.symbols[name] = symbol_entry
-            self.counter += 1
-            self.current_address += size
+        if name not in self.scopes[-1]:
+            self.declare(name, data_type, size, line_number, value, dimensions)
         self.add_reference(name, line_number)
 
     def add_reference(self, name, line_number):
-        if name in self.symbols:
-            if line_number != self.symbols[name]["Line Declaration"]:
-                self.symbols[name]["References"].add(line_number)
+        key = self.lookup(name)
+        if key is None:
+            return
+        row = self.rows[key]
+        last = self.last_references[row]
+        if line_number == last or line_number == self.lines[row]:
+            return
+        reference = row << LINE_BITS | line_number
+        keys = self.reference_keys
+        if self.sorted_references == len(keys) and (not keys or reference > keys[-1]):
+            self.sorted_references += 1
+        keys.append(reference)
+        if line_number > last:
+            self.last_references[row] = line_number
+
+    def reference(self, name, line_number):
+        if self.lookup(name) is None:
+            self.declare(name, 'unknown', DATA_TYPE_SIZES['unknown'], line_number)
+        else:
+            self.add_reference(name, line_number)
+
+    def reference_index(self):
+        keys = self.reference_keys
+        count = self.sorted_references
+        if count < len(keys):
+            tail = sorted(set(keys[count:]))
+            del keys[count:]
+            if len(tail) * 8 > count:
+                keys = self.reference_keys = array('Q', sorted(set(keys.tolist() + tail)))
+            else:
+                for reference in tail:
+                    position = bisect.bisect_left(keys, reference)
+                    if position == len(keys) or keys[position] != reference:
+                        keys.insert(position, reference)
+            self.sorted_references = len(keys)
+        return keys
+
+    def reference_range(self, keys, row):
+        low = bisect.bisect_left(keys, row << LINE_BITS)
+        return low, bisect.bisect_left(keys, (row + 1) << LINE_BITS, low)
+
+    def references(self, row):
+        keys = self.reference_index()
+        low, high = self.reference_range(keys, row)
+        base = row << LINE_BITS
+        return array('I', [key - base for key in keys[low:high]])
+
+    def remove(self, key):
+        row = self.rows.pop(key)
+        self.remove_references(row, 0, LINE_MASK)
+        return row
+
+    def remove_references(self, row, first_line, last_line):
+        keys = self.reference_index()
+        start, end = self.reference_range(keys, row)
+        base = row << LINE_BITS
+        low = bisect.bisect_left(keys, base | first_line, start, end)
+        high = bisect.bisect_right(keys, base | last_line, low, end)
+        if low == high:
+            return
+        del keys[low:high]
+        self.sorted_references = len(keys)
+        end -= high - low
+        self.last_references[row] = keys[end - 1] - base if end > start else 0
+
+    def field(self, row, field):
+        if field == "Counter":
+            return row
+        if field == "Variable Name":
+            return self.strings[self.name_ids[row]]
+        if field == "Address":
+            return self.addresses[row]
+        if field == "Data Type":
+            return self.strings[self.type_ids[row]]
+        if field == "Size (bytes)":
+            return self.sizes[row]
+        if field == "No. of Dimensions":
+            return self.dimensions[row]
+        if field == "Line Declaration":
+            return self.lines[row]
+        if field == "References":
+            return self.references(row)
+        if field == "Value":
+            value = self.value_ids[row]
+            return None if value < 0 else self.strings[value]
+        if field == "Scope":
+            return self.scope_depths[row]
+        raise KeyError(field)
+
+    def set_field(self, row, field, value):
+        if field == "Address":
+            self.addresses[row] = value
+        elif field == "Data Type":
+            self.type_ids[row] = self.intern(value)
+        elif field == "Size (bytes)":
+            self.sizes[row] = value
+        elif field == "No. of Dimensions":
+            self.dimensions[row] = value
+        elif field == "Line Declaration":
+            self.lines[row] = value
+        elif field == "Value":
+            self.value_ids[row] = -1 if value is None else self.intern(value)
+        elif field == "Scope":
+            self.scope_depths[row] = value
+        else:
+            raise KeyError(f"{field} cannot be assigned")
+
+    def records(self):
+        strings = self.strings
+        for key, row in self.rows.items():
+            value = self.value_ids[row]
+            yield (key, row, strings[self.name_ids[row]], self.addresses[row], strings[self.type_ids[row]],
+                   self.sizes[row], self.dimensions[row], self.lines[row], self.references(row).tolist(),
+                   None if value < 0 else strings[value], self.scope_depths[row])
+
+    def to_bytes(self):
+        keys = self.reference_index()
+        live = array('I', self.rows.values())
+        key_ids = array('I', [self.intern(key) for key in self.rows])
+        encoded = [string.encode('utf-8', 'surrogatepass') for string in self.strings]
+        sections = [array('I', map(len, encoded)), array('B', b''.join(encoded)), live, key_ids,
+                    self.name_ids, self.type_ids, self.value_ids, self.addresses, self.sizes, self.dimensions,
+                    self.lines, self.scope_depths, self.last_references, keys]
+        parts = [BINARY_HEADER.pack(BINARY_MAGIC, self.current_address, self.counter, len(sections))]
+        for section in sections:
+            data = section.tobytes()
+            parts.append(SECTION_HEADER.pack(section.typecode.encode('ascii'), len(data)))
+            parts.append(data)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, current_address, counter, count = BINARY_HEADER.unpack_from(data)
+        if magic != BINARY_MAGIC:
+            raise ValueError("Not a binary symbol table")
+        view = memoryview(data)
+        offset = BINARY_HEADER.size
+        sections = []
+        for _ in range(count):
+            typecode, length = SECTION_HEADER.unpack_from(data, offset)
+            offset += SECTION_HEADER.size
+            section = array(typecode.decode('ascii'))
+            section.frombytes(view[offset:offset + length])
+            offset += length
+            sections.append(section)
+        if offset != len(data):
+            raise ValueError("Truncated binary symbol table")
+        lengths, blob = sections[0], sections[1].tobytes()
+        table = cls()
+        position = 0
+        for length in lengths:
+            table.intern(blob[position:position + length].decode('utf-8', 'surrogatepass'))
+            position += length
+        live, key_ids = sections[2], sections[3]
+        (table.name_ids, table.type_ids, table.value_ids, table.addresses, table.sizes, table.dimensions,
+         table.lines, table.scope_depths, table.last_references, table.reference_keys) = sections[4:]
+        table.sorted_references = len(table.reference_keys)
+        table.current_address, table.counter = current_address, counter
+        for row, key_id in zip(live, key_ids):
+            key = table.strings[key_id]
+            table.rows[key] = row
+            if table.scope_depths[row] == 0:
+                name = table.strings[table.name_ids[row]]
+                table.visible.setdefault(name, []).append(key)
+                table.scopes[0].add(name)
+        return table
+
+def token_line(token):
+    return token[2] if len(token) > 2 else 0
 
 def calculate_string_size(value):
     if value.startswith('"') and value.endswith('"'):
         return len(value[1:-1])
     return len(value)
 
-def calculate_array_size(data_type, elements):
+def calculate_array_size(data_type, list_node):
     base_sizes = {'int': 2, 'float': 4, 'char': 1}
+    elements = [element for element in list_node.children if element is not None]
     if not elements:
         return base_sizes.get(data_type, 4)
-    
-    elements = elements.strip('[]').split(',')
     if data_type == 'string':
-        total_size = 0
-        for elem in elements:
-            elem = elem.strip()
-            if elem.startswith('"') and elem.endswith('"'):
-                total_size += len(elem[1:-1])
-        return total_size
+        return sum(calculate_string_size(element.children[0][1]) for element in elements if element.name == 'String')
     return base_sizes.get(data_type, 4) * len(elements)
 
-def infer_list_type(elements):
-    elements = elements.strip('[]').split(',')
-    first_elem = elements[0].strip()
-    if first_elem.startswith('"'):
-        return 'string'
-    try:
-        float(first_elem)
-        if '.' in first_elem:
-            return 'float'
-        return 'int'
-    except ValueError:
+def infer_list_type(list_node):
+    if not list_node.children:
         return 'unknown'
+    first_elem = list_node.children[0]
+    if first_elem.name == 'String':
+        return 'string'
+    if first_elem.name == 'Number':
+        return 'float' if first_elem.children[0][0] == 'FLOAT' else 'int'
+    return 'unknown'
 
-def generate_symbol_table(source_code):
-    symbol_table = SymbolTable()
-    data_type_sizes = {'int': 2, 'float': 4, 'char': 1, 'unknown': 0}
-    lines = source_code.splitlines()
-    for line_number, line in enumerate(lines, 1):
-        for_loop_match = re.search(r'for\s+(\w+)\s+in\s+(\[[^]]+\])', line)
-        if for_loop_match:
-            iterator_name = for_loop_match.group(1)
-            target_list = for_loop_match.group(2)
-            list_type = infer_list_type(target_list)
-            
-            if list_type == 'string':
-                elements = re.findall(r'"([^"]*)"', target_list)
-                size = max(len(s) for s in elements) if elements else 1
-            else:
-                size = data_type_sizes.get(list_type, 4)
-            
-            symbol_table.add_symbol(iterator_name, list_type, size, line_number)
+def _operand_text(text, node, precedence, right):
+    # binary expressions group left to right; keep any grouping a reader would otherwise misread
+    if not isinstance(node, ParseNode) or len(node.children) != 3 or node.name == 'List':
+        return text
+    if right or OPERATOR_PRECEDENCE.get(node.children[1][1], 0) < precedence:
+        return f"({text})"
+    return text
+
+def expression_text(node):
+    values = []
+    stack = [(node, False)]
+    while stack:
+        item, expanded = stack.pop()
+        if not isinstance(item, ParseNode):
+            values.append((item[1], item))
+            continue
+        children = [child for child in item.children if child is not None]
+        if not expanded:
+            stack.append((item, True))
+            stack.extend((child, False) for child in reversed(children))
             continue
+        parts = values[len(values) - len(children):]
+        del values[len(values) - len(children):]
+        if item.name == 'List':
+            text = '[' + ', '.join(part for part, _ in parts) + ']'
+        elif len(parts) == 3:
+            (left, left_node), (operator, _), (right, right_node) = parts
+            precedence = OPERATOR_PRECEDENCE.get(operator, 0)
+            text = (f"{_operand_text(left, left_node, precedence, False)} {operator} "
+                    f"{_operand_text(right, right_node, precedence, True)}")
+        else:
+            text = ' '.join(part for part, _ in parts)
+        values.append((text, item))
+    return values[0][0]
 
-        declarations = re.findall(r'\b(int|float|char|string)\s+(\w+)(?:\s*=\s*([^;]+))?', line)
-        for data_type, var_name, value in declarations:
-            if value and value.strip().startswith('['):
-                size = calculate_array_size(data_type, value.strip())
-                symbol_table.add_symbol(var_name, f"{data_type}[]", size, line_number, value.strip(), 1)
-            else:
-                if data_type == 'string' and value:
-                    size = calculate_string_size(value.strip())
-                else:
-                    size = data_type_sizes.get(data_type, 4)
-                symbol_table.add_symbol(var_name, data_type, size, line_number, value.strip() if value else None)
-        line_without_strings = re.sub(r'"[^"]*"', '', line)
-
-        variables_in_line = re.findall(r'\b([a-zA-Z_]\w*)\b', line_without_strings)
-        keywords = {'if', 'print', 'in', 'else', 'for', 'while', 'return', 'int', 'float',
-            'range', 'string', 'elif', 'pass', 'break', 'continue', 'True', 
-            'False', 'and', 'or', 'not', 'begin', 'end'}
-        for var in variables_in_line:
-            if var in symbol_table.symbols:
-                symbol_table.add_reference(var, line_number)
-            elif var not in keywords and not var.startswith('"'):
-                symbol_table.add_symbol(var, 'unknown', data_type_sizes['unknown'], line_number)
+def _declare(symbol_table, data_type, identifier, value, line_of=token_line):
+    name, line_number = identifier[1], line_of(identifier)
+    if isinstance(value, ParseNode) and value.name == 'List':
+        size = calculate_array_size(data_type, value)
+        symbol_table.add_symbol(name, f"{data_type}[]", size, line_number, expression_text(value), 1)
+        return
+    if data_type == 'string' and isinstance(value, ParseNode) and value.name == 'String':
+        size = calculate_string_size(value.children[0][1])
+    else:
+        size = DATA_TYPE_SIZES.get(data_type, 4)
+    symbol_table.add_symbol(name, data_type, size, line_number, expression_text(value) if value is not None else None)
+
+def _declare_iterator(symbol_table, identifier, target, line_of=token_line):
+    if isinstance(target, ParseNode) and target.name == 'List':
+        list_type = infer_list_type(target)
+    else:
+        list_type = 'unknown'
+    if list_type == 'string':
+        elements = [calculate_string_size(element.children[0][1]) for element in target.children if element.name == 'String']
+        size = max(elements) if elements else 1
+    else:
+        size = DATA_TYPE_SIZES.get(list_type, 4)
+    symbol_table.add_symbol(identifier[1], list_type, size, line_of(identifier))
 
+def build_symbol_table(tree, symbol_table=None, line_of=token_line):
+    symbol_table = symbol_table or SymbolTable()
+    stack = [tree]
+    while stack:
+        item = stack.pop()
+        if item is None:
+            continue
+        if isinstance(item, ParseNode):
+            name = item.name
+            if name == 'Declaration':
+                keyword, identifier = item.children[0], item.children[1]
+                value = item.children[2] if len(item.children) > 2 else None
+                # the name is in scope from its declarator on, so the initializer reads the new symbol
+                stack.append(value)
+                stack.append(partial(_declare, symbol_table, keyword[1], identifier, value, line_of))
+            elif name == 'ForLoop':
+                identifier, target, body = item.children
+                stack.append(symbol_table.exit_scope)
+                stack.append(body)
+                stack.append(partial(_declare_iterator, symbol_table, identifier, target, line_of))
+                stack.append(symbol_table.enter_scope)
+                stack.append(target)
+            elif name in SCOPE_NODES:
+                stack.append(symbol_table.exit_scope)
+                stack.extend(reversed(item.children))
+                stack.append(symbol_table.enter_scope)
+            else:
+                stack.extend(reversed(item.children))
+        elif callable(item):
+            item()
+        elif item[0] == 'IDENTIFIER':
+            symbol_table.reference(item[1], line_of(item))
     return symbol_table
 
-def print_symbol_table(symbol_table):
-    print("\nSymbol Table:\n")
-    print(f"{'Counter':<8}{'Variable Name':<15}{'Address':<10}{'Data Type':<15}{'Size (bytes)':<15}"
-          f"{'No. of Dimensions':<20}{'Line Declaration':<20}{'References':<20}{'Value'}")
-    print("-" * 120)
-    
-    for name, entry in symbol_table.symbols.items():
-        print(f"{entry['Counter']:<8}"
-              f"{entry['Variable Name']:<15}"
-              f"{entry['Address']:<10}"
-              f"{entry['Data Type']:<15}"
-              f"{entry['Size (bytes)']:<15}"
-              f"{entry['No. of Dimensions']:<20}"
-              f"{entry['Line Declaration']:<20}"
-              f"{str(entry['References']):<20}"
-              f"{entry['Value'] if entry['Value'] is not None else 'None'}")
-        print("-" * 120)
+def generate_symbol_table(source_code):
+    tree = Parser(lex_offsets(source_code, positions=True)).parse()
+    return build_symbol_table(tree)
+
+def format_references(references):
+    return '{' + ', '.join(map(str, references)) + '}'
+
+def print_symbol_table(symbol_table, file=None):
+    separator = "-" * 120
+    lines = ["\nSymbol Table:\n",
+             f"{'Counter':<8}{'Variable Name':<15}{'Address':<10}{'Data Type':<15}{'Size (bytes)':<15}"
+             f"{'No. of Dimensions':<20}{'Line Declaration':<20}{'References':<20}{'Value'}",
+             separator]
+    for _, counter, name, address, data_type, size, dimensions, line, references, value, _ in symbol_table.records():
+        lines.append(f"{counter:<8}{name:<15}{address:<10}{data_type:<15}{size:<15}{dimensions:<20}{line:<20}"
+                     f"{format_references(references):<20}{value if value is not None else 'None'}")
+        lines.append(separator)
+    lines.append('')
+    (file or sys.stdout).write("\n".join(lines))
+
+def export_csv(symbol_table, file):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(('Key',) + FIELDS)
+    writer.writerows((key, counter, name, address, data_type, size, dimensions, line,
+                      ' '.join(map(str, references)), value, scope)
+                     for key, counter, name, address, data_type, size, dimensions, line, references, value, scope
+                     in symbol_table.records())
+    file.write(buffer.getvalue())
+
+def export_jsonl(symbol_table, file):
+    fields = ('Key',) + FIELDS
+    file.write(''.join(json.dumps(dict(zip(fields, record))) + '\n' for record in symbol_table.records()))
+
+def export_binary(symbol_table, file):
+    file.write(symbol_table.to_bytes())
+
+def load_binary(file):
+    return SymbolTable.from_bytes(file.read())
+
+EXPORTERS = {'csv': export_csv, 'jsonl': export_jsonl, 'binary': export_binary}
 
 #================================================================
 
@@ -131,11 +473,25 @@ def read_source_code(file_path):
     with open(file_path, 'r') as file:
         return file.read()
 
-source_file_path = 'source_code.txt' 
-source_code = read_source_code(source_file_path)
-def main():
-    symbol_table = generate_symbol_table(source_code)
-    print_symbol_table(symbol_table)
+def main(argv=None):
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Build and print or export the symbol table of a program.")
+    arg_parser.add_argument('file', nargs='?', default='source_code.txt')
+    arg_parser.add_argument('--format', choices=('table',) + tuple(EXPORTERS), default='table')
+    arg_parser.add_argument('--output', help="write the export to this file instead of stdout")
+    args = arg_parser.parse_args(argv)
+
+    symbol_table = generate_symbol_table(read_source_code(args.file))
+    if args.format == 'table':
+        print_symbol_table(symbol_table)
+        return
+    binary = args.format == 'binary'
+    if args.output:
+        with open(args.output, 'wb' if binary else 'w', newline='' if not binary else None) as file:
+            EXPORTERS[args.format](symbol_table, file)
+    else:
+        EXPORTERS[args.format](symbol_table, sys.stdout.buffer if binary else sys.stdout)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file